@@ -0,0 +1,60 @@
+"""Fleet energy analytics benchmark.
+
+Builds a device x day matrix for a fleet and times the aggregate queries
+with the NumPy backend (when installed) and the array fallback.
+
+Run with: python -m benchmarks.analytics_benchmark
+"""
+
+import random
+import time
+from datetime import date, timedelta
+
+from miraie_ac.analytics import FleetEnergyMatrix, np
+from miraie_ac.enums import ConsumptionPeriodType
+
+
+DEVICE_COUNT = 1_000
+DAY_COUNT = 365
+
+
+def build_consumption() -> dict[str, dict[str, float]]:
+    start = date(2025, 1, 1)
+    keys = [(start + timedelta(days=i)).strftime("%d%m%Y") for i in range(DAY_COUNT)]
+    rng = random.Random(0)
+    return {
+        f"device-{i}": {key: round(rng.uniform(0, 12), 2) for key in keys}
+        for i in range(DEVICE_COUNT)
+    }
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    func()
+    print(f"  {name:>16}: {(time.perf_counter() - start) * 1e3:9.2f} ms")
+
+
+def run(consumption: dict, use_numpy: bool):
+    print(f"{'numpy' if use_numpy else 'array'} backend, {DEVICE_COUNT} devices x {DAY_COUNT} days")
+    matrix = None
+
+    def build():
+        nonlocal matrix
+        matrix = FleetEnergyMatrix.from_consumption(
+            consumption, ConsumptionPeriodType.DAILY, use_numpy=use_numpy
+        )
+
+    measure("build", build)
+    measure("total", matrix.total)
+    measure("device totals", matrix.device_totals)
+    measure("period totals", matrix.period_totals)
+    measure("top 10", lambda: matrix.top(10))
+    measure("to weekly", lambda: matrix.resample(ConsumptionPeriodType.WEEKLY))
+    measure("to monthly", lambda: matrix.resample(ConsumptionPeriodType.MONTHLY))
+
+
+if __name__ == "__main__":
+    consumption = build_consumption()
+    if np is not None:
+        run(consumption, use_numpy=True)
+    run(consumption, use_numpy=False)
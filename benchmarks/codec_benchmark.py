@@ -0,0 +1,60 @@
+"""Payload codec micro-benchmark.
+
+Measures decode throughput of status payloads (bytes -> dict) and encode
+throughput of command payloads, comparing the standard library, the
+configured codec backend and the broker's pre-encoded command cache.
+
+Run with: python -m benchmarks.codec_benchmark
+"""
+
+import json
+import time
+
+from miraie_ac import MirAIeBroker
+from miraie_ac import codec
+from miraie_ac.enums import FanMode
+
+
+ITERATIONS = 200_000
+
+STATUS_PAYLOAD = json.dumps(
+    {
+        "ty": "AC",
+        "achs": 0,
+        "acec": "off",
+        "acpm": "off",
+        "acem": "off",
+        "acmd": "auto",
+        "acdc": "on",
+        "acvs": 1,
+        "actmp": "25.0",
+        "acfs": "quiet",
+        "rmtmp": "27.5",
+        "ts": "1668418256",
+        "ps": "off",
+        "sid": "14",
+        "cnt": "an",
+        "lcmd": "ps",
+        "rssi": -54,
+    }
+).encode("utf-8")
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>24}: {ITERATIONS / elapsed:12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    broker = MirAIeBroker()
+    builder = broker.build_fan_mode_payload
+
+    print(f"Codec backend: {codec.BACKEND}")
+    measure("decode json (str)", lambda: json.loads(STATUS_PAYLOAD.decode("utf-8")))
+    measure("decode codec (bytes)", lambda: codec.loads(STATUS_PAYLOAD))
+    measure("encode json", lambda: json.dumps(builder(FanMode.HIGH)))
+    measure("encode codec", lambda: codec.dumps(builder(FanMode.HIGH)))
+    measure("encode cached", lambda: broker.encode_payload(builder, FanMode.HIGH, "1"))
@@ -0,0 +1,79 @@
+"""Status decoder throughput benchmark.
+
+Compares the table-driven decoder with the previous inline Enum
+constructor decode, in messages decoded per second.
+
+Run with: python -m benchmarks.decoder_benchmark
+"""
+
+import time
+
+from miraie_ac.decoder import decode_status
+from miraie_ac.enums import (
+    PowerMode,
+    FanMode,
+    SwingMode,
+    DisplayMode,
+    HVACMode,
+    PresetMode,
+    ConvertiMode,
+)
+from miraie_ac.utils import toFloat
+
+
+MESSAGE_COUNT = 200_000
+
+STATUS_MESSAGE = {
+    "ty": "AC",
+    "achs": 0,
+    "acec": "off",
+    "acpm": "off",
+    "acem": "off",
+    "acmd": "auto",
+    "acdc": "on",
+    "acvs": 1,
+    "actmp": "25.0",
+    "acfs": "quiet",
+    "rmtmp": "27.5",
+    "ts": "1668418256",
+    "ps": "off",
+    "sid": "14",
+    "cnt": "an",
+    "lcmd": "ps",
+    "rssi": -54,
+}
+
+
+def legacy_decode(status: dict) -> list:
+    return [
+        toFloat(status["actmp"]),
+        toFloat(status["rmtmp"]),
+        PowerMode(status["ps"]),
+        FanMode(status["acfs"]),
+        SwingMode(status["acvs"]),
+        SwingMode(status["achs"]),
+        DisplayMode(status["acdc"]),
+        HVACMode(status["acmd"]),
+        PresetMode.BOOST
+        if status["acpm"] == "on"
+        else PresetMode.ECO
+        if status["acem"] == "on"
+        else PresetMode.CLEAN
+        if status["acec"] == "on"
+        else PresetMode.NONE,
+        ConvertiMode(status.get("cnv", 0)),
+    ]
+
+
+def measure(name: str, decode):
+    start = time.perf_counter()
+    for _ in range(MESSAGE_COUNT):
+        decode(STATUS_MESSAGE)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {MESSAGE_COUNT / elapsed:12,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    assert legacy_decode(STATUS_MESSAGE) == decode_status(STATUS_MESSAGE)
+    measure("legacy", legacy_decode)
+    measure("decoder", decode_status)
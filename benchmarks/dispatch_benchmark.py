@@ -0,0 +1,94 @@
+"""Dispatch benchmark: slow device callbacks under a status burst.
+
+Registers a slow callback on every device (a blocking sync callback or an
+async one, each taking CALLBACK_COST), then has the simulator publish a
+burst of status messages. Compares handling messages inline in the receive
+loop with the mailbox dispatcher, reporting how long intake of the burst
+takes, when the last callback finished, and how many stale statuses were
+dropped.
+
+Run with: python -m benchmarks.dispatch_benchmark
+"""
+
+import asyncio
+import logging
+import time
+
+from miraie_ac import MirAIeHub, MirAIeBroker, InitStage
+from simulator import MirAIeSimulator
+
+
+DEVICE_COUNT = 100
+STATUS_MESSAGES = 5_000
+CALLBACK_COST = 0.002  # In seconds
+
+
+async def measure(name: str, dispatch_workers: int, use_async: bool):
+    async with MirAIeSimulator(device_count=DEVICE_COUNT) as simulator:
+        broker = MirAIeBroker()
+        broker.dispatch_workers = dispatch_workers
+        broker.__init__()
+        simulator.configure_broker(broker)
+
+        hub = MirAIeHub()
+        await hub.init("9999999999", "password", broker)
+        await hub.wait_for(InitStage.BROKER_SUBSCRIBED, 60)
+
+        calls = 0
+
+        def callback():
+            nonlocal calls
+            calls += 1
+            # Blocking I/O, e.g. a database write
+            time.sleep(CALLBACK_COST)
+
+        async def async_callback():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(CALLBACK_COST)
+
+        for device in hub.home.devices:
+            if use_async:
+                device.register_callback(async_callback)
+            else:
+                # Blocking callbacks can only move off the loop with the dispatcher
+                device.register_callback(callback, executor=dispatch_workers > 0)
+
+        fleet = simulator.fleet
+        target = broker.metrics.messages_received.get("status", 0) + STATUS_MESSAGES
+        start = time.perf_counter()
+        for i in range(STATUS_MESSAGES):
+            fleet.tick(fleet.devices[i % DEVICE_COUNT], i // DEVICE_COUNT)
+            if i % 1000 == 999:
+                await simulator.mqtt.drain()
+        while broker.metrics.messages_received.get("status", 0) < target:
+            await asyncio.sleep(0.001)
+        received = time.perf_counter() - start
+        if broker.dispatcher is not None:
+            await broker.dispatcher.join()
+        else:
+            # Inline async callbacks run as separate tasks
+            while calls < STATUS_MESSAGES:
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(CALLBACK_COST)
+        handled = time.perf_counter() - start
+
+        print(
+            f"{name:>24}: intake {received * 1e3:7.1f} ms, handled {handled * 1e3:7.1f} ms, "
+            f"{calls} callbacks, {broker.metrics.dispatch_dropped} dropped, "
+            f"max queue depth {broker.metrics.dispatch_queue_depth_max}"
+        )
+
+        await hub.__aexit__()
+
+
+async def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    await measure("inline, blocking", 0, use_async=False)
+    await measure("dispatcher x4, executor", 4, use_async=False)
+    await measure("inline, async", 0, use_async=True)
+    await measure("dispatcher x4, async", 4, use_async=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
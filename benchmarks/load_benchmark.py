@@ -0,0 +1,159 @@
+"""End-to-end load benchmark against the local simulator.
+
+Starts the simulator (fake REST API, MQTT broker and virtual ACs) and
+drives MirAIeHub and MirAIeBroker at 10, 1k and 10k devices. Reports the
+time until init returns and the broker is subscribed, status message
+throughput, command round-trip latency (publish to the status message
+echoing its sid), and memory retained by an initialized hub.
+
+Run with: python -m benchmarks.load_benchmark [device counts...] [--shards N]
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import time
+import tracemalloc
+
+from miraie_ac import MirAIeHub, MirAIeBroker, ShardedMirAIeBroker, InitStage
+from miraie_ac.latency import LatencyTracker
+from simulator import MirAIeSimulator
+
+
+DEVICE_COUNTS = (10, 1_000, 10_000)
+STATUS_MESSAGES = 50_000
+COMMANDS = 1_000
+# Commands in flight: one at a time for unloaded latency, then a burst
+# (aiomqtt warns above 10 pending publishes)
+COMMAND_CONCURRENCY = (1, 10)
+TIMEOUT = 120  # In seconds, per phase
+
+
+async def wait_until(predicate, timeout: float = TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Benchmark phase timed out")
+        await asyncio.sleep(0.005)
+
+
+def create_broker(simulator: MirAIeSimulator, shards: int) -> MirAIeBroker:
+    broker = ShardedMirAIeBroker(shard_count=shards) if shards > 1 else MirAIeBroker()
+    return simulator.configure_broker(broker)
+
+
+async def start_hub(simulator: MirAIeSimulator, shards: int) -> tuple[MirAIeHub, MirAIeBroker]:
+    broker = create_broker(simulator, shards)
+    hub = MirAIeHub()
+    await hub.init("9999999999", "password", broker)
+    await hub.wait_for(InitStage.BROKER_SUBSCRIBED, TIMEOUT)
+    return hub, broker
+
+
+async def stop_hub(hub: MirAIeHub):
+    await hub.__aexit__()
+
+
+async def measure_init(simulator: MirAIeSimulator, shards: int) -> tuple[MirAIeHub, MirAIeBroker]:
+    broker = create_broker(simulator, shards)
+    hub = MirAIeHub()
+    start = time.perf_counter()
+    await hub.init("9999999999", "password", broker)
+    initialized = time.perf_counter()
+    await hub.wait_for(InitStage.BROKER_SUBSCRIBED, TIMEOUT)
+    subscribed = time.perf_counter()
+    print(
+        f"  init: {(initialized - start) * 1e3:9.1f} ms, "
+        f"subscribed after {(subscribed - start) * 1e3:9.1f} ms "
+        f"({simulator.rest_requests} REST requests)"
+    )
+    return hub, broker
+
+
+async def measure_throughput(simulator: MirAIeSimulator, broker: MirAIeBroker):
+    fleet = simulator.fleet
+    received = lambda: broker.metrics.snapshot()["messages_received"].get("status", 0)
+    target = received() + STATUS_MESSAGES
+    devices = fleet.devices
+
+    start = time.perf_counter()
+    for i in range(STATUS_MESSAGES):
+        fleet.tick(devices[i % len(devices)], i // len(devices))
+        if i % 1000 == 999:
+            await simulator.mqtt.drain()
+    await wait_until(lambda: received() >= target)
+    elapsed = time.perf_counter() - start
+
+    metrics = broker.metrics.snapshot()
+    dispatched = sum(metrics["messages_received"].values())
+    print(
+        f"  status throughput: {STATUS_MESSAGES / elapsed:9.0f} msg/s, "
+        f"dispatch {metrics['dispatch_seconds_total'] / dispatched * 1e6:.1f} us/msg"
+    )
+
+
+async def measure_commands(hub: MirAIeHub, broker: MirAIeBroker, concurrency: int):
+    devices = list(hub.home.devices)
+    semaphore = asyncio.Semaphore(concurrency)
+    broker.latency = LatencyTracker()
+    for shard in getattr(broker, "shards", ()):
+        shard.latency = broker.latency
+
+    async def send(i: int):
+        async with semaphore:
+            await devices[i % len(devices)].set_temperature(16.0 + i % 15)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[send(i) for i in range(COMMANDS)])
+    await wait_until(lambda: broker.latency.pending_count == 0)
+    elapsed = time.perf_counter() - start
+
+    percentiles = broker.latency.percentiles(command="temperature")
+    formatted = ", ".join(f"{name} {value * 1e3:.2f} ms" for name, value in percentiles.items())
+    print(f"  commands x{concurrency:<2}: {COMMANDS / elapsed:9.0f} cmd/s, round trip {formatted}")
+
+
+async def measure_memory(simulator: MirAIeSimulator, shards: int):
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    hub, _ = await start_hub(simulator, shards)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await stop_hub(hub)
+
+    devices = len(simulator.fleet)
+    # Includes the simulator's per-connection subscription state
+    print(
+        f"  memory: {(current - baseline) / 1e6:9.1f} MB retained "
+        f"({(current - baseline) / devices:.0f} bytes/device), {(peak - baseline) / 1e6:.1f} MB peak"
+    )
+
+
+async def run(device_count: int, shards: int):
+    print(f"{device_count} devices, {shards} connection(s)")
+    async with MirAIeSimulator(device_count=device_count) as simulator:
+        hub, broker = await measure_init(simulator, shards)
+        try:
+            await measure_throughput(simulator, broker)
+            for concurrency in COMMAND_CONCURRENCY:
+                await measure_commands(hub, broker, concurrency)
+        finally:
+            await stop_hub(hub)
+        await measure_memory(simulator, shards)
+
+
+async def main(device_counts, shards: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    for device_count in device_counts:
+        await run(device_count, shards)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("device_counts", type=int, nargs="*", default=DEVICE_COUNTS)
+    parser.add_argument("--shards", type=int, default=1, help="MQTT connections, sharded above 1")
+    args = parser.parse_args()
+    asyncio.run(main(args.device_counts, args.shards))
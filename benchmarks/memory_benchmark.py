@@ -0,0 +1,128 @@
+"""Per-device memory footprint and per-message allocation benchmark.
+
+Builds a fleet of devices with details and status, then feeds status
+messages through Device.status_handler while tracing allocations.
+
+Run with: python -m benchmarks.memory_benchmark
+"""
+
+import logging
+import time
+import tracemalloc
+
+from miraie_ac import MirAIeBroker, Device
+from miraie_ac.device import DeviceDetails, DeviceStatus
+from miraie_ac.enums import (
+    PowerMode,
+    FanMode,
+    SwingMode,
+    DisplayMode,
+    HVACMode,
+    PresetMode,
+    ConvertiMode,
+)
+
+
+DEVICE_COUNT = 10_000
+MESSAGE_COUNT = 10_000
+
+STATUS_MESSAGE = {
+    "ty": "AC",
+    "acpm": "off",
+    "acem": "off",
+    "acec": "off",
+    "acmd": "cool",
+    "acdc": "on",
+    "acvs": 1,
+    "achs": 0,
+    "actmp": "25.0",
+    "acfs": "quiet",
+    "rmtmp": "27.5",
+    "ps": "on",
+    "cnv": 0,
+}
+
+
+def build_fleet(broker: MirAIeBroker, count: int) -> list[Device]:
+    devices = []
+    for i in range(count):
+        prefix = f"user/home/device-{i}"
+        device = Device(
+            id=f"device-{i}",
+            name=f"ac-{i}",
+            friendly_name=f"AC {i}",
+            control_topic=prefix + "/control",
+            status_topic=prefix + "/status",
+            connection_status_topic=prefix + "/connectionStatus",
+            broker=broker,
+        )
+        device.set_details(
+            DeviceDetails(
+                model_name="CS-XU18XKYF",
+                mac_address="00:00:00:00:00:00",
+                category="AC",
+                brand="Panasonic",
+                firmware_version="1.75",
+                serial_number=str(i),
+                model_number="102184",
+                product_serial_number=str(i),
+            )
+        )
+        device.set_status(
+            DeviceStatus(
+                is_online=True,
+                temperature=24.0,
+                room_temperature=24.0,
+                power_mode=PowerMode.OFF,
+                fan_mode=FanMode.AUTO,
+                v_swing_mode=SwingMode.AUTO,
+                h_swing_mode=SwingMode.AUTO,
+                display_mode=DisplayMode.ON,
+                hvac_mode=HVACMode.AUTO,
+                preset_mode=PresetMode.NONE,
+                converti_mode=ConvertiMode.OFF,
+            )
+        )
+        devices.append(device)
+    return devices
+
+
+def main():
+    logging.getLogger().setLevel(logging.INFO)
+    broker = MirAIeBroker()
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    devices = build_fleet(broker, DEVICE_COUNT)
+    end, _ = tracemalloc.get_traced_memory()
+    print(f"Per-device footprint: {(end - start) / DEVICE_COUNT:.0f} bytes")
+
+    messages = []
+    for i in range(MESSAGE_COUNT):
+        message = dict(STATUS_MESSAGE)
+        message["rmtmp"] = str(20.0 + i % 10)
+        messages.append(message)
+
+    before = tracemalloc.take_snapshot()
+    for i, message in enumerate(messages):
+        devices[i % DEVICE_COUNT].status_handler(message)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    allocations = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    print(
+        f"Per-message retained allocations: {allocations / MESSAGE_COUNT:.1f} blocks, "
+        f"{allocated / MESSAGE_COUNT:.0f} bytes"
+    )
+
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        devices[i % DEVICE_COUNT].status_handler(message)
+    elapsed = time.perf_counter() - start
+    print(f"Status handler: {elapsed / MESSAGE_COUNT * 1e6:.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Device registry scaling benchmark.
+
+Builds a registry of N devices and looks every device up by id and by
+status topic, reporting the per-operation cost. Per-operation cost should
+stay flat as N grows, i.e. total cost grows linearly with fleet size.
+
+Run with: python -m benchmarks.registry_benchmark
+"""
+
+import time
+
+from miraie_ac import MirAIeBroker, Device
+from miraie_ac.registry import DeviceRegistry
+
+
+SIZES = [100, 1_000, 10_000, 50_000]
+
+
+def build_devices(broker: MirAIeBroker, count: int) -> list[Device]:
+    devices = []
+    for i in range(count):
+        prefix = f"user/home/device-{i}"
+        devices.append(
+            Device(
+                id=f"device-{i}",
+                name=f"ac-{i}",
+                friendly_name=f"AC {i}",
+                control_topic=prefix + "/control",
+                status_topic=prefix + "/status",
+                connection_status_topic=prefix + "/connectionStatus",
+                broker=broker,
+            )
+        )
+    return devices
+
+
+def run(count: int):
+    broker = MirAIeBroker()
+    devices = build_devices(broker, count)
+    registry = DeviceRegistry()
+
+    start = time.perf_counter()
+    for device in devices:
+        registry.add(device)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for device in devices:
+        registry.get(device.id)
+        registry.get_by_topic(device.status_topic)
+    lookup_time = time.perf_counter() - start
+
+    print(
+        f"{count:>7} devices: "
+        f"add {add_time * 1e3:8.2f} ms ({add_time / count * 1e9:6.0f} ns/op), "
+        f"lookup {lookup_time * 1e3:8.2f} ms ({lookup_time / (2 * count) * 1e9:6.0f} ns/op)"
+    )
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        run(size)
@@ -0,0 +1,81 @@
+"""Replay benchmark: record simulator traffic, then replay it through the broker.
+
+Records a burst of status messages from the simulator with a
+TrafficRecorder, then reports how fast the recording can be read and how
+fast it can be replayed through MirAIeBroker.on_message, as fast as
+possible. Pass a recording to replay it instead of recording a new one.
+
+Run with: python -m benchmarks.replay_benchmark [recording]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from miraie_ac import MirAIeHub, MirAIeBroker, InitStage
+from miraie_ac.recorder import TrafficRecorder, read_recording, replay
+from simulator import MirAIeSimulator
+
+
+DEVICE_COUNT = 1_000
+STATUS_MESSAGES = 50_000
+TIMEOUT = 120  # In seconds
+
+
+async def record(simulator: MirAIeSimulator, broker: MirAIeBroker, path: str):
+    broker.recorder = TrafficRecorder(path)
+    fleet = simulator.fleet
+    start = time.perf_counter()
+    for i in range(STATUS_MESSAGES):
+        fleet.tick(fleet.devices[i % len(fleet)], i // len(fleet))
+        if i % 1000 == 999:
+            await simulator.mqtt.drain()
+
+    deadline = time.monotonic() + TIMEOUT
+    while broker.recorder.records < STATUS_MESSAGES:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Recording timed out")
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    broker.recorder.close()
+    broker.recorder = None
+    print(
+        f"recorded {STATUS_MESSAGES} messages in {elapsed * 1e3:.1f} ms, "
+        f"{os.path.getsize(path) / 1e6:.1f} MB"
+    )
+
+
+def measure_read(path: str):
+    start = time.perf_counter()
+    messages = sum(1 for _ in read_recording(path))
+    elapsed = time.perf_counter() - start
+    print(f"read: {messages / elapsed:9.0f} records/s")
+
+
+async def main(path: str):
+    logging.getLogger().setLevel(logging.WARNING)
+    async with MirAIeSimulator(device_count=DEVICE_COUNT) as simulator:
+        broker = simulator.configure_broker(MirAIeBroker())
+        hub = MirAIeHub()
+        await hub.init("9999999999", "password", broker)
+        await hub.wait_for(InitStage.BROKER_SUBSCRIBED, TIMEOUT)
+
+        with tempfile.TemporaryDirectory() as directory:
+            if path is None:
+                path = os.path.join(directory, "traffic.rec")
+                await record(simulator, broker, path)
+            measure_read(path)
+            result = await replay(broker, path)
+            print(f"replay: {result.rate:9.0f} msg/s ({result.messages} messages)")
+
+        await hub.__aexit__()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", nargs="?", help="Replay this recording instead of recording one")
+    args = parser.parse_args()
+    asyncio.run(main(args.recording))
@@ -0,0 +1,70 @@
+"""Startup benchmark for MirAIeHub.init.
+
+Runs against the local simulator with a fixed per-request REST latency and
+measures the time until devices are usable: a full cold start, a staged
+start (init returns once the topology is known, timed until the first
+device has a status) and a warm start from the snapshot written by the
+cold run. Each start is also timed until the broker has subscribed.
+
+Run with: python -m benchmarks.startup_benchmark [device count]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from miraie_ac import MirAIeHub, MirAIeBroker, InitStage
+from simulator import MirAIeSimulator
+
+
+DEVICE_COUNT = 50
+LATENCY = 0.05  # In seconds, per request
+TIMEOUT = 30  # In seconds, per start
+
+
+async def measure(
+    simulator: MirAIeSimulator, name: str, snapshot_path: str = None, wait_for_status: bool = True
+) -> float:
+    broker = simulator.configure_broker(MirAIeBroker())
+    requests = simulator.rest_requests
+
+    async with MirAIeHub() as hub:
+        start = time.perf_counter()
+        await hub.init(
+            "9999999999", "password", broker, snapshot_path=snapshot_path, wait_for_status=wait_for_status
+        )
+        initialized = time.perf_counter() - start
+        blocking_requests = simulator.rest_requests - requests
+        await hub.home.devices[0].wait_for_status()
+        usable = time.perf_counter() - start
+        await hub.wait_for(InitStage.BROKER_SUBSCRIBED, TIMEOUT)
+        subscribed = time.perf_counter() - start
+        print(
+            f"{name:>12}: init {initialized * 1e3:7.1f} ms "
+            f"({blocking_requests} REST requests), "
+            f"first device usable {usable * 1e3:7.1f} ms, "
+            f"subscribed {subscribed * 1e3:7.1f} ms"
+        )
+
+        # Let warm start revalidation finish so it rewrites the snapshot
+        await asyncio.sleep(LATENCY * 4)
+    return usable
+
+
+async def main(device_count: int):
+    async with MirAIeSimulator(device_count, rest_latency=LATENCY) as simulator:
+        print(f"{device_count} devices, {LATENCY * 1e3:.0f} ms per REST request")
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_path = os.path.join(directory, "snapshot.json")
+            cold = await measure(simulator, "cold start", snapshot_path)
+            await measure(simulator, "staged start", wait_for_status=False)
+            warm = await measure(simulator, "warm start", snapshot_path)
+        print(f"warm start makes the first device usable {cold / warm:.1f}x sooner than a cold start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("device_count", nargs="?", type=int, default=DEVICE_COUNT)
+    asyncio.run(main(parser.parse_args().device_count))
@@ -2,6 +2,7 @@
 from miraie_ac.hub import MirAIeHub
 from miraie_ac.device import Device
 from miraie_ac.broker import MirAIeBroker
+from miraie_ac.sharding import ShardedMirAIeBroker
 from miraie_ac.enums import (
     DisplayMode,
     FanMode,
@@ -11,4 +12,5 @@ from miraie_ac.enums import (
     SwingMode,
     ConvertiMode,
     ConsumptionPeriodType,
+    InitStage,
 )
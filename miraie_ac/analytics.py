@@ -0,0 +1,225 @@
+"""Fleet energy analytics.
+
+Loads per-device consumption (`{"DDMMYYYY": kWh}` dicts, as returned by
+`get_energy_consumption`) into a dense device x period matrix. NumPy is
+used when it is installed, otherwise the matrix is a flat `array("d")`.
+Missing values are stored as NaN and ignored by every aggregate.
+"""
+
+import math
+from array import array
+from datetime import date, timedelta
+from typing import Hashable, Iterable, Mapping
+
+from .device import Device
+from .energy import EnergyClient, format_period_key, parse_period_key
+from .enums import ConsumptionPeriodType
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+# Coarser grains each grain can be converted to
+_GRAIN_ORDER = {
+    ConsumptionPeriodType.DAILY: 0,
+    ConsumptionPeriodType.WEEKLY: 1,
+    ConsumptionPeriodType.MONTHLY: 2,
+}
+
+
+def period_start(period_type: ConsumptionPeriodType, day: date) -> date:
+    """Start of the period containing `day`. Weeks start on Sunday."""
+    if period_type == ConsumptionPeriodType.DAILY:
+        return day
+    if period_type == ConsumptionPeriodType.WEEKLY:
+        return day - timedelta(days=(day.weekday() + 1) % 7)
+    return day.replace(day=1)
+
+
+class FleetEnergyMatrix:
+    def __init__(
+        self,
+        period_type: ConsumptionPeriodType,
+        device_ids: list[str],
+        periods: list[str],
+        values,
+        use_numpy: bool = None,
+    ):
+        self.period_type = period_type
+        self.device_ids = list(device_ids)
+        self.periods = list(periods)
+        self.use_numpy = (np is not None) if use_numpy is None else use_numpy
+        if self.use_numpy and np is None:
+            raise ValueError("NumPy is not installed")
+
+        size = len(self.device_ids) * len(self.periods)
+        if self.use_numpy:
+            self.values = np.asarray(values, dtype=np.float64).reshape(len(self.device_ids), len(self.periods))
+        else:
+            self.values = values if isinstance(values, array) else array("d", values)
+            if len(self.values) != size:
+                raise ValueError(f"Expected {size} values, got {len(self.values)}")
+
+    @classmethod
+    def from_consumption(
+        cls,
+        consumption: Mapping[str, Mapping[str, float]],
+        period_type: ConsumptionPeriodType,
+        use_numpy: bool = None,
+    ) -> "FleetEnergyMatrix":
+        """Build from `{device_id: {date_key: kWh}}`."""
+        device_ids = list(consumption)
+        keys = {key for values in consumption.values() for key in values}
+        periods = sorted(keys, key=lambda key: parse_period_key(period_type, key))
+        columns = {key: column for column, key in enumerate(periods)}
+
+        width = len(periods)
+        values = array("d", [math.nan]) * (len(device_ids) * width)
+        for row, device_id in enumerate(device_ids):
+            offset = row * width
+            for key, kwh in consumption[device_id].items():
+                values[offset + columns[key]] = float(kwh)
+
+        if use_numpy is None:
+            use_numpy = np is not None
+        if use_numpy and np is None:
+            raise ValueError("NumPy is not installed")
+        if use_numpy:
+            values = np.frombuffer(values, dtype=np.float64)
+        return cls(period_type, device_ids, periods, values, use_numpy=use_numpy)
+
+    @classmethod
+    async def load(
+        cls,
+        energy: EnergyClient,
+        period_type: ConsumptionPeriodType,
+        from_date: str,
+        to_date: str = None,
+        devices: Iterable[Device] = None,
+        use_numpy: bool = None,
+    ) -> "FleetEnergyMatrix":
+        consumption = await energy.get_fleet_consumption(period_type, from_date, to_date, devices)
+        return cls.from_consumption(consumption, period_type, use_numpy=use_numpy)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.device_ids), len(self.periods)
+
+    def _row(self, row: int):
+        width = len(self.periods)
+        return self.values[row * width:(row + 1) * width]
+
+    def device_totals(self) -> dict[str, float]:
+        if self.use_numpy:
+            totals = np.nansum(self.values, axis=1)
+            return dict(zip(self.device_ids, totals.tolist()))
+        return {
+            device_id: _nansum(self._row(row)) for row, device_id in enumerate(self.device_ids)
+        }
+
+    def period_totals(self) -> dict[str, float]:
+        if self.use_numpy:
+            totals = np.nansum(self.values, axis=0)
+            return dict(zip(self.periods, totals.tolist()))
+
+        totals = [0.0] * len(self.periods)
+        for row in range(len(self.device_ids)):
+            for column, value in enumerate(self._row(row)):
+                if value == value:
+                    totals[column] += value
+        return dict(zip(self.periods, totals))
+
+    def total(self) -> float:
+        if self.use_numpy:
+            return float(np.nansum(self.values))
+        return _nansum(self.values)
+
+    def top(self, n: int = 10) -> list[tuple[str, float]]:
+        """The `n` largest consumers as `(device_id, kWh)`, largest first."""
+        totals = self.device_totals()
+        if self.use_numpy and len(totals) > n:
+            values = np.fromiter(totals.values(), dtype=np.float64, count=len(totals))
+            indices = np.argpartition(-values, n)[:n]
+            indices = indices[np.argsort(-values[indices], kind="stable")]
+            return [(self.device_ids[i], float(values[i])) for i in indices]
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def rollup(self, groups: Mapping[str, Hashable]) -> dict[Hashable, float]:
+        """Sum device totals per group, `groups` maps device id to group."""
+        result: dict[Hashable, float] = {}
+        for device_id, total in self.device_totals().items():
+            group = groups.get(device_id)
+            if group is None:
+                continue
+            result[group] = result.get(group, 0.0) + total
+        return result
+
+    def by_model(self, devices: Iterable[Device]) -> dict[str, float]:
+        """Totals per `DeviceDetails.model_number`."""
+        groups = {}
+        for device in devices:
+            details = getattr(device, "details", None)
+            if details is not None:
+                groups[device.id] = details.model_number
+        return self.rollup(groups)
+
+    def by_home(self, homes: Iterable) -> dict[str, float]:
+        """Totals per `Home.id`."""
+        return self.rollup({device.id: home.id for home in homes for device in home.devices})
+
+    def resample(self, period_type: ConsumptionPeriodType) -> "FleetEnergyMatrix":
+        """Convert to a coarser grain (daily -> weekly -> monthly) by summing periods.
+
+        A target period without any value stays missing (NaN). Weeks are not
+        split when resampling weekly to monthly: a week spanning two months
+        counts entirely towards the month it starts in.
+        """
+        if _GRAIN_ORDER[period_type] < _GRAIN_ORDER[self.period_type]:
+            raise ValueError(f"Cannot convert {self.period_type.value} to {period_type.value}")
+        if period_type == self.period_type:
+            return self
+
+        # Periods are sorted, so every target period is a contiguous run of columns
+        targets = []
+        starts = []
+        for column, key in enumerate(self.periods):
+            day = parse_period_key(self.period_type, key)
+            target = format_period_key(period_type, period_start(period_type, day))
+            if not targets or targets[-1] != target:
+                targets.append(target)
+                starts.append(column)
+
+        if self.use_numpy:
+            present = ~np.isnan(self.values)
+            if present.size:
+                values = np.add.reduceat(np.where(present, self.values, 0.0), starts, axis=1)
+                values[np.add.reduceat(present, starts, axis=1) == 0] = np.nan
+            else:
+                values = np.zeros((len(self.device_ids), len(targets)))
+            return FleetEnergyMatrix(period_type, self.device_ids, targets, values, use_numpy=True)
+
+        ends = starts[1:] + [len(self.periods)]
+        values = array("d")
+        for row in range(len(self.device_ids)):
+            data = self._row(row)
+            for start, end in zip(starts, ends):
+                period = [value for value in data[start:end] if value == value]
+                values.append(math.fsum(period) if period else math.nan)
+        return FleetEnergyMatrix(period_type, self.device_ids, targets, values, use_numpy=False)
+
+    def to_dict(self) -> dict[str, dict[str, float]]:
+        """Back to `{device_id: {date_key: kWh}}`, without missing values."""
+        result = {}
+        for row, device_id in enumerate(self.device_ids):
+            data = self.values[row].tolist() if self.use_numpy else self._row(row)
+            result[device_id] = {
+                key: value for key, value in zip(self.periods, data) if value == value
+            }
+        return result
+
+
+def _nansum(values) -> float:
+    # NaN is the only value not equal to itself
+    return math.fsum(value for value in values if value == value)
@@ -3,9 +3,19 @@ import asyncio
 import ssl
 import certifi
 import random
-import json
+import time
+from itertools import count
+from enum import Enum
+from typing import Callable
+from . import codec
 from .enums import PowerMode, HVACMode, FanMode, PresetMode, SwingMode, DisplayMode, ConvertiMode
 from .user import User
+from .registry import DeviceRegistry, topic_prefix
+from .topic import TopicRouter, wildcard_filter
+from .latency import LatencyTracker
+from .metrics import BrokerMetrics
+from .outbox import CommandOutbox
+from .dispatch import Dispatcher
 from .logger import LOGGER
 
 
@@ -14,58 +24,370 @@ class MirAIeBroker:
     port = 8883
     use_ssl = True
     client_id = f"ha-mirae-mqtt-{random.randint(0, 1000)}"
-    reconnect_interval = 5  # In seconds
+    reconnect_interval = 5  # In seconds, doubled after each failed attempt
+    reconnect_interval_max = 120  # In seconds
+    coalesce_window = 0  # In seconds, 0 disables command coalescing
+    # Subscribe with one `+` wildcard filter per home and message type. If the
+    # broker refuses wildcards or drops the connection, topics are subscribed
+    # in batches instead.
+    use_wildcards = True
+    subscribe_batch_size = 200  # Topic filters per SUBSCRIBE packet
+    subscribe_timeout = 10  # In seconds to wait for SUBACK
+    dispatch_workers = 4  # 0 handles messages inline in the receive loop
+    executor = None  # For callbacks registered with executor=True, None uses the loop's default
+    recorder = None  # TrafficRecorder capturing received and published messages
+    # Apply commands to the local status before the device confirms them
+    optimistic = False
+    optimistic_timeout = 10  # In seconds before an unconfirmed change is rolled back
 
-    def __init__(self) -> None:
-        self.status_callbacks: dict[str, callable] = {}
+    def __init__(
+        self,
+        coalesce_window: float = None,
+        outbox: CommandOutbox = None,
+        dispatcher: Dispatcher = None,
+        optimistic: bool = None,
+    ) -> None:
+        self.router = TopicRouter()
+        self.registry = DeviceRegistry()
+        if coalesce_window is not None:
+            self.coalesce_window = coalesce_window
+        if optimistic is not None:
+            self.optimistic = optimistic
+        # Commands waiting to be merged, keyed by control topic
+        self._pending_payloads: dict[str, dict] = {}
+        self._pending_waiters: dict[str, list[asyncio.Future]] = {}
+        self._pending_commands: dict[str, list[str]] = {}
+        self._flush_tasks = set()
+        # Encoded payload bytes, without the sid, per (builder, enum value)
+        self._payload_cache: dict[tuple[str, Enum], bytes] = {}
+        self._sids = count(1)
+        self.latency = LatencyTracker()
+        self.metrics = BrokerMetrics()
+        # Commands published while disconnected, replayed on reconnect
+        self.outbox = outbox if outbox is not None else CommandOutbox()
+        self._ready = asyncio.Event()
+        # Monotonic time of the last message from and command to each topic prefix
+        self._last_message: dict[str, float] = {}
+        self._last_command: dict[str, float] = {}
+        if dispatcher is None and self.dispatch_workers > 0:
+            dispatcher = Dispatcher(self.metrics, self.dispatch_workers)
+        self.dispatcher = dispatcher
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the broker is connected, subscribed and can publish."""
+        return self._ready.is_set()
+
+    async def wait_until_ready(self, timeout: float = None):
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    def is_streaming(self, topic: str) -> bool:
+        """Whether messages of `topic` are being received."""
+        return self.is_ready
+
+    def last_message_at(self, topic: str) -> float:
+        """Monotonic time of the last message of the device of `topic`, or None."""
+        return self._last_message.get(topic_prefix(topic))
+
+    def last_command_at(self, topic: str) -> float:
+        """Monotonic time of the last command to the device of `topic`, or None."""
+        return self._last_command.get(topic_prefix(topic))
 
     def register_device_callback(self, topic: str, callback):
-        self.status_callbacks[topic] = callback
+        self.router.add(topic, callback)
 
     def remove_device_callback(self, topic: str):
-        self.status_callbacks.pop(topic, None)
+        self.router.remove(topic)
+
+    def set_registry(self, registry: DeviceRegistry):
+        self.registry = registry
+
+    def set_password(self, password: str):
+        """Set the credentials used for the next (re)connect."""
+        self._password = password
 
     def set_topics(self, topics: list[str]):
         self.commandTopics = topics
 
+    async def update_topics(self, topics: list[str]):
+        """Replace the topics, subscribing and unsubscribing the difference if connected."""
+        previous = self._filters() if hasattr(self, "commandTopics") else []
+        self.set_topics(topics)
+        if not self.is_ready:
+            return
+
+        filters = self._filters()
+        current = set(filters)
+        removed = [topic_filter for topic_filter in previous if topic_filter not in current]
+        known = set(previous)
+        added = [topic_filter for topic_filter in filters if topic_filter not in known]
+        if added:
+            await self._subscribe_filters(added)
+        if removed:
+            await self.client.unsubscribe(removed)
+            self.metrics.subscriptions = len(self._filters())
+
+    def _filters(self) -> list[str]:
+        if self.use_wildcards:
+            return list(dict.fromkeys(wildcard_filter(topic) for topic in self.commandTopics))
+        return list(self.commandTopics)
+
     async def on_connect(self):
-        for topic in self.commandTopics:
-            print("Subscribing to topic: ", topic)
-            await self.client.subscribe(topic)
+        await self._subscribe_filters(self._filters())
+
+    async def _subscribe_filters(self, filters: list[str]):
+        if self.use_wildcards:
+            LOGGER.info("Subscribing to topics: %s", ", ".join(filters))
+            try:
+                accepted = await self._subscribe(filters)
+            except (MqttError, asyncio.TimeoutError):
+                # Some brokers drop the connection instead of refusing, the reconnect subscribes to each topic
+                LOGGER.warning("Wildcard subscription failed, subscribing to each topic after reconnecting")
+                self.use_wildcards = False
+                raise
+            if accepted:
+                self.metrics.subscriptions = len(self._filters())
+                return
+            # Remembered for reconnects
+            LOGGER.warning("Wildcard subscriptions were refused, subscribing to each topic")
+            self.use_wildcards = False
+            filters = self._filters()
+
+        LOGGER.info("Subscribing to %d topics", len(filters))
+        for start in range(0, len(filters), self.subscribe_batch_size):
+            batch = filters[start:start + self.subscribe_batch_size]
+            if not await self._subscribe(batch):
+                raise MqttError(f"Subscription refused for topics {batch}")
+        self.metrics.subscriptions = len(self._filters())
+
+    async def _subscribe(self, filters: list[str]) -> bool:
+        """Subscribe to `filters` in one SUBSCRIBE packet, returns False if any was refused."""
+        if not filters:
+            return True
+        codes = await self.client.subscribe(
+            [(topic_filter, 0) for topic_filter in filters], timeout=self.subscribe_timeout
+        )
+        # paho returns ReasonCode objects, 0x80 and above are failures
+        return not any(code.is_failure if hasattr(code, "is_failure") else code >= 0x80 for code in codes)
 
     def on_message(self, message: Message):
-        parsed = json.loads(message.payload.decode("utf-8"))
-        func = self.status_callbacks.get(message.topic.value)
-        func(parsed)
+        topic = message.topic.value
+        if self.recorder is not None:
+            self.recorder.received(topic, message.payload)
+        prefix, _, suffix = topic.rpartition("/")
+        self.metrics.message_received(suffix)
+
+        func = self.router.resolve(prefix, suffix)
+        if func is None:
+            # Other devices matched by a wildcard, or removed devices
+            self.metrics.unrouted += 1
+            LOGGER.debug("Dropping message on unknown topic %s", topic)
+            return
+
+        start = time.perf_counter()
+        try:
+            parsed = codec.loads(message.payload)
+        except ValueError as error:
+            self.metrics.decode_errors += 1
+            LOGGER.error("Unable to decode message on %s: %s", topic, error)
+            return
+        decoded = time.perf_counter()
+        self.metrics.decode.observe(decoded - start)
+        self._last_message[prefix] = time.monotonic()
+        self._deliver(topic, prefix, suffix, func, parsed, decoded)
+
+    def deliver(self, topic: str, payload: dict):
+        """Handle a decoded payload as if it was received on `topic`, e.g. a polled status."""
+        prefix, _, suffix = topic.rpartition("/")
+        func = self.router.resolve(prefix, suffix)
+        if func is None:
+            LOGGER.debug("Dropping payload for unknown topic %s", topic)
+            return
+        self._deliver(topic, prefix, suffix, func, payload, time.perf_counter())
+
+    def _deliver(self, topic: str, prefix: str, suffix: str, func: Callable, parsed: dict, decoded: float):
+        if suffix == "status":
+            self.latency.status_received(self._device_key(prefix), parsed)
+
+        if self.dispatcher is not None:
+            self.dispatcher.put(topic, func, parsed)
+            return
+
+        try:
+            # Async callbacks are already scheduled, their result is not awaited here
+            func(parsed)
+        except Exception:
+            self.metrics.dispatch_errors += 1
+            LOGGER.exception("Error handling message on %s", topic)
+        self.metrics.dispatch.observe(time.perf_counter() - decoded)
+
+    def _device_key(self, prefix: str) -> str:
+        device = self.registry.get_by_prefix(prefix)
+        return device.id if device is not None else prefix
+
+    def _next_sid(self) -> str:
+        return str(next(self._sids))
 
     async def connect(self, username: str, access_token: User, get_token):
-        # Set on_token_expire callback
-        password = access_token
+        self._password = access_token
 
         context = None
 
         if self.use_ssl:
             context = ssl.create_default_context(cafile=certifi.where())
 
+        failures = 0
         while True:
             try:
                 async with Client(
                     hostname=self.host,
                     port=self.port,
                     username=username,
-                    password=password,
+                    password=self._password,
                     tls_context=context,
                 ) as client:
                     self.client = client
+                    self.metrics.connected()
                     await self.on_connect()
+                    await self._replay_outbox()
+                    self._ready.set()
+                    failures = 0
                     LOGGER.info(f"Broker connection has been established")
                     async for message in client.messages:
                         self.on_message(message)
 
             except MqttError as error:
-                LOGGER.error(f'Error "{error}". Reconnecting in {self.reconnect_interval} seconds.')
-                password = await get_token()
-                await asyncio.sleep(self.reconnect_interval)
+                self._ready.clear()
+                self.metrics.disconnected()
+                delay = self._reconnect_delay(failures)
+                failures += 1
+                LOGGER.error(f'Error "{error}". Reconnecting in {delay:.1f} seconds.')
+                self._password = await get_token()
+                await asyncio.sleep(delay)
+
+            except asyncio.CancelledError:
+                self._ready.clear()
+                raise
+
+    def _reconnect_delay(self, failures: int) -> float:
+        delay = min(self.reconnect_interval_max, self.reconnect_interval * 2**failures)
+        # Jitter spreads out reconnects of many clients after an outage
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def encode_payload(self, builder: Callable[..., dict], value, sid: str) -> bytes:
+        """Encode a command payload, reusing the cached bytes for enum values."""
+        key = (builder.__name__, value)
+        head = self._payload_cache.get(key) if isinstance(value, Enum) else None
+
+        if head is None:
+            payload = builder(value)
+            payload.pop("sid", None)
+            # Encoded without the closing brace so the sid can be appended
+            head = codec.dumps(payload)[:-1]
+            if isinstance(value, Enum):
+                self._payload_cache[key] = head
+
+        return head + b',"sid":"' + sid.encode("ascii") + b'"}'
+
+    async def _send(self, topic: str, payload: bytes, sid: str, commands: tuple):
+        sent_at = time.monotonic()
+        try:
+            await self.client.publish(topic, payload)
+        except Exception:
+            self.metrics.publish_errors += 1
+            raise
+        self.metrics.publishes += 1
+        if self.recorder is not None:
+            self.recorder.published(topic, payload)
+        self.latency.command_sent(self._device_key(topic_prefix(topic)), sid, commands, sent_at)
+
+    def _enqueue(self, topic: str, payload: dict, commands: tuple, waiters: list[asyncio.Future]):
+        LOGGER.debug("Broker not ready, queueing command for %s", topic)
+        self.outbox.put(topic, payload, commands, waiters)
+
+    async def _replay_outbox(self):
+        while True:
+            command = self.outbox.pop()
+            if command is None:
+                return
+
+            sid = command.payload["sid"] = self._next_sid()
+            try:
+                await self._send(command.topic, codec.dumps(command.payload), sid, command.commands)
+            except MqttError:
+                self.outbox.push_front(command)
+                raise
+            except Exception as error:
+                command.resolve(error)
+            else:
+                command.resolve()
+
+    async def _publish(self, topic: str, builder: Callable[..., dict], value):
+        command = builder.__name__[len("build_"):-len("_payload")]
+        self._last_command[topic_prefix(topic)] = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        if self.coalesce_window <= 0:
+            if self.is_ready:
+                sid = self._next_sid()
+                try:
+                    await self._send(topic, self.encode_payload(builder, value, sid), sid, (command,))
+                    return
+                except MqttError as error:
+                    LOGGER.warning(f'Publish failed with "{error}", queueing command')
+
+            waiter = loop.create_future()
+            self._enqueue(topic, builder(value), (command,), [waiter])
+            await waiter
+            return
+
+        payload = builder(value)
+        waiter = loop.create_future()
+
+        if topic not in self._pending_payloads:
+            self._pending_payloads[topic] = {}
+            self._pending_waiters[topic] = []
+            self._pending_commands[topic] = []
+            # Flush in a separate task so a cancelled caller doesn't drop the batch
+            task = loop.create_task(self._flush_after_window(topic))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+        # Later commands win when they touch the same keys
+        self._pending_payloads[topic].update(payload)
+        self._pending_waiters[topic].append(waiter)
+        self._pending_commands[topic].append(command)
+        await waiter
+
+    async def _flush_after_window(self, topic: str):
+        await asyncio.sleep(self.coalesce_window)
+        payload = self._pending_payloads.pop(topic)
+        waiters = self._pending_waiters.pop(topic)
+        commands = tuple(dict.fromkeys(self._pending_commands.pop(topic)))
+        LOGGER.debug("Publishing %d coalesced command(s) to %s", len(waiters), topic)
+
+        if self.is_ready:
+            sid = payload["sid"] = self._next_sid()
+            try:
+                await self._send(topic, codec.dumps(payload), sid, commands)
+            except MqttError as error:
+                LOGGER.warning(f'Publish failed with "{error}", queueing command')
+            except Exception as error:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+                return
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+                return
+
+        self._enqueue(topic, payload, commands, waiters)
+
+    def build_payload(self, command: str, value) -> dict:
+        """Control payload of `command`, e.g. `build_payload("power", PowerMode.ON)`."""
+        return getattr(self, f"build_{command}_payload")(value)
 
     def build_base_payload(self):
         return {
@@ -81,7 +403,7 @@ class MirAIeBroker:
         return payload
 
     async def set_power(self, topic: str, power: PowerMode):
-        await self.client.publish(topic, json.dumps(self.build_power_payload(power)))
+        await self._publish(topic, self.build_power_payload, power)
 
     # Temperature
     def build_temperature_payload(self, temperature: float):
@@ -90,9 +412,7 @@ class MirAIeBroker:
         return payload
 
     async def set_temperature(self, topic: str, temperature: float):
-        await self.client.publish(
-            topic, json.dumps(self.build_temperature_payload(temperature))
-        )
+        await self._publish(topic, self.build_temperature_payload, temperature)
 
     # HVAC Mode
     def build_hvac_mode_payload(self, mode: HVACMode):
@@ -101,7 +421,7 @@ class MirAIeBroker:
         return payload
 
     async def set_hvac_mode(self, topic: str, mode: HVACMode):
-        await self.client.publish(topic, json.dumps(self.build_hvac_mode_payload(mode)))
+        await self._publish(topic, self.build_hvac_mode_payload, mode)
 
     # Fan Mode
     def build_fan_mode_payload(self, mode: FanMode):
@@ -110,7 +430,7 @@ class MirAIeBroker:
         return payload
 
     async def set_fan_mode(self, topic: str, mode: FanMode):
-        await self.client.publish(topic, json.dumps(self.build_fan_mode_payload(mode)))
+        await self._publish(topic, self.build_fan_mode_payload, mode)
 
     # Preset Mode
     def build_preset_mode_payload(self, mode: PresetMode):
@@ -140,9 +460,7 @@ class MirAIeBroker:
         return payload
 
     async def set_preset_mode(self, topic: str, mode: PresetMode):
-        await self.client.publish(
-            topic, json.dumps(self.build_preset_mode_payload(mode))
-        )
+        await self._publish(topic, self.build_preset_mode_payload, mode)
 
     # Vertical Swing Mode
     def build_v_swing_mode_payload(self, mode: SwingMode):
@@ -151,9 +469,7 @@ class MirAIeBroker:
         return payload
 
     async def set_v_swing_mode(self, topic: str, mode: SwingMode):
-        await self.client.publish(
-            topic, json.dumps(self.build_v_swing_mode_payload(mode))
-        )
+        await self._publish(topic, self.build_v_swing_mode_payload, mode)
     
     # Horizontal Swing Mode
     def build_h_swing_mode_payload(self, mode: SwingMode):
@@ -162,9 +478,7 @@ class MirAIeBroker:
         return payload
 
     async def set_h_swing_mode(self, topic: str, mode: SwingMode):
-        await self.client.publish(
-            topic, json.dumps(self.build_h_swing_mode_payload(mode))
-        )
+        await self._publish(topic, self.build_h_swing_mode_payload, mode)
 
     # Display Mode
     def build_display_mode_payload(self, mode: DisplayMode):
@@ -173,9 +487,7 @@ class MirAIeBroker:
         return payload
 
     async def set_display_mode(self, topic: str, mode: DisplayMode):
-        await self.client.publish(
-            topic, json.dumps(self.build_display_mode_payload(mode))
-        )
+        await self._publish(topic, self.build_display_mode_payload, mode)
         
     # Converti Mode
     def build_converti_mode_payload(self, mode: ConvertiMode):
@@ -186,6 +498,4 @@ class MirAIeBroker:
         return payload
 
     async def set_converti_mode(self, topic: str, mode: ConvertiMode):
-        await self.client.publish(
-            topic, json.dumps(self.build_converti_mode_payload(mode))
-        )
+        await self._publish(topic, self.build_converti_mode_payload, mode)
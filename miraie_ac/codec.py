@@ -0,0 +1,34 @@
+"""JSON codec for MQTT payloads.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both backends decode straight from bytes and encode to compact
+bytes.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+
+    def loads(data: Union[bytes, bytearray, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+else:
+
+    def loads(data: Union[bytes, bytearray, str]) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
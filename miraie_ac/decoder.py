@@ -0,0 +1,110 @@
+"""Table-driven decoder for MirAIe status payloads.
+
+Shared by the REST status endpoint and the MQTT status topic. Payload
+keys follow fixtures/status.jsonc. Unknown or missing values decode to the
+field's default instead of raising.
+"""
+
+from enum import Enum
+from typing import Any, Callable
+
+from .enums import PowerMode, FanMode, SwingMode, DisplayMode, HVACMode, PresetMode, ConvertiMode
+from .utils import toFloat
+from .logger import LOGGER
+
+
+class StatusField:
+    __slots__ = ("name", "key", "decode")
+
+    def __init__(self, name: str, key: str, decode: Callable[[dict], Any]):
+        self.name = name
+        self.key = key
+        self.decode = decode
+
+
+def build_lookup(enum: type[Enum]) -> dict:
+    """Map every payload value of `enum` (and its string form) to its member."""
+    table = {}
+    for member in enum:
+        table[member.value] = member
+        table[str(member.value)] = member
+    return table
+
+
+def enum_field(name: str, key: str, enum: type[Enum], default: Enum) -> StatusField:
+    table = build_lookup(enum)
+
+    def decode(payload: dict):
+        value = payload.get(key)
+        try:
+            return table[value]
+        except (KeyError, TypeError):
+            if value is not None:
+                LOGGER.debug("Unknown %s value %r, using %s", key, value, default)
+            return default
+
+    return StatusField(name, key, decode)
+
+
+def float_field(name: str, key: str) -> StatusField:
+    def decode(payload: dict):
+        try:
+            return toFloat(payload.get(key))
+        except TypeError:
+            return -1.0
+
+    return StatusField(name, key, decode)
+
+
+# Checked in order, first flag that is "on" wins
+PRESET_FLAGS = (
+    ("acpm", PresetMode.BOOST),
+    ("acem", PresetMode.ECO),
+    ("acec", PresetMode.CLEAN),
+)
+PRESET_KEYS = frozenset(key for key, _ in PRESET_FLAGS)
+
+
+def decode_preset(payload: dict) -> PresetMode:
+    for key, mode in PRESET_FLAGS:
+        if payload.get(key) == "on":
+            return mode
+    return PresetMode.NONE
+
+
+# Ordered as DeviceStatus.FIELDS, without is_online which is not part of the payload
+STATUS_SPEC = (
+    float_field("temperature", "actmp"),
+    float_field("room_temperature", "rmtmp"),
+    enum_field("power_mode", "ps", PowerMode, PowerMode.OFF),
+    enum_field("fan_mode", "acfs", FanMode, FanMode.AUTO),
+    enum_field("v_swing_mode", "acvs", SwingMode, SwingMode.AUTO),
+    enum_field("h_swing_mode", "achs", SwingMode, SwingMode.AUTO),
+    enum_field("display_mode", "acdc", DisplayMode, DisplayMode.ON),
+    enum_field("hvac_mode", "acmd", HVACMode, HVACMode.AUTO),
+    StatusField("preset_mode", "acpm", decode_preset),
+    enum_field("converti_mode", "cnv", ConvertiMode, ConvertiMode.OFF),
+)
+
+_DECODERS = tuple(field.decode for field in STATUS_SPEC)
+
+
+def decode_status(payload: dict) -> list:
+    """Decode a status payload into DeviceStatus field values, in STATUS_SPEC order."""
+    return [decode(payload) for decode in _DECODERS]
+
+
+def decode_fields(payload: dict) -> dict:
+    """Decode only the fields whose key is in `payload`, e.g. a control payload.
+
+    The preset is only decoded when the payload sets all of its flags, a
+    converti payload clears some of them without setting the preset.
+    """
+    fields = {}
+    for field in STATUS_SPEC:
+        if field.key not in payload:
+            continue
+        if field.name == "preset_mode" and not PRESET_KEYS <= payload.keys():
+            continue
+        fields[field.name] = field.decode(payload)
+    return fields
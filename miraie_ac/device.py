@@ -1,11 +1,29 @@
-from typing import Callable
+import asyncio
+import inspect
+from typing import Callable, Iterable
 from .broker import MirAIeBroker
+from .dispatch import gather_callbacks
 from .enums import PowerMode, FanMode, SwingMode, DisplayMode, HVACMode, PresetMode, ConvertiMode
-from .utils import toFloat
+from .decoder import decode_status, decode_fields
 from .logger import LOGGER
 
 
 class DeviceStatus:
+    FIELDS = (
+        "is_online",
+        "temperature",
+        "room_temperature",
+        "power_mode",
+        "fan_mode",
+        "v_swing_mode",
+        "h_swing_mode",
+        "display_mode",
+        "hvac_mode",
+        "preset_mode",
+        "converti_mode",
+    )
+    __slots__ = FIELDS
+
     def __init__(
         self,
         is_online: bool,
@@ -31,7 +49,7 @@ class DeviceStatus:
         self.hvac_mode = hvac_mode
         self.preset_mode = preset_mode
         self.converti_mode = converti_mode
-        LOGGER.debug(f"Device status: {self.__str__()}")
+        LOGGER.debug("Device status: %s", self)
     
     def __str__(self):
         return (
@@ -51,7 +69,31 @@ class DeviceStatus:
     def __repr__(self):
         return self.__str__()
 
+    @classmethod
+    def from_payload(cls, payload: dict, is_online: bool) -> "DeviceStatus":
+        """Build a status from a REST or MQTT status payload."""
+        return cls(is_online, *decode_status(payload))
+
+    def diff(self, other: "DeviceStatus") -> set[str]:
+        """Return the names of the fields that differ from `other`."""
+        return {
+            field
+            for field in self.FIELDS
+            if getattr(self, field) != getattr(other, field)
+        }
+
 class DeviceDetails:
+    __slots__ = (
+        "model_name",
+        "mac_address",
+        "category",
+        "brand",
+        "firmware_version",
+        "serial_number",
+        "model_number",
+        "product_serial_number",
+    )
+
     def __init__(
         self,
         model_name,
@@ -71,7 +113,7 @@ class DeviceDetails:
         self.serial_number = serial_number
         self.model_number = model_number
         self.product_serial_number = product_serial_number
-        LOGGER.debug(f"Device details: {self.__str__()}")
+        LOGGER.debug("Device details: %s", self)
         
     def __str__(self):
         return (
@@ -89,7 +131,40 @@ class DeviceDetails:
     def __repr__(self):
         return self.__str__()
 
+class PendingField:
+    """A field changed optimistically, waiting for the device to confirm it."""
+
+    __slots__ = ("value", "previous", "deadline")
+
+    def __init__(self, value, previous, deadline: float):
+        self.value = value
+        # Last value reported by the device, restored on rollback
+        self.previous = previous
+        self.deadline = deadline
+
+
 class Device:
+    __slots__ = (
+        "id",
+        "name",
+        "friendly_name",
+        "control_topic",
+        "status_topic",
+        "connection_status_topic",
+        "broker",
+        "status",
+        "details",
+        "history",
+        "_callbacks",
+        "_field_callbacks",
+        "_executor_callbacks",
+        "_status_waiters",
+        "_pending",
+        "_pending_timer",
+        "_rollback_callbacks",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         id: str,
@@ -107,8 +182,18 @@ class Device:
         self.status_topic = status_topic
         self.connection_status_topic = connection_status_topic
         self.broker = broker
+        # TelemetryHistory recording every status message, if enabled
+        self.history = None
 
         self._callbacks = set()
+        self._field_callbacks: dict[Callable, frozenset] = {}
+        # Sync callbacks run in the broker's executor
+        self._executor_callbacks = set()
+        self._status_waiters: list[asyncio.Future] = None
+        # Optimistic changes by field, see broker.optimistic
+        self._pending: dict[str, PendingField] = {}
+        self._pending_timer: asyncio.TimerHandle = None
+        self._rollback_callbacks = set()
         self.broker.register_device_callback(self.status_topic, self.status_handler)
         self.broker.register_device_callback(
             self.connection_status_topic, self.connection_status_handler
@@ -131,46 +216,127 @@ class Device:
     def __repr__(self):
         return self.__str__()
 
-    def refresh(self):
-        for callback in self._callbacks:
-            callback()
+    def refresh(self, changed: Iterable[str] = None) -> asyncio.Future:
+        """Call the callbacks.
+
+        Returns a future for the async and executor callbacks, or None if all
+        callbacks completed.
+        """
+        changed = set(DeviceStatus.FIELDS if changed is None else changed)
+        pending = []
+
+        for callback in list(self._callbacks):
+            self._call(pending, callback)
+
+        for callback, fields in list(self._field_callbacks.items()):
+            if fields is None:
+                self._call(pending, callback, changed)
+            elif not fields.isdisjoint(changed):
+                self._call(pending, callback, changed & fields)
 
-    def register_callback(self, callback: Callable[[], None]) -> None:
-        """Register callback, called when Roller changes state."""
+        return gather_callbacks(pending) if pending else None
+
+    def _call(self, pending: list, callback: Callable, *args):
+        if callback in self._executor_callbacks:
+            loop = asyncio.get_running_loop()
+            pending.append(loop.run_in_executor(self.broker.executor, callback, *args))
+            return
+
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            pending.append(result)
+
+    def register_callback(self, callback: Callable[[], None], executor: bool = False) -> None:
+        """Register callback, called when the device changes state.
+
+        The callback may be a coroutine function. Pass `executor=True` to run a
+        blocking sync callback in the broker's executor.
+        """
         self._callbacks.add(callback)
+        if executor:
+            self._executor_callbacks.add(callback)
 
     def remove_callback(self, callback: Callable[[], None]) -> None:
         """Remove previously registered callback."""
         self._callbacks.discard(callback)
+        if callback not in self._field_callbacks:
+            self._executor_callbacks.discard(callback)
+
+    def register_field_callback(
+        self,
+        callback: Callable[[set[str]], None],
+        fields: Iterable[str] = None,
+        executor: bool = False,
+    ) -> None:
+        """Register callback, called with the set of changed fields.
+
+        If `fields` is given, the callback only fires when one of them changes
+        and only receives those fields. Async and executor callbacks work as
+        with `register_callback`.
+        """
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = fields.difference(DeviceStatus.FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown status field(s): {', '.join(sorted(unknown))}")
+        self._field_callbacks[callback] = fields
+        if executor:
+            self._executor_callbacks.add(callback)
+
+    def remove_field_callback(self, callback: Callable[[set[str]], None]) -> None:
+        """Remove previously registered field callback."""
+        self._field_callbacks.pop(callback, None)
+        if callback not in self._callbacks:
+            self._executor_callbacks.discard(callback)
+
+    def register_rollback_callback(self, callback: Callable[[set[str]], None]) -> None:
+        """Register callback, called with the fields whose optimistic change was rolled back."""
+        self._rollback_callbacks.add(callback)
+
+    def remove_rollback_callback(self, callback: Callable[[set[str]], None]) -> None:
+        self._rollback_callbacks.discard(callback)
+
+    @property
+    def pending_fields(self) -> frozenset:
+        """Fields changed optimistically that the device has not confirmed yet."""
+        return frozenset(self._pending)
 
     def status_handler(self, status: any):
-        LOGGER.debug(f"Raw device status: {status}")
-        status_obj = DeviceStatus(
-            is_online=self.status.is_online,
-            temperature=toFloat(status["actmp"]),
-            room_temperature=toFloat(status["rmtmp"]),
-            power_mode=PowerMode(status["ps"]),
-            fan_mode=FanMode(status["acfs"]),
-            v_swing_mode=SwingMode(status["acvs"]),
-            h_swing_mode=SwingMode(status["achs"]),
-            display_mode=DisplayMode(status["acdc"]),
-            hvac_mode=HVACMode(status["acmd"]),
-            preset_mode=PresetMode.BOOST
-            if status["acpm"] == "on"
-            else PresetMode.ECO
-            if status["acem"] == "on"
-            else PresetMode.CLEAN
-            if status["acec"] == "on"
-            else PresetMode.NONE,
-            converti_mode=ConvertiMode(status.get("cnv", 0)),
-        )
+        LOGGER.debug("Raw device status: %s", status)
+        # Receiving the first status of the device means it is online
+        is_online = self.status.is_online if self.has_status else True
+        status_obj = DeviceStatus.from_payload(status, is_online=is_online)
+        if self.history is not None:
+            # Unchanged statuses are recorded too, they carry the time and rssi
+            self.history.record(self.id, status_obj, status)
+        return self.apply_status(status_obj)
 
-        self.set_status(status_obj)
-        self.refresh()
+    def apply_status(self, status: DeviceStatus):
+        """Apply a status received from MQTT or fetched over REST.
+
+        Pending optimistic changes are kept unless the status confirms them,
+        then the callbacks are called with the changed fields. Returns a
+        future as `refresh` does.
+        """
+        if not self.has_status:
+            self.set_status(status)
+            return self.refresh()
+
+        confirmed = self._reconcile(status) if self._pending else set()
+        changed = status.diff(self.status) | confirmed
+        if not changed:
+            return
+
+        self.set_status(status)
+        return self.refresh(changed)
 
     def connection_status_handler(self, status: any):
-        self.status.is_online = status["onlineStatus"] == "true"
-        self.refresh()
+        is_online = status["onlineStatus"] == "true"
+        if not self.has_status or is_online == self.status.is_online:
+            return
+
+        self.status.is_online = is_online
+        return self.refresh({"is_online"})
 
     def set_details(self, details: DeviceDetails):
         self.details = details
@@ -178,32 +344,133 @@ class Device:
     def set_status(self, status: DeviceStatus):
         self.status = status
 
+        if self._status_waiters:
+            for waiter in self._status_waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            self._status_waiters = None
+
+    @property
+    def has_status(self) -> bool:
+        return hasattr(self, "status")
+
+    async def wait_for_status(self, timeout: float = None):
+        """Wait until the device has a status, from REST or MQTT, and can be used."""
+        if self.has_status:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        if self._status_waiters is None:
+            self._status_waiters = []
+        self._status_waiters.append(waiter)
+        await asyncio.wait_for(waiter, timeout)
+
+    def _apply_optimistic(self, command: str, value) -> dict[str, PendingField]:
+        """Apply a command to the local status, returns the fields marked as pending."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.broker.optimistic_timeout
+        # Decoded from the real control payload, so e.g. eco also sets 26 degrees
+        values = decode_fields(self.broker.build_payload(command, value))
+
+        changed = {}
+        for field, value in values.items():
+            pending = self._pending.get(field)
+            previous = getattr(self.status, field) if pending is None else pending.previous
+            if pending is None and previous == value:
+                continue
+            changed[field] = self._pending[field] = PendingField(value, previous, deadline)
+            setattr(self.status, field, value)
+
+        if changed:
+            if self._pending_timer is None:
+                self._pending_timer = loop.call_at(deadline, self._expire_pending)
+            self.refresh(set(changed))
+        return changed
+
+    def _reconcile(self, status: DeviceStatus) -> set[str]:
+        """Keep pending values in an incoming status, returns the fields it confirmed."""
+        confirmed = set()
+        for field, pending in list(self._pending.items()):
+            reported = getattr(status, field)
+            if reported == pending.value:
+                del self._pending[field]
+                confirmed.add(field)
+            else:
+                # Sent before the command was applied, the change stays pending
+                pending.previous = reported
+                setattr(status, field, pending.value)
+
+        if not self._pending and self._pending_timer is not None:
+            self._pending_timer.cancel()
+            self._pending_timer = None
+        return confirmed
+
+    def _expire_pending(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._pending_timer = None
+        self._rollback([field for field, pending in self._pending.items() if pending.deadline <= now])
+        if self._pending:
+            deadline = min(pending.deadline for pending in self._pending.values())
+            self._pending_timer = loop.call_at(deadline, self._expire_pending)
+
+    def _rollback(self, fields: Iterable[str]):
+        rolled_back = set()
+        for field in fields:
+            pending = self._pending.pop(field, None)
+            if pending is not None:
+                setattr(self.status, field, pending.previous)
+                rolled_back.add(field)
+        if not rolled_back:
+            return
+
+        LOGGER.warning(f"{self.id} did not confirm {', '.join(sorted(rolled_back))}, rolling back")
+        self.refresh(rolled_back)
+        for callback in list(self._rollback_callbacks):
+            try:
+                callback(rolled_back)
+            except Exception:
+                LOGGER.exception(f"Error in rollback callback of {self.id}")
+
+    async def _command(self, command: str, value, send: Callable):
+        pending = {}
+        if self.broker.optimistic and self.has_status:
+            pending = self._apply_optimistic(command, value)
+        try:
+            await send(self.control_topic, value)
+        except Exception:
+            # Fields changed again by a later command are left to that command
+            self._rollback(field for field, entry in pending.items() if self._pending.get(field) is entry)
+            raise
+
     async def turn_on(self):
-        await self.broker.set_power(self.control_topic, PowerMode.ON)
+        await self._command("power", PowerMode.ON, self.broker.set_power)
 
     async def turn_off(self):
-        await self.broker.set_power(self.control_topic, PowerMode.OFF)
+        await self._command("power", PowerMode.OFF, self.broker.set_power)
+
+    async def set_power(self, power: PowerMode):
+        await self._command("power", power, self.broker.set_power)
 
     async def set_temperature(self, temperature: float):
-        await self.broker.set_temperature(self.control_topic, temperature)
+        await self._command("temperature", temperature, self.broker.set_temperature)
 
     async def set_hvac_mode(self, mode: HVACMode):
-        await self.broker.set_hvac_mode(self.control_topic, mode)
+        await self._command("hvac_mode", mode, self.broker.set_hvac_mode)
 
     async def set_fan_mode(self, mode: FanMode):
-        await self.broker.set_fan_mode(self.control_topic, mode)
+        await self._command("fan_mode", mode, self.broker.set_fan_mode)
 
     async def set_preset_mode(self, mode: PresetMode):
-        await self.broker.set_preset_mode(self.control_topic, mode)
+        await self._command("preset_mode", mode, self.broker.set_preset_mode)
 
     async def set_v_swing_mode(self, mode: SwingMode):
-        await self.broker.set_v_swing_mode(self.control_topic, mode)
-        
+        await self._command("v_swing_mode", mode, self.broker.set_v_swing_mode)
+
     async def set_h_swing_mode(self, mode: SwingMode):
-        await self.broker.set_h_swing_mode(self.control_topic, mode)
-        
+        await self._command("h_swing_mode", mode, self.broker.set_h_swing_mode)
+
     async def set_display_mode(self, mode: DisplayMode):
-        await self.broker.set_display_mode(self.control_topic, mode)
-    
+        await self._command("display_mode", mode, self.broker.set_display_mode)
+
     async def set_converti_mode(self, mode: ConvertiMode):
-        await self.broker.set_converti_mode(self.control_topic, mode)
+        await self._command("converti_mode", mode, self.broker.set_converti_mode)
@@ -0,0 +1,110 @@
+"""Message dispatch off the MQTT receive loop.
+
+The broker decodes each message and drops it in the mailbox of its topic,
+which only keeps the latest payload: a status that was superseded before a
+worker got to it is never handled (and counted as dropped). A bounded pool
+of workers drains the mailboxes, handling at most one message per topic at
+a time and yielding to the receive loop between messages. Handlers may
+return an awaitable (e.g. from async device callbacks), which the worker
+awaits before taking the next message.
+"""
+
+import asyncio
+import inspect
+import time
+from collections import deque
+from typing import Callable, Iterable
+
+from .metrics import BrokerMetrics
+from .logger import LOGGER
+
+
+def gather_callbacks(awaitables: Iterable) -> asyncio.Future:
+    """Run callback awaitables concurrently, logging (not raising) their errors."""
+    future = asyncio.gather(*awaitables, return_exceptions=True)
+    future.add_done_callback(_log_callback_errors)
+    return future
+
+
+def _log_callback_errors(future: asyncio.Future):
+    if future.cancelled():
+        return
+    for result in future.result():
+        if isinstance(result, Exception):
+            LOGGER.error("Error in device callback", exc_info=result)
+
+
+class Dispatcher:
+    workers = 4
+
+    def __init__(self, metrics: BrokerMetrics = None, workers: int = None):
+        if workers is not None:
+            self.workers = workers
+        self.metrics = metrics if metrics is not None else BrokerMetrics()
+        # Latest (handler, payload) per topic, waiting for a worker
+        self._mailboxes: dict[str, tuple[Callable, dict]] = {}
+        self._ready: deque[str] = deque()
+        # Topics being handled, their next message waits in the mailbox
+        self._active: set[str] = set()
+        self._running = 0
+        self._tasks = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._mailboxes)
+
+    def put(self, topic: str, handler: Callable, payload: dict):
+        if topic in self._mailboxes:
+            self._mailboxes[topic] = (handler, payload)
+            self.metrics.dispatch_dropped += 1
+            return
+
+        self._mailboxes[topic] = (handler, payload)
+        if topic not in self._active:
+            self._ready.append(topic)
+
+        depth = len(self._mailboxes)
+        self.metrics.dispatch_queue_depth = depth
+        if depth > self.metrics.dispatch_queue_depth_max:
+            self.metrics.dispatch_queue_depth_max = depth
+
+        if self._ready and self._running < self.workers:
+            # Workers exit when idle, so there is nothing to shut down
+            self._running += 1
+            task = asyncio.get_running_loop().create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _work(self):
+        try:
+            while self._ready:
+                topic = self._ready.popleft()
+                handler, payload = self._mailboxes.pop(topic)
+                self.metrics.dispatch_queue_depth = len(self._mailboxes)
+                self._active.add(topic)
+                try:
+                    await self._handle(topic, handler, payload)
+                finally:
+                    self._active.discard(topic)
+                    if topic in self._mailboxes:
+                        self._ready.append(topic)
+                # Let the receive loop run between messages
+                await asyncio.sleep(0)
+        finally:
+            self._running -= 1
+
+    async def _handle(self, topic: str, handler: Callable, payload: dict):
+        start = time.perf_counter()
+        try:
+            result = handler(payload)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            self.metrics.dispatch_errors += 1
+            LOGGER.exception("Error handling message on %s", topic)
+        self.metrics.dispatch.observe(time.perf_counter() - start)
+
+    async def join(self):
+        """Wait until every queued message has been handled."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -0,0 +1,193 @@
+"""Caching energy consumption client.
+
+Wraps `MirAIeHub.get_energy_consumption`. Consumption for finalized
+periods (past days, weeks and months) never changes, so it is cached per
+device, `ConsumptionPeriodType` and date key, optionally on disk, including
+periods the API returns no data for. Only missing and still-open periods
+are fetched, in concurrent chunks.
+"""
+
+import asyncio
+import json
+import os
+from datetime import date, timedelta
+from typing import Iterable
+
+from .device import Device
+from .enums import ConsumptionPeriodType
+from .logger import LOGGER
+from .utils import write_json_atomic
+
+
+# Maximum number of periods requested at once
+CHUNK_SIZES = {
+    ConsumptionPeriodType.DAILY: 31,
+    ConsumptionPeriodType.WEEKLY: 13,
+    ConsumptionPeriodType.MONTHLY: 12,
+}
+
+
+def parse_period_key(period_type: ConsumptionPeriodType, key: str) -> date:
+    """Parse a `DDMMYYYY` (daily, weekly) or `MMYYYY` (monthly) key."""
+    if period_type == ConsumptionPeriodType.MONTHLY:
+        return date(int(key[2:6]), int(key[0:2]), 1)
+    return date(int(key[4:8]), int(key[2:4]), int(key[0:2]))
+
+
+def format_period_key(period_type: ConsumptionPeriodType, day: date) -> str:
+    if period_type == ConsumptionPeriodType.MONTHLY:
+        return day.strftime("%m%Y")
+    return day.strftime("%d%m%Y")
+
+
+def next_period(period_type: ConsumptionPeriodType, day: date) -> date:
+    if period_type == ConsumptionPeriodType.DAILY:
+        return day + timedelta(days=1)
+    if period_type == ConsumptionPeriodType.WEEKLY:
+        return day + timedelta(weeks=1)
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def period_keys(period_type: ConsumptionPeriodType, from_date: str, to_date: str) -> list[str]:
+    """All period keys from `from_date` to `to_date`, inclusive."""
+    current = parse_period_key(period_type, from_date)
+    end = parse_period_key(period_type, to_date)
+    keys = []
+    while current <= end:
+        keys.append(format_period_key(period_type, current))
+        current = next_period(period_type, current)
+    return keys
+
+
+def is_finalized(period_type: ConsumptionPeriodType, key: str, today: date = None) -> bool:
+    """Whether the period has ended, so its consumption can no longer change."""
+    today = today or date.today()
+    return next_period(period_type, parse_period_key(period_type, key)) <= today
+
+
+class EnergyClient:
+    max_concurrency = 4
+
+    def __init__(self, hub, cache_path: str = None, max_concurrency: int = None):
+        self.hub = hub
+        self.cache_path = cache_path
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # device id -> period type value -> date key -> kWh, or None if no data
+        self._cache: dict[str, dict[str, dict[str, float]]] = {}
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                self._cache = json.load(file)
+        except (OSError, ValueError) as error:
+            LOGGER.warning(f"Ignoring unreadable energy cache {self.cache_path}: {error}")
+            self._cache = {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        write_json_atomic(self.cache_path, self._cache)
+
+    def _cached(self, device_id: str, period_type: ConsumptionPeriodType) -> dict[str, float]:
+        return self._cache.setdefault(device_id, {}).setdefault(period_type.value, {})
+
+    def clear_cache(self):
+        self._cache = {}
+        self._save()
+
+    async def _fetch_chunk(
+        self, device: Device, period_type: ConsumptionPeriodType, keys: list[str]
+    ) -> dict[str, float]:
+        async with self._semaphore:
+            return await self.hub.get_energy_consumption(device, period_type, keys[0], keys[-1])
+
+    def _chunks(self, period_type: ConsumptionPeriodType, keys: list[str], missing: set[str]):
+        """Split the missing keys into contiguous runs of at most the chunk size."""
+        chunk_size = CHUNK_SIZES[period_type]
+        chunk = []
+        for key in keys:
+            if key in missing:
+                chunk.append(key)
+                if len(chunk) < chunk_size:
+                    continue
+            if chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def _get_consumption(
+        self, device: Device, period_type: ConsumptionPeriodType, keys: list[str], today: date
+    ) -> dict[str, float]:
+        cached = self._cached(device.id, period_type)
+        missing = {key for key in keys if key not in cached}
+        # Still-open periods are never served from the cache
+        missing.update(key for key in keys if not is_finalized(period_type, key, today))
+
+        fetched: dict[str, float] = {}
+        if missing:
+            chunks = self._chunks(period_type, keys, missing)
+            results = await asyncio.gather(
+                *[self._fetch_chunk(device, period_type, chunk) for chunk in chunks]
+            )
+            for result in results:
+                fetched.update(result)
+
+            # Finalized periods the API left out of its response have no data
+            # and never will, so they are cached as None to avoid refetching
+            for key in missing:
+                if is_finalized(period_type, key, today):
+                    cached[key] = fetched.get(key)
+
+        result = {}
+        for key in keys:
+            if key in fetched:
+                result[key] = fetched[key]
+            elif cached.get(key) is not None:
+                result[key] = cached[key]
+        return result
+
+    async def get_consumption(
+        self, device: Device, period_type: ConsumptionPeriodType, from_date: str, to_date: str = None
+    ) -> dict:
+        """Same as `MirAIeHub.get_energy_consumption`, served from the cache where possible."""
+        keys = period_keys(period_type, from_date, to_date or from_date)
+        result = await self._get_consumption(device, period_type, keys, date.today())
+        self._save()
+        return result
+
+    async def get_fleet_consumption(
+        self,
+        period_type: ConsumptionPeriodType,
+        from_date: str,
+        to_date: str = None,
+        devices: Iterable[Device] = None,
+    ) -> dict[str, dict]:
+        """Consumption of every device in the home (or `devices`), keyed by device id.
+
+        Devices whose request fails are logged and left out of the result.
+        """
+        devices = list(self.hub.home.devices if devices is None else devices)
+        keys = period_keys(period_type, from_date, to_date or from_date)
+        today = date.today()
+
+        results = await asyncio.gather(
+            *[self._get_consumption(device, period_type, keys, today) for device in devices],
+            return_exceptions=True,
+        )
+        self._save()
+
+        consumption = {}
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                LOGGER.error(f"Unable to fetch energy consumption for {device.id}: {result}")
+                continue
+            consumption[device.id] = result
+        return consumption
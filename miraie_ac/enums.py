@@ -79,3 +79,24 @@ class ConsumptionPeriodType(Enum):
             ConsumptionPeriodType.WEEKLY: "week",
             ConsumptionPeriodType.MONTHLY: "month",
         }[self]
+
+class InitStage(Enum):
+    """Milestones of MirAIeHub.init."""
+
+    AUTHENTICATED = "authenticated"
+    TOPOLOGY_KNOWN = "topology_known"
+    BROKER_SUBSCRIBED = "broker_subscribed"
+    STATUS_LOADED = "status_loaded"
+
+
+# Enum of each enum field of DeviceStatus
+STATUS_ENUMS = {
+    "power_mode": PowerMode,
+    "fan_mode": FanMode,
+    "v_swing_mode": SwingMode,
+    "h_swing_mode": SwingMode,
+    "display_mode": DisplayMode,
+    "hvac_mode": HVACMode,
+    "preset_mode": PresetMode,
+    "converti_mode": ConvertiMode,
+}
@@ -0,0 +1,219 @@
+"""Group commands: apply one command to many devices at once.
+
+Commands are published concurrently, with at most `max_in_flight` in flight
+and optionally at most `rate` per second. Each device gets its own
+outcome; with `confirm`, a command only counts as confirmed once the
+device's status reports the requested value.
+"""
+
+import asyncio
+import time
+from typing import Callable, Iterable
+
+from .device import Device
+from .enums import PresetMode
+from .logger import LOGGER
+
+
+# Command name -> Device setter and the status field it changes
+COMMANDS = {
+    "power": ("set_power", "power_mode"),
+    "temperature": ("set_temperature", "temperature"),
+    "hvac_mode": ("set_hvac_mode", "hvac_mode"),
+    "fan_mode": ("set_fan_mode", "fan_mode"),
+    "preset_mode": ("set_preset_mode", "preset_mode"),
+    "v_swing_mode": ("set_v_swing_mode", "v_swing_mode"),
+    "h_swing_mode": ("set_h_swing_mode", "h_swing_mode"),
+    "display_mode": ("set_display_mode", "display_mode"),
+    "converti_mode": ("set_converti_mode", "converti_mode"),
+}
+
+
+def select_devices(
+    devices: Iterable[Device],
+    ids: Iterable[str] = None,
+    names: Iterable[str] = None,
+    models: Iterable[str] = None,
+    predicate: Callable[[Device], bool] = None,
+) -> list[Device]:
+    """Devices matching every given filter.
+
+    `names` matches the name or friendly name, `models` the model name or
+    number from the device details.
+    """
+    ids = set(ids) if ids is not None else None
+    names = set(names) if names is not None else None
+    models = set(models) if models is not None else None
+
+    selected = []
+    for device in devices:
+        if ids is not None and device.id not in ids:
+            continue
+        if names is not None and device.name not in names and device.friendly_name not in names:
+            continue
+        if models is not None:
+            details = getattr(device, "details", None)
+            if details is None or (details.model_name not in models and details.model_number not in models):
+                continue
+        if predicate is not None and not predicate(device):
+            continue
+        selected.append(device)
+    return selected
+
+
+class CommandOutcome:
+    __slots__ = ("device", "ok", "error", "confirmed", "elapsed")
+
+    def __init__(self, device: Device):
+        self.device = device
+        self.ok = False
+        self.error: Exception = None
+        # None when confirmation was not requested
+        self.confirmed: bool = None
+        self.elapsed = 0.0  # In seconds, until published or confirmed
+
+    def __repr__(self):
+        return (
+            f"CommandOutcome({self.device.id}, ok={self.ok}, confirmed={self.confirmed}, "
+            f"error={self.error!r})"
+        )
+
+
+class GroupResult:
+    def __init__(self, command: str, value, outcomes: list[CommandOutcome]):
+        self.command = command
+        self.value = value
+        self.outcomes = {outcome.device.id: outcome for outcome in outcomes}
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __iter__(self):
+        return iter(self.outcomes.values())
+
+    def __getitem__(self, device_id: str) -> CommandOutcome:
+        return self.outcomes[device_id]
+
+    @property
+    def succeeded(self) -> list[CommandOutcome]:
+        return [outcome for outcome in self if outcome.ok and outcome.confirmed is not False]
+
+    @property
+    def failed(self) -> list[CommandOutcome]:
+        return [outcome for outcome in self if not outcome.ok or outcome.confirmed is False]
+
+    @property
+    def all_ok(self) -> bool:
+        return not self.failed
+
+
+class RateLimiter:
+    """Spaces calls to `acquire` at least 1 / `rate` seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _expected(command: str, value):
+    if command == "temperature":
+        return float(value)
+    return value
+
+
+class GroupCommand:
+    max_in_flight = 10  # aiomqtt warns above 10 pending publishes
+    rate = None  # Commands per second, None for no limit
+    confirm_timeout = 10  # In seconds
+
+    def __init__(self, max_in_flight: int = None, rate: float = None, confirm_timeout: float = None):
+        if max_in_flight is not None:
+            self.max_in_flight = max_in_flight
+        if rate is not None:
+            self.rate = rate
+        if confirm_timeout is not None:
+            self.confirm_timeout = confirm_timeout
+        if self.max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+    async def run(self, devices: Iterable[Device], command: str, value, confirm: bool = False) -> GroupResult:
+        """Send `command` with `value` to every device, e.g. `run(devices, "power", PowerMode.OFF)`."""
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command}, expected one of {', '.join(COMMANDS)}")
+
+        devices = list(devices)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        limiter = RateLimiter(self.rate) if self.rate else None
+
+        async def send(device: Device) -> CommandOutcome:
+            async with semaphore:
+                if limiter is not None:
+                    await limiter.acquire()
+                return await self._send(device, command, value, confirm)
+
+        outcomes = await asyncio.gather(*[send(device) for device in devices])
+        result = GroupResult(command, value, outcomes)
+        LOGGER.info(
+            f"Group {command} command: {len(result.succeeded)} of {len(result)} device(s) succeeded"
+        )
+        return result
+
+    async def _send(self, device: Device, command: str, value, confirm: bool) -> CommandOutcome:
+        outcome = CommandOutcome(device)
+        setter, field = COMMANDS[command]
+        expected = _expected(command, value)
+        start = time.monotonic()
+
+        confirmed = None
+        if confirm:
+            confirmed = asyncio.get_running_loop().create_future()
+
+            def on_change(changed: set[str]):
+                if not confirmed.done() and self._matches(device, command, field, expected):
+                    confirmed.set_result(None)
+
+            # Registered before publishing so a fast status is not missed
+            device.register_field_callback(on_change, [field])
+
+        try:
+            await getattr(device, setter)(value)
+            outcome.ok = True
+            if confirm:
+                if self._matches(device, command, field, expected):
+                    confirmed.set_result(None)
+                try:
+                    await asyncio.wait_for(confirmed, self.confirm_timeout)
+                    outcome.confirmed = True
+                except asyncio.TimeoutError:
+                    outcome.confirmed = False
+        except Exception as error:
+            outcome.error = error
+            LOGGER.error(f"Group {command} command failed for {device.id}: {error}")
+        finally:
+            if confirm:
+                device.remove_field_callback(on_change)
+
+        outcome.elapsed = time.monotonic() - start
+        return outcome
+
+    @staticmethod
+    def _matches(device: Device, command: str, field: str, expected) -> bool:
+        if not device.has_status:
+            return False
+        if getattr(device.status, field) != expected:
+            return False
+        fields = {field}
+        if command == "preset_mode" and expected == PresetMode.ECO:
+            # Eco mode also sets 26 degrees
+            if device.status.temperature != 26.0:
+                return False
+            fields.add("temperature")
+        # With optimistic updates the status matches before the device confirms it
+        return device.pending_fields.isdisjoint(fields)
@@ -0,0 +1,291 @@
+"""Per-device telemetry history.
+
+Each device gets a ring buffer of at most `capacity` samples, stored as one
+typed `array` per field (about 23 bytes per sample), so memory is bounded
+by `capacity` x devices no matter how many messages arrive. Time is split
+into `min_interval` second buckets and a sample replaces the previous one
+when both fall in the same bucket, which keeps long histories at a fixed
+resolution of one sample (the latest) per bucket.
+
+Missing numeric values are stored as NaN and enum fields as their index in
+the enum (-1 when unknown).
+"""
+
+import math
+import time
+from array import array
+from typing import Iterable
+
+from .device import Device, DeviceStatus
+from .enums import PowerMode, HVACMode, PresetMode
+
+
+NAN = float("nan")
+
+# Field -> array typecode
+NUMERIC_FIELDS = {
+    "temperature": "f",
+    "room_temperature": "f",
+    "rssi": "f",
+}
+ENUM_FIELDS = {
+    "power_mode": PowerMode,
+    "hvac_mode": HVACMode,
+    "preset_mode": PresetMode,
+}
+FIELDS = tuple(NUMERIC_FIELDS) + tuple(ENUM_FIELDS)
+
+_ENUM_MEMBERS = {field: tuple(enum) for field, enum in ENUM_FIELDS.items()}
+_ENUM_INDEX = {field: {member: i for i, member in enumerate(enum)} for field, enum in ENUM_FIELDS.items()}
+
+
+def _rssi(payload: dict) -> float:
+    try:
+        return float(payload["rssi"])
+    except (KeyError, TypeError, ValueError):
+        return NAN
+
+
+def _numeric(field: str, value: float) -> float:
+    """Value of `field` as a number, power as 1 (on) or 0 (off)."""
+    if field == "power_mode":
+        return NAN if value < 0 else float(_ENUM_MEMBERS[field][value] == PowerMode.ON)
+    if field in ENUM_FIELDS:
+        raise ValueError(f"{field} is not numeric")
+    return value
+
+
+class DeviceHistory:
+    """Ring buffer of the samples of one device, oldest first."""
+
+    __slots__ = ("capacity", "min_interval", "timestamps", "columns", "_start")
+
+    def __init__(self, capacity: int, min_interval: float = 0):
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self.timestamps = array("d")
+        self.columns: dict[str, array] = {field: array(code) for field, code in NUMERIC_FIELDS.items()}
+        for field in ENUM_FIELDS:
+            self.columns[field] = array("b")
+        # Physical index of the oldest sample once the buffer is full
+        self._start = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def memory_bytes(self) -> int:
+        arrays = [self.timestamps, *self.columns.values()]
+        return sum(len(column) * column.itemsize for column in arrays)
+
+    def _index(self, position: int) -> int:
+        """Physical index of the `position`-th oldest sample."""
+        return (self._start + position) % self.capacity
+
+    def append(self, timestamp: float, values: dict):
+        count = len(self.timestamps)
+        if count:
+            last = self._index(count - 1)
+            previous = self.timestamps[last]
+            # Keep timestamps sorted for range queries if the clock steps back
+            timestamp = max(timestamp, previous)
+            if self.min_interval > 0 and self._bucket(timestamp) == self._bucket(previous):
+                self._write(last, timestamp, values)
+                return
+
+        if count < self.capacity:
+            self.timestamps.append(timestamp)
+            for field, column in self.columns.items():
+                column.append(values[field])
+            return
+
+        self._write(self._start, timestamp, values)
+        self._start = (self._start + 1) % self.capacity
+
+    def _bucket(self, timestamp: float) -> int:
+        # Fixed buckets, so frequent samples can't keep pushing the last one forward
+        return math.floor(timestamp / self.min_interval)
+
+    def _write(self, index: int, timestamp: float, values: dict):
+        self.timestamps[index] = timestamp
+        for field, column in self.columns.items():
+            column[index] = values[field]
+
+    def _bisect(self, timestamp: float) -> int:
+        """Position of the first sample at or after `timestamp`."""
+        low, high = 0, len(self.timestamps)
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[self._index(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _positions(self, start: float = None, end: float = None) -> range:
+        first = 0 if start is None else self._bisect(start)
+        last = len(self.timestamps) if end is None else self._bisect(end)
+        return range(first, last)
+
+    def _sample(self, index: int, fields: Iterable[str]) -> dict:
+        sample = {"timestamp": self.timestamps[index]}
+        for field in fields:
+            value = self.columns[field][index]
+            if field in ENUM_FIELDS:
+                value = _ENUM_MEMBERS[field][value] if value >= 0 else None
+            elif math.isnan(value):
+                value = None
+            sample[field] = value
+        return sample
+
+    def range(self, start: float = None, end: float = None, fields: Iterable[str] = FIELDS) -> list[dict]:
+        """Samples with `start <= timestamp < end`, oldest first."""
+        fields = _check_fields(fields)
+        return [self._sample(self._index(position), fields) for position in self._positions(start, end)]
+
+    def latest(self, at: float = None, fields: Iterable[str] = FIELDS) -> dict:
+        """Last sample at or before `at` (the newest if None), or None."""
+        fields = _check_fields(fields)
+        position = len(self.timestamps) if at is None else self._bisect(math.nextafter(at, math.inf))
+        if position == 0:
+            return None
+        return self._sample(self._index(position - 1), fields)
+
+    def downsample(self, field: str, bucket: float, start: float = None, end: float = None) -> list[dict]:
+        """Min, max and mean of `field` per `bucket` seconds, buckets without samples are skipped.
+
+        Power is averaged as 1 (on) or 0 (off), so its mean is the fraction of
+        samples the device was on.
+        """
+        _check_fields([field])
+        if bucket <= 0:
+            raise ValueError("bucket must be positive")
+        positions = self._positions(start, end)
+        if not positions:
+            return []
+
+        column = self.columns[field]
+        origin = self.timestamps[self._index(positions[0])] if start is None else start
+        buckets = []
+        current = None
+        for position in positions:
+            index = self._index(position)
+            value = _numeric(field, column[index])
+            if math.isnan(value):
+                continue
+            bucket_start = origin + (self.timestamps[index] - origin) // bucket * bucket
+            if current is None or current["start"] != bucket_start:
+                current = {"start": bucket_start, "min": value, "max": value, "sum": value, "count": 1}
+                buckets.append(current)
+                continue
+            current["min"] = min(current["min"], value)
+            current["max"] = max(current["max"], value)
+            current["sum"] += value
+            current["count"] += 1
+
+        for current in buckets:
+            current["mean"] = current.pop("sum") / current["count"]
+        return buckets
+
+
+def _check_fields(fields: Iterable[str]) -> tuple:
+    fields = tuple(fields)
+    unknown = set(fields).difference(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown history field(s): {', '.join(sorted(unknown))}")
+    return fields
+
+
+class TelemetryHistory:
+    """History of every device, fed by `Device.status_handler` once attached.
+
+    Pass it to the hub before init (`hub.history = TelemetryHistory()`) or
+    attach devices yourself.
+    """
+
+    capacity = 1440  # Samples per device
+    min_interval = 60  # In seconds, one day at one sample per minute by default
+
+    def __init__(self, capacity: int = None, min_interval: float = None, clock=time.time):
+        if capacity is not None:
+            self.capacity = capacity
+        if min_interval is not None:
+            self.min_interval = min_interval
+        if self.capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.clock = clock
+        self.devices: dict[str, DeviceHistory] = {}
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, device_id: str):
+        return device_id in self.devices
+
+    def __getitem__(self, device_id: str) -> DeviceHistory:
+        return self.devices[device_id]
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(history.memory_bytes for history in self.devices.values())
+
+    def attach(self, devices: Iterable[Device]):
+        for device in devices:
+            device.history = self
+
+    def detach(self, devices: Iterable[Device]):
+        for device in devices:
+            if device.history is self:
+                device.history = None
+
+    def remove(self, device_id: str):
+        self.devices.pop(device_id, None)
+
+    def record(self, device_id: str, status: DeviceStatus, payload: dict = None, timestamp: float = None):
+        """Add a sample, `payload` is the raw status message (for `rssi`)."""
+        values = {
+            "temperature": status.temperature,
+            "room_temperature": status.room_temperature,
+            "rssi": _rssi(payload) if payload is not None else NAN,
+        }
+        for field in ENUM_FIELDS:
+            values[field] = _ENUM_INDEX[field].get(getattr(status, field), -1)
+
+        history = self.devices.get(device_id)
+        if history is None:
+            history = self.devices[device_id] = DeviceHistory(self.capacity, self.min_interval)
+        history.append(self.clock() if timestamp is None else timestamp, values)
+
+    def range(self, device_id: str, start: float = None, end: float = None, fields: Iterable[str] = FIELDS) -> list[dict]:
+        history = self.devices.get(device_id)
+        return history.range(start, end, fields) if history is not None else []
+
+    def downsample(self, device_id: str, field: str, bucket: float, start: float = None, end: float = None) -> list[dict]:
+        history = self.devices.get(device_id)
+        return history.downsample(field, bucket, start, end) if history is not None else []
+
+    def snapshot(self, at: float = None, fields: Iterable[str] = FIELDS) -> dict[str, dict]:
+        """Last sample at or before `at` of every device that has one."""
+        snapshot = {}
+        for device_id, history in self.devices.items():
+            sample = history.latest(at, fields)
+            if sample is not None:
+                snapshot[device_id] = sample
+        return snapshot
+
+    def fleet_summary(self, field: str, at: float = None) -> dict:
+        """Min, max and mean of `field` over the latest sample of every device."""
+        values = []
+        for sample in self.snapshot(at, [field]).values():
+            if sample[field] is None:
+                continue
+            value = sample[field]
+            values.append(float(value == PowerMode.ON) if field == "power_mode" else _numeric(field, value))
+        if not values:
+            return {"devices": 0}
+        return {
+            "devices": len(values),
+            "min": min(values),
+            "max": max(values),
+            "mean": sum(values) / len(values),
+        }
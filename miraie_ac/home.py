@@ -1,15 +1,52 @@
+from typing import Callable, Iterable
+
 from .device import Device
+from .group import GroupCommand, GroupResult, select_devices
+from .registry import DeviceRegistry, DeviceListView
 
 
 class Home:
     id: str
-    devices: list[Device]
+    registry: DeviceRegistry
 
-    def __init__(self, id: str, devices: list[Device]):
+    def __init__(
+        self, id: str, devices: list[Device] = None, registry: DeviceRegistry = None
+    ):
         self.id = id
-        self.devices = devices
+        self.registry = registry if registry is not None else DeviceRegistry()
+        for device in devices or []:
+            self.registry.add(device)
+
+    @property
+    def devices(self) -> DeviceListView:
+        return self.registry.devices
 
     def get_device(self, device_id: str):
-        for device in self.devices:
-            if device.id == device_id:
-                return device
+        return self.registry.get(device_id)
+
+    def select(
+        self,
+        ids: Iterable[str] = None,
+        names: Iterable[str] = None,
+        models: Iterable[str] = None,
+        predicate: Callable[[Device], bool] = None,
+    ) -> list[Device]:
+        """Devices matching every given filter, see `select_devices`."""
+        return select_devices(self.devices, ids, names, models, predicate)
+
+    async def send_command(
+        self,
+        command: str,
+        value,
+        devices: Iterable[Device] = None,
+        confirm: bool = False,
+        max_in_flight: int = None,
+        rate: float = None,
+        confirm_timeout: float = None,
+    ) -> GroupResult:
+        """Send a command (e.g. `"power"`, `PowerMode.OFF`) to `devices`, all devices by default.
+
+        See `GroupCommand` for the limits and `GroupResult` for the outcomes.
+        """
+        group = GroupCommand(max_in_flight, rate, confirm_timeout)
+        return await group.run(self.devices if devices is None else devices, command, value, confirm)
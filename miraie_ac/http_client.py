@@ -0,0 +1,124 @@
+"""HTTP client for the MirAIe REST API.
+
+Wraps an `aiohttp.ClientSession` with a tuned connection pool, per-request
+timeouts, a concurrency limit, retries with jittered exponential backoff on
+connection errors, 429 and 5xx, and a single re-authentication retry on 401.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Union
+
+import aiohttp
+
+from .metrics import HubMetrics
+from .logger import LOGGER
+
+
+Headers = Union[dict, Callable[[], dict]]
+
+
+class MirAIeHttpClient:
+    pool_size = 100  # Total connections
+    pool_size_per_host = 20
+    keepalive_timeout = 30  # In seconds
+    dns_cache_ttl = 300  # In seconds
+    connect_timeout = 10  # In seconds
+    request_timeout = 30  # In seconds, per attempt
+    max_concurrency = 16  # Requests in flight
+    max_retries = 3
+    backoff_base = 0.5  # In seconds
+    backoff_max = 10  # In seconds
+    retry_statuses = frozenset((429, 500, 502, 503, 504))
+
+    def __init__(
+        self,
+        metrics: HubMetrics = None,
+        on_unauthorized: Callable[[], Awaitable] = None,
+        session: aiohttp.ClientSession = None,
+        **options,
+    ):
+        for name, value in options.items():
+            if not hasattr(type(self), name):
+                raise TypeError(f"Unknown option {name}")
+            setattr(self, name, value)
+
+        self.metrics = metrics if metrics is not None else HubMetrics()
+        self.on_unauthorized = on_unauthorized
+        self.session = session if session is not None else self._create_session()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout, connect=self.connect_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        await self.session.close()
+
+    def _backoff(self, attempt: int, response: aiohttp.ClientResponse = None) -> float:
+        if response is not None and response.status == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def request(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        headers: Headers = None,
+        reauthenticate: bool = True,
+        **kwargs,
+    ) -> aiohttp.ClientResponse:
+        """Send a request and return the response with its body already read.
+
+        `headers` may be a callable so that a retry after re-authentication
+        picks up the new token. The response is returned as-is for non-retryable
+        statuses; the caller decides what an error status means.
+        """
+        start = time.perf_counter()
+        attempt = 0
+        reauthenticated = False
+
+        while True:
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self.session.request(
+                        method,
+                        url,
+                        headers=headers() if callable(headers) else headers,
+                        **kwargs,
+                    )
+                    await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if attempt >= self.max_retries:
+                    self.metrics.observe_request(endpoint, time.perf_counter() - start, ok=False)
+                    raise
+                LOGGER.debug("%s request failed with %r, retrying", endpoint, error)
+            else:
+                if response.status == 401 and reauthenticate and not reauthenticated and self.on_unauthorized:
+                    LOGGER.debug("%s request unauthorized, re-authenticating", endpoint)
+                    reauthenticated = True
+                    await self.on_unauthorized()
+                    continue
+
+                if response.status not in self.retry_statuses or attempt >= self.max_retries:
+                    self.metrics.observe_request(
+                        endpoint, time.perf_counter() - start, ok=response.status < 400
+                    )
+                    return response
+                LOGGER.debug("%s request returned %d, retrying", endpoint, response.status)
+
+            self.metrics.request_retried(endpoint)
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
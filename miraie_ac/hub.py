@@ -1,29 +1,65 @@
 import aiohttp
 import asyncio
+import time
+from collections.abc import Mapping
 
 from . import constants
 from .broker import MirAIeBroker
 from .user import User
 from .topic import MirAIeTopic
 from .home import Home
+from .registry import DeviceRegistry
 from .device import Device, DeviceDetails, DeviceStatus
 from .enums import PowerMode, FanMode, SwingMode, DisplayMode, HVACMode, PresetMode, ConvertiMode, \
-    ConsumptionPeriodType
-from .utils import is_valid_email, toFloat
+    ConsumptionPeriodType, InitStage
+from .utils import is_valid_email
+from .metrics import HubMetrics
+from .http_client import MirAIeHttpClient
+from . import snapshot
 from .logger import LOGGER
 
 
 class MirAIeHub:
-    def __init__(self):
-        self.http = aiohttp.ClientSession()
-        self.topics_map: dict[str, MirAIeTopic] = {}
+    token_refresh_margin = 300  # In seconds before expiry
+    token_retry_interval = 60  # In seconds
+    shutdown_interval = 0.1  # In seconds between cancelling background tasks
+
+    def __init__(self, http_client: MirAIeHttpClient = None):
+        self.metrics = HubMetrics()
+        self.http_client = http_client or MirAIeHttpClient()
+        self.http_client.metrics = self.metrics
+        self.http_client.on_unauthorized = self.get_token
+        self.http = self.http_client.session
+        self.registry = DeviceRegistry()
         self.background_tasks = set()
+        # Last error per device from get_all_device_status
+        self.status_errors: dict[str, Exception] = {}
+        self.snapshot_path: str = None
+        # TelemetryHistory attached to every device, see history.py
+        self.history = None
+        self._stages = {
+            stage: asyncio.Event() for stage in InitStage if stage != InitStage.BROKER_SUBSCRIBED
+        }
+        self._token_task: asyncio.Task = None
+        self._token_refresh_task: asyncio.Task = None
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, *excinfo):
-        await self.http.close()
+        # The broker connection, token refresh and background loading
+        tasks = list(self.background_tasks)
+        pending = set(tasks)
+        while pending:
+            for task in pending:
+                task.cancel()
+            # asyncio.wait_for before Python 3.12 can drop a cancellation that
+            # races with its result, so keep cancelling until all have ended
+            _, pending = await asyncio.wait(pending, timeout=self.shutdown_interval)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.snapshot_path and hasattr(self, "home"):
+            self.save_snapshot()
+        await self.http_client.close()
 
     def __build_headers__(self):
         return {
@@ -31,30 +67,171 @@ class MirAIeHub:
             "Content-Type": "application/json",
         }
 
-    async def init(self, username: str, password: str, broker: MirAIeBroker):
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs):
+        return await self.http_client.request(endpoint, method, url, **kwargs)
+
+    async def init(
+        self,
+        username: str,
+        password: str,
+        broker: MirAIeBroker,
+        snapshot_path: str = None,
+        wait_for_status: bool = True,
+    ):
+        """Log in, load the home and connect the broker.
+
+        The broker connects as soon as the home topology is known, while device
+        details and status are fetched concurrently. With `wait_for_status=False`
+        init returns at that point; use `wait_for` or `Device.wait_for_status`
+        to know when devices become usable.
+
+        With `snapshot_path`, devices are restored from the snapshot written by a
+        previous run (if any) and the broker connects right after login, while the
+        home, device details and status are revalidated in the background.
+        """
         self._broker = broker
+        broker.set_registry(self.registry)
+        self.snapshot_path = snapshot_path
 
         await self._authenticate(username, password)
-        await self._get_home_details()
-        await self.get_all_device_status()
+        self._stages[InitStage.AUTHENTICATED].set()
+        self._start_token_refresh()
+
+        if self._restore_snapshot():
+            self._stages[InitStage.TOPOLOGY_KNOWN].set()
+            await self._init_broker(broker)
+            self._create_background_task(self._revalidate_snapshot())
+            return
+
+        await self._get_home_details(load_details=False)
+        self._stages[InitStage.TOPOLOGY_KNOWN].set()
+        # The broker only needs the home id and topics
         await self._init_broker(broker)
 
+        if wait_for_status:
+            await self._load_home_state()
+        else:
+            self._create_background_task(self._load_home_state(raise_errors=False))
+
+    async def _load_home_state(self, raise_errors: bool = True):
+        try:
+            await asyncio.gather(
+                self._load_device_details(), self.get_all_device_status(only_missing=True)
+            )
+        except Exception as error:
+            if raise_errors:
+                raise
+            LOGGER.error(f"Unable to load device details and status: {error}")
+            return
+
+        self._stages[InitStage.STATUS_LOADED].set()
+        if self.snapshot_path:
+            self.save_snapshot()
+
+    def is_reached(self, stage: InitStage) -> bool:
+        if stage == InitStage.BROKER_SUBSCRIBED:
+            return hasattr(self, "_broker") and self._broker.is_ready
+        return self._stages[stage].is_set()
+
+    async def wait_for(self, stage: InitStage, timeout: float = None):
+        """Wait until init reaches `stage`."""
+        if stage == InitStage.BROKER_SUBSCRIBED:
+            await self.wait_for(InitStage.TOPOLOGY_KNOWN, timeout)
+            await self._broker.wait_until_ready(timeout)
+            return
+        await asyncio.wait_for(self._stages[stage].wait(), timeout)
+
+    def _create_background_task(self, coro) -> asyncio.Task:
+        task = asyncio.get_event_loop().create_task(coro)
+        # Save a reference to the task so it doesn't get garbage collected
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def _restore_snapshot(self) -> bool:
+        data = snapshot.load_snapshot(self.snapshot_path)
+        if data is None:
+            return False
+
+        self.registry.clear()
+        for device in snapshot.restore_devices(data, self._broker):
+            self._add_device(device)
+        self.home = Home(id=data["home_id"], registry=self.registry)
+        LOGGER.info(f"Restored {len(self.registry)} device(s) from snapshot")
+        return True
+
+    def _add_device(self, device: Device):
+        if self.history is not None:
+            device.history = self.history
+        self.registry.add(device)
+
+    def _remove_device_callbacks(self, device: Device):
+        # The router holds the device's bound handlers, which keep it alive
+        self._broker.remove_device_callback(device.status_topic)
+        self._broker.remove_device_callback(device.connection_status_topic)
+
+    async def _revalidate_snapshot(self):
+        try:
+            await self._get_home_details()
+            await self.get_all_device_status()
+        except Exception as error:
+            LOGGER.error(f"Unable to revalidate snapshot: {error}")
+            return
+        finally:
+            # Devices already have their last known status from the snapshot
+            self._stages[InitStage.STATUS_LOADED].set()
+
+        topics = self.get_device_topics()
+        if set(topics) != set(self._broker.commandTopics):
+            LOGGER.info("Device topology changed since the snapshot, updating subscriptions")
+            await self._broker.update_topics(topics)
+        self.save_snapshot()
+
+    def save_snapshot(self, path: str = None):
+        """Write devices, details and last status to `path` (defaults to `snapshot_path`)."""
+        snapshot.save_snapshot(path or self.snapshot_path, self.home.id, self.home.devices)
+
+    def _start_token_refresh(self):
+        if self._token_refresh_task is not None and not self._token_refresh_task.done():
+            return
+
+        self._token_refresh_task = self._create_background_task(self._token_refresh_loop())
+
+    async def _token_refresh_loop(self):
+        while True:
+            lifetime = float(self.user.expires_in or 0)
+            if lifetime <= 0:
+                LOGGER.debug("Token has no expiry, proactive refresh disabled")
+                return
+
+            # Short-lived tokens are refreshed halfway through their lifetime
+            margin = min(self.token_refresh_margin, lifetime / 2)
+            delay = self.user.expires_at - margin - time.time()
+            await asyncio.sleep(max(delay, 0))
+
+            expires_at = self.user.expires_at
+            await self.get_token()
+            if self.user.expires_at == expires_at:
+                # Refresh failed, the old token is still in use
+                LOGGER.warning(f"Token refresh failed. Retrying in {self.token_retry_interval} seconds.")
+                await asyncio.sleep(self.token_retry_interval)
+
     async def _init_broker(self, broker: MirAIeBroker):
         topics = self.get_device_topics()
         broker.set_topics(topics)
-        loop = asyncio.get_event_loop()
         # Listen for mqtt messages in an (unawaited) asyncio task
-        task = loop.create_task(
+        self._create_background_task(
             broker.connect(self.home.id, self.user.access_token, self.get_token)
         )
-        # Save a reference to the task so it doesn't get garbage collected
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.remove)
 
     @property
     def broker(self):
         return self._broker
 
+    @property
+    def topics_map(self) -> Mapping[str, MirAIeTopic]:
+        return self.registry.topics
+
     def get_device_topics(self):
         device_topics = list(
             map(
@@ -66,12 +243,23 @@ class MirAIeHub:
         return miraie_topics
 
     async def get_token(self):
+        # Concurrent callers share a single in-flight login
+        if self._token_task is None or self._token_task.done():
+            self._token_task = asyncio.get_event_loop().create_task(self._renew_token())
+        return await asyncio.shield(self._token_task)
+
+    async def _renew_token(self):
         try:
             await self._authenticate(self.username, self.password)
-            return self.user.access_token
-        except Exception:
+        except Exception as error:
+            LOGGER.error(f"Unable to renew access token: {error}")
             return self.user.access_token
 
+        if hasattr(self, "_broker"):
+            # Used by the broker on its next reconnect, the live session is kept
+            self._broker.set_password(self.user.access_token)
+        return self.user.access_token
+
     # Authenticate with the MirAIe API
     async def _authenticate(self, username: str, password: str):
         isEmail = is_valid_email(username)
@@ -87,7 +275,9 @@ class MirAIeHub:
         else:
             data["mobile"] = username
 
-        response = await self.http.post(constants.loginUrl, json=data)
+        response = await self._request(
+            "login", "POST", constants.loginUrl, json=data, reauthenticate=False
+        )
 
         if response.status == 200:
             json = await response.json()
@@ -105,9 +295,11 @@ class MirAIeHub:
 
     # Get device details
     async def _get_device_details(self, deviceIds: str):
-        response = await self.http.get(
+        response = await self._request(
+            "device_details",
+            "GET",
             constants.deviceDetailsUrl + "/" + deviceIds,
-            headers=self.__build_headers__(),
+            headers=self.__build_headers__,
         )
         
         try:
@@ -123,34 +315,55 @@ class MirAIeHub:
             
 
     # Process the home details
-    async def _process_home_details(self, json_data):
-        devices: list[Device] = []
+    async def _process_home_details(self, json_data, load_details: bool = True):
+        device_ids = set()
 
         for space in json_data["spaces"]:
             for device in space["devices"]:
-                item = Device(
-                    id=device["deviceId"],
-                    name=str(device["deviceName"]).lower().replace(" ", "-"),
-                    friendly_name=device["deviceName"],
-                    control_topic=str(device["topic"][0]) + "/control",
-                    status_topic=str(device["topic"][0]) + "/status",
-                    connection_status_topic=str(device["topic"][0])
-                    + "/connectionStatus",
-                    broker=self._broker,
-                )
-                devices.append(item)
-                topic = MirAIeTopic(
-                    control_topic=item.control_topic,
-                    status_topic=item.status_topic,
-                    connection_status_topic=item.connection_status_topic,
-                )
-                self.topics_map[item.id] = topic
-
-        device_ids = ",".join(list(map(lambda device: device.id, devices)))
+                control_topic = str(device["topic"][0]) + "/control"
+                item = self.registry.get(device["deviceId"])
+
+                # Devices that are already known (e.g. restored from a snapshot) are kept
+                if item is None or item.control_topic != control_topic:
+                    if item is not None:
+                        self._remove_device_callbacks(item)
+                    item = Device(
+                        id=device["deviceId"],
+                        name=str(device["deviceName"]).lower().replace(" ", "-"),
+                        friendly_name=device["deviceName"],
+                        control_topic=control_topic,
+                        status_topic=str(device["topic"][0]) + "/status",
+                        connection_status_topic=str(device["topic"][0])
+                        + "/connectionStatus",
+                        broker=self._broker,
+                    )
+                    self._add_device(item)
+                else:
+                    item.name = str(device["deviceName"]).lower().replace(" ", "-")
+                    item.friendly_name = device["deviceName"]
+                device_ids.add(item.id)
+
+        for item in list(self.registry):
+            if item.id not in device_ids:
+                self._remove_device_callbacks(item)
+                self.registry.remove(item.id)
+                if self.history is not None:
+                    self.history.remove(item.id)
+
+        self.home = Home(id=json_data["homeId"], registry=self.registry)
+
+        if load_details:
+            await self._load_device_details()
+        return self.home
+
+    async def _load_device_details(self):
+        device_ids = ",".join(device.id for device in self.registry)
         device_details = await self._get_device_details(device_ids)
 
         for dd in device_details:
-            device = next(d for d in devices if d.id == dd["deviceId"])
+            device = self.registry.get(dd["deviceId"])
+            if device is None:
+                continue
 
             details = DeviceDetails(
                 model_name=dd["modelName"],
@@ -165,74 +378,85 @@ class MirAIeHub:
 
             device.set_details(details)
 
-        self.home = Home(id=json_data["homeId"], devices=devices)
-        return self.home
-
     # Get home details
-    async def _get_home_details(self):
-        response = await self.http.get(
-            constants.homesUrl, headers=self.__build_headers__()
+    async def _get_home_details(self, load_details: bool = True):
+        response = await self._request(
+            "homes", "GET", constants.homesUrl, headers=self.__build_headers__
         )
         resp = await response.json()
-        await self._process_home_details(resp[0])
+        await self._process_home_details(resp[0], load_details)
 
     # Get device status
     async def _get_device_status(self, device_id: str):
-        response = await self.http.get(
+        response = await self._request(
+            "status",
+            "GET",
             constants.statusUrl.replace("{deviceId}", device_id),
-            headers=self.__build_headers__(),
+            headers=self.__build_headers__,
         )
+        if response.status != 200:
+            raise Exception(f"Unable to fetch device status ({response.status})")
         resp = await response.json()
         resp["deviceId"] = device_id
         return resp
 
     # Get all device status
-    async def get_all_device_status(self):
-        statuses = await asyncio.gather(
-            *[self._get_device_status(device.id) for device in self.home.devices],
-            return_exceptions=True,
+    async def get_all_device_status(self, only_missing: bool = False):
+        """Fetch and apply the status of every device.
+
+        Each status is applied as soon as it arrives. With `only_missing`, devices
+        that already have a status (e.g. from an MQTT message) are skipped,
+        including those whose status arrives while waiting.
+        """
+        devices = [
+            device for device in self.home.devices if not (only_missing and device.has_status)
+        ]
+        return await asyncio.gather(
+            *[self._load_device_status(device, only_missing) for device in devices]
         )
 
-        for status in statuses:
-            device = next(d for d in self.home.devices if d.id == status["deviceId"])
-
-            status_obj: DeviceStatus
-            if "ty" not in status or status["ty"] != "AC":
-                status_obj = DeviceStatus(
-                    is_online=False,
-                    temperature=24.0,
-                    room_temperature=24.0,
-                    power_mode=PowerMode.OFF,
-                    fan_mode=FanMode.AUTO,
-                    v_swing_mode=SwingMode.AUTO,
-                    h_swing_mode=SwingMode.AUTO,
-                    display_mode=DisplayMode.ON,
-                    hvac_mode=HVACMode.AUTO,
-                    preset_mode=PresetMode.NONE,
-                    converti_mode=ConvertiMode.OFF,
-                )
-            else:
-                status_obj = DeviceStatus(
-                    is_online=status["onlineStatus"] == "true",
-                    temperature=toFloat(status["actmp"]),
-                    room_temperature=toFloat(status["rmtmp"]),
-                    power_mode=PowerMode(status["ps"]),
-                    fan_mode=FanMode(status["acfs"]),
-                    v_swing_mode=SwingMode(status["acvs"]),
-                    h_swing_mode=SwingMode(status["achs"]),
-                    display_mode=DisplayMode(status["acdc"]),
-                    hvac_mode=HVACMode(status["acmd"]),
-                    preset_mode=PresetMode.BOOST
-                    if status["acpm"] == "on"
-                    else PresetMode.ECO
-                    if status["acem"] == "on"
-                    else PresetMode.NONE,
-                    converti_mode=ConvertiMode(status.get("cnv", 0)),
-                )
-
-            device.set_status(status_obj)
-
-        return statuses
+    async def _load_device_status(self, device: Device, only_missing: bool = False):
+        try:
+            status = await self._get_device_status(device.id)
+        except Exception as error:
+            status = error
+
+        if only_missing and device.has_status:
+            return status
+
+        if isinstance(status, Exception):
+            LOGGER.error(f"Unable to fetch status of {device.id}: {status}")
+            self.status_errors[device.id] = status
+            if device.has_status:
+                return status
+            # Without a status the device can't be used, fall back to the offline default
+            payload = {}
+        else:
+            self.status_errors.pop(device.id, None)
+            payload = status
+
+        status_obj: DeviceStatus
+        if "ty" not in payload or payload["ty"] != "AC":
+            status_obj = DeviceStatus(
+                is_online=False,
+                temperature=24.0,
+                room_temperature=24.0,
+                power_mode=PowerMode.OFF,
+                fan_mode=FanMode.AUTO,
+                v_swing_mode=SwingMode.AUTO,
+                h_swing_mode=SwingMode.AUTO,
+                display_mode=DisplayMode.ON,
+                hvac_mode=HVACMode.AUTO,
+                preset_mode=PresetMode.NONE,
+                converti_mode=ConvertiMode.OFF,
+            )
+        else:
+            status_obj = DeviceStatus.from_payload(
+                payload, is_online=payload.get("onlineStatus") == "true"
+            )
+
+        device.apply_status(status_obj)
+        return status
 
     async def get_energy_consumption(
         self, device: Device, period_type: ConsumptionPeriodType, from_date: str, to_date: str = None
@@ -271,7 +495,7 @@ class MirAIeHub:
         if not to_date:
             to_date: str = from_date
         url = constants.energyConsumptionUrl.format(deviceId=device.id, periodType=period_type.value, fromDate=from_date, toDate=to_date)
-        response = await self.http.get(url, headers=self.__build_headers__())
+        response = await self._request("energy", "GET", url, headers=self.__build_headers__)
         resp = await response.json()
         _key = period_type.response_key()
         return {_d[_key]: _d["power"] for _d in resp}
@@ -0,0 +1,206 @@
+"""Command round-trip latency tracking.
+
+Every published command gets a unique sid. When a status message for the
+same device echoes that sid (or, when it has no sid or one this tracker
+never issued, reports the command key in `lcmd`), the time since
+publishing is recorded per device and per command type. Periodic statuses
+repeat the sid of the last command, so a status with an earlier sid (one
+this tracker issued, or a lower counter value) is not taken as a
+confirmation. Commands that are not confirmed within `timeout` seconds are
+reported as timed out.
+"""
+
+import bisect
+import time
+from collections import OrderedDict, deque
+from typing import Iterable
+
+# Status `lcmd` values and the command type that sends them
+LCMD_COMMANDS = {
+    "ps": "power",
+    "actmp": "temperature",
+    "acmd": "hvac_mode",
+    "acfs": "fan_mode",
+    "acvs": "v_swing_mode",
+    "achs": "h_swing_mode",
+    "acdc": "display_mode",
+    "acpm": "preset_mode",
+    "acem": "preset_mode",
+    "acec": "preset_mode",
+    "cnv": "converti_mode",
+}
+
+
+class LatencyHistogram:
+    """Bucketed latency histogram with a bounded window of recent samples."""
+
+    # Upper bounds in seconds, the last bucket catches everything above
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+    SAMPLE_WINDOW = 1024
+
+    __slots__ = ("counts", "count", "total", "max", "_samples")
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=self.SAMPLE_WINDOW)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self._samples.append(value)
+
+    def percentile(self, percent: float) -> float:
+        """Percentile over the recent sample window, or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self, percentiles: Iterable[float] = (50, 90, 99)) -> dict:
+        buckets = {str(bound): count for bound, count in zip(self.BUCKETS, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "buckets": buckets,
+            "percentiles": {f"p{p:g}": self.percentile(p) for p in percentiles},
+        }
+
+
+class PendingCommand:
+    __slots__ = ("device", "sid", "commands", "sent_at")
+
+    def __init__(self, device: str, sid: str, commands: tuple, sent_at: float):
+        self.device = device
+        self.sid = sid
+        self.commands = commands
+        self.sent_at = sent_at
+
+
+class LatencyTracker:
+    timeout = 30.0  # In seconds
+    max_timed_out = 256  # Timed out commands kept for reporting
+    max_issued = 4096  # Recent sids remembered to recognize stale statuses
+
+    def __init__(self, timeout: float = None):
+        if timeout is not None:
+            self.timeout = timeout
+        self.by_device: dict[str, LatencyHistogram] = {}
+        self.by_command: dict[str, LatencyHistogram] = {}
+        self.timeouts_by_device: dict[str, int] = {}
+        self.timeouts_by_command: dict[str, int] = {}
+        self.timed_out: deque[PendingCommand] = deque(maxlen=self.max_timed_out)
+        self._pending: dict[str, OrderedDict[str, PendingCommand]] = {}
+        self._expiry: deque[PendingCommand] = deque()
+        # Used as an ordered set
+        self._issued: OrderedDict[str, None] = OrderedDict()
+
+    def command_sent(self, device: str, sid: str, commands: tuple, sent_at: float = None):
+        sent_at = time.monotonic() if sent_at is None else sent_at
+        self.expire(sent_at)
+        pending = PendingCommand(device, sid, commands, sent_at)
+        self._pending.setdefault(device, OrderedDict())[sid] = pending
+        self._expiry.append(pending)
+        self._issued[sid] = None
+        if len(self._issued) > self.max_issued:
+            self._issued.popitem(last=False)
+
+    def status_received(self, device: str, status: dict, received_at: float = None) -> bool:
+        """Match a status message to a pending command, returns True on a match."""
+        pending = self._pending.get(device)
+        if not pending:
+            return False
+
+        received_at = time.monotonic() if received_at is None else received_at
+        sid = status.get("sid")
+        command = pending.pop(str(sid), None)
+
+        if command is None and (sid is None or str(sid) not in self._issued):
+            # Not every firmware echoes our sid, fall back to the oldest command of the type
+            command_type = LCMD_COMMANDS.get(status.get("lcmd"))
+            for candidate_sid, candidate in pending.items():
+                if command_type in candidate.commands and not _older_sid(sid, candidate_sid):
+                    command = pending.pop(candidate_sid)
+                    break
+
+        if command is None:
+            return False
+
+        if not pending:
+            del self._pending[device]
+
+        latency = received_at - command.sent_at
+        self._observe(self.by_device, device, latency)
+        for command_type in command.commands:
+            self._observe(self.by_command, command_type, latency)
+        return True
+
+    def expire(self, now: float = None):
+        """Move commands older than the timeout to the timed out list."""
+        now = time.monotonic() if now is None else now
+        expiry = self._expiry
+
+        while expiry and now - expiry[0].sent_at > self.timeout:
+            command = expiry.popleft()
+            pending = self._pending.get(command.device)
+            if pending is None or pending.pop(command.sid, None) is None:
+                # Already confirmed
+                continue
+            if not pending:
+                del self._pending[command.device]
+
+            self.timed_out.append(command)
+            self.timeouts_by_device[command.device] = self.timeouts_by_device.get(command.device, 0) + 1
+            for command_type in command.commands:
+                self.timeouts_by_command[command_type] = self.timeouts_by_command.get(command_type, 0) + 1
+
+    def _observe(self, histograms: dict, key: str, latency: float):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = LatencyHistogram()
+        histogram.observe(latency)
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def percentiles(
+        self, device: str = None, command: str = None, percentiles: Iterable[float] = (50, 90, 99)
+    ) -> dict:
+        """Latency percentiles for a device or command type, in seconds."""
+        if device is not None:
+            histogram = self.by_device.get(device)
+        elif command is not None:
+            histogram = self.by_command.get(command)
+        else:
+            raise ValueError("Either device or command is required")
+
+        if histogram is None:
+            return {f"p{p:g}": None for p in percentiles}
+        return {f"p{p:g}": histogram.percentile(p) for p in percentiles}
+
+    def snapshot(self) -> dict:
+        self.expire()
+        return {
+            "pending": self.pending_count,
+            "by_device": {key: h.snapshot() for key, h in self.by_device.items()},
+            "by_command": {key: h.snapshot() for key, h in self.by_command.items()},
+            "timeouts_by_device": dict(self.timeouts_by_device),
+            "timeouts_by_command": dict(self.timeouts_by_command),
+        }
+
+
+def _older_sid(sid, than: str) -> bool:
+    """Whether `sid` comes from an earlier command than `than`, sids are counters."""
+    try:
+        return int(sid) < int(than)
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,192 @@
+"""Runtime metrics for the broker and the hub.
+
+Counters are plain integers and floats updated inline, so they are cheap
+enough to leave on. `snapshot()` returns a dict and `render_prometheus()`
+renders the same data in the Prometheus text format.
+"""
+
+import time
+from typing import Callable, Iterable
+
+
+class Metrics:
+    prefix = "miraie"
+    # Label name for each snapshot key whose value is a dict
+    LABELS: dict[str, str] = {}
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, value in self.snapshot().items():
+            metric = f"{self.prefix}_{name}"
+            if not isinstance(value, dict):
+                lines.append(f"{metric} {_format_value(value)}")
+                continue
+
+            label = self.LABELS.get(name, "key")
+            for key, item in value.items():
+                if isinstance(item, dict):
+                    for stat, stat_value in item.items():
+                        lines.append(f'{metric}_{stat}{{{label}="{key}"}} {_format_value(stat_value)}')
+                else:
+                    lines.append(f'{metric}{{{label}="{key}"}} {_format_value(item)}')
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+class TimingStats:
+    """Count, total and max of a timed operation, in seconds."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "seconds_total": self.total, "seconds_max": self.max}
+
+
+class BrokerMetrics(Metrics):
+    prefix = "miraie_broker"
+    LABELS = {"messages_received": "topic_type"}
+
+    def __init__(self):
+        self.messages_received: dict[str, int] = {}
+        self.decode = TimingStats()
+        self.dispatch = TimingStats()
+        self.decode_errors = 0
+        self.dispatch_errors = 0
+        self.unrouted = 0  # Messages on topics without a device
+        self.dispatch_dropped = 0  # Superseded before a worker handled them
+        self.dispatch_queue_depth = 0
+        self.dispatch_queue_depth_max = 0
+        self.publishes = 0
+        self.publish_errors = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.subscriptions = 0
+        self.disconnected_seconds = 0.0
+        self._disconnected_since = time.monotonic()
+
+    def message_received(self, topic_type: str):
+        self.messages_received[topic_type] = self.messages_received.get(topic_type, 0) + 1
+
+    def connected(self):
+        if self._disconnected_since is not None:
+            self.disconnected_seconds += time.monotonic() - self._disconnected_since
+            self._disconnected_since = None
+        self.connects += 1
+
+    def disconnected(self):
+        if self._disconnected_since is None:
+            self._disconnected_since = time.monotonic()
+        # Failing to make the first connection is not a reconnect
+        if self.connects:
+            self.reconnects += 1
+
+    @property
+    def is_connected(self) -> bool:
+        return self._disconnected_since is None
+
+    def snapshot(self) -> dict:
+        disconnected_seconds = self.disconnected_seconds
+        if self._disconnected_since is not None:
+            disconnected_seconds += time.monotonic() - self._disconnected_since
+
+        return {
+            "messages_received": dict(self.messages_received),
+            "decode_seconds_total": self.decode.total,
+            "decode_seconds_max": self.decode.max,
+            "decode_errors": self.decode_errors,
+            "dispatch_seconds_total": self.dispatch.total,
+            "dispatch_seconds_max": self.dispatch.max,
+            "dispatch_errors": self.dispatch_errors,
+            "unrouted_messages": self.unrouted,
+            "dispatch_dropped": self.dispatch_dropped,
+            "dispatch_queue_depth": self.dispatch_queue_depth,
+            "dispatch_queue_depth_max": self.dispatch_queue_depth_max,
+            "publishes": self.publishes,
+            "publish_errors": self.publish_errors,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connected": int(self.is_connected),
+            "disconnected_seconds_total": disconnected_seconds,
+            "subscriptions": self.subscriptions,
+        }
+
+
+class AggregateBrokerMetrics(Metrics):
+    """Combined metrics of several brokers, e.g. the shards of a `ShardedMirAIeBroker`.
+
+    Counters and totals are summed and maxima are maxed. `connected` is the
+    number of connected brokers.
+    """
+
+    prefix = "miraie_broker"
+    LABELS = BrokerMetrics.LABELS
+
+    def __init__(self, sources: Callable[[], Iterable[BrokerMetrics]]):
+        self._sources = sources
+
+    @property
+    def is_connected(self) -> bool:
+        return all(metrics.is_connected for metrics in self._sources())
+
+    def snapshot(self) -> dict:
+        result = {}
+        for metrics in self._sources():
+            for name, value in metrics.snapshot().items():
+                if isinstance(value, dict):
+                    merged = result.setdefault(name, {})
+                    for key, item in value.items():
+                        merged[key] = merged.get(key, 0) + item
+                elif name.endswith("_max"):
+                    result[name] = max(result.get(name, 0.0), value)
+                else:
+                    result[name] = result.get(name, 0) + value
+        return result
+
+
+class HubMetrics(Metrics):
+    prefix = "miraie_hub"
+    LABELS = {"requests": "endpoint", "request_errors": "endpoint", "request_retries": "endpoint"}
+
+    def __init__(self):
+        self.requests: dict[str, TimingStats] = {}
+        self.request_errors: dict[str, int] = {}
+        self.request_retries: dict[str, int] = {}
+
+    def observe_request(self, endpoint: str, seconds: float, ok: bool = True):
+        stats = self.requests.get(endpoint)
+        if stats is None:
+            stats = self.requests[endpoint] = TimingStats()
+        stats.observe(seconds)
+        if not ok:
+            self.request_errors[endpoint] = self.request_errors.get(endpoint, 0) + 1
+
+    def request_retried(self, endpoint: str):
+        self.request_retries[endpoint] = self.request_retries.get(endpoint, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": {endpoint: stats.snapshot() for endpoint, stats in self.requests.items()},
+            "request_errors": dict(self.request_errors),
+            "request_retries": dict(self.request_retries),
+        }
@@ -0,0 +1,169 @@
+"""Outbound command queue used while the broker is disconnected.
+
+Commands are replayed in order on reconnect. With compaction enabled a
+newer command for the same device and field replaces the older one (last
+write wins). A command still queued after `max_age` seconds is dropped and
+its callers fail with `CommandDroppedError` right away, without waiting for
+the reconnect.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from .logger import LOGGER
+
+# Keys present in every command payload, not device fields
+BASE_PAYLOAD_KEYS = frozenset(("ki", "cnt", "sid"))
+
+
+class CommandDroppedError(Exception):
+    """Raised to callers whose queued command expired or was evicted."""
+
+
+class QueuedCommand:
+    __slots__ = ("topic", "payload", "commands", "queued_at", "waiters", "timer")
+
+    def __init__(
+        self,
+        topic: str,
+        payload: dict,
+        commands: tuple,
+        waiters: list[asyncio.Future],
+        queued_at: float = None,
+    ):
+        self.topic = topic
+        self.payload = payload
+        self.commands = commands
+        self.queued_at = time.monotonic() if queued_at is None else queued_at
+        self.waiters = waiters
+        # Expires the command after max_age
+        self.timer: asyncio.TimerHandle = None
+
+    def cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    @property
+    def fields(self) -> set[str]:
+        return self.payload.keys() - BASE_PAYLOAD_KEYS
+
+    def resolve(self, error: Exception = None):
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+
+class CommandOutbox:
+    max_size = 256
+    max_age = 300  # In seconds, None keeps commands until reconnect
+    compact = True
+
+    def __init__(self, max_size: int = None, max_age: float = None, compact: bool = None):
+        if max_size is not None:
+            self.max_size = max_size
+        if max_age is not None:
+            self.max_age = max_age
+        if compact is not None:
+            self.compact = compact
+        self._commands: deque[QueuedCommand] = deque()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._commands)
+
+    def put(
+        self,
+        topic: str,
+        payload: dict,
+        commands: tuple,
+        waiters: list[asyncio.Future],
+        queued_at: float = None,
+    ):
+        """Queue a command, `queued_at` keeps the age of a command moved from another outbox."""
+        command = QueuedCommand(topic, dict(payload), commands, list(waiters), queued_at)
+
+        if self.compact:
+            self._compact(command)
+
+        self._commands.append(command)
+        self._start_timer(command)
+
+        while len(self._commands) > self.max_size:
+            evicted = self._commands.popleft()
+            evicted.cancel_timer()
+            self.dropped += 1
+            LOGGER.warning(f"Command queue full, dropping command for {evicted.topic}")
+            evicted.resolve(CommandDroppedError("Command queue is full"))
+
+    def _compact(self, command: QueuedCommand):
+        fields = command.fields
+        for queued in list(self._commands):
+            if queued.topic != command.topic:
+                continue
+
+            overlap = queued.fields & fields
+            if not overlap:
+                continue
+
+            for field in overlap:
+                del queued.payload[field]
+
+            if not queued.fields:
+                # Fully superseded, its callers complete with the newer command
+                self._commands.remove(queued)
+                queued.cancel_timer()
+                command.waiters.extend(queued.waiters)
+                command.commands = tuple(dict.fromkeys(queued.commands + command.commands))
+
+    def _start_timer(self, command: QueuedCommand):
+        if self.max_age is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Without a loop, expired commands are dropped by pop
+            return
+        remaining = command.queued_at + self.max_age - time.monotonic()
+        command.timer = loop.call_later(max(remaining, 0), self._expire, command)
+
+    def _expire(self, command: QueuedCommand):
+        command.timer = None
+        try:
+            self._commands.remove(command)
+        except ValueError:
+            return
+        self._drop_expired(command)
+
+    def _drop_expired(self, command: QueuedCommand):
+        self.dropped += 1
+        LOGGER.warning(f"Dropping expired command for {command.topic}")
+        command.resolve(CommandDroppedError("Command expired before the broker reconnected"))
+
+    def pop(self) -> QueuedCommand:
+        """Return the oldest command that has not expired, or None."""
+        now = time.monotonic()
+        while self._commands:
+            command = self._commands.popleft()
+            command.cancel_timer()
+            if self.max_age is not None and now - command.queued_at > self.max_age:
+                self._drop_expired(command)
+                continue
+            return command
+        return None
+
+    def push_front(self, command: QueuedCommand):
+        """Put back a command that could not be sent."""
+        self._commands.appendleft(command)
+        self._start_timer(command)
+
+    def clear(self, error: Exception = None):
+        while self._commands:
+            command = self._commands.popleft()
+            command.cancel_timer()
+            command.resolve(error or CommandDroppedError("Command queue cleared"))
@@ -0,0 +1,187 @@
+"""REST status polling while the MQTT stream is unavailable.
+
+A device is polled while its broker connection is down (for a sharded
+broker, the connection of its shard) or when no message arrived from it
+for `stale_after` seconds. Polled statuses are delivered through the
+broker like MQTT messages, so callbacks, history and latency tracking see
+them the same way. A device is polled every `min_interval` seconds while
+it is being commanded or its status keeps changing, backing off up to
+`max_interval` while it is idle. All devices share a budget of `budget`
+requests per minute, the most overdue devices go first. A device stops
+being polled as soon as its stream recovers.
+"""
+
+import asyncio
+import time
+
+from .device import Device, DeviceStatus
+from .logger import LOGGER
+
+
+class PolledDevice:
+    __slots__ = ("interval", "next_poll")
+
+    def __init__(self, interval: float, next_poll: float):
+        self.interval = interval
+        self.next_poll = next_poll
+
+
+class StatusPoller:
+    check_interval = 5  # In seconds
+    stale_after = 900  # In seconds without a message, None only polls during outages
+    min_interval = 15  # In seconds, for active devices
+    max_interval = 300  # In seconds, for idle devices
+    backoff = 2  # Interval multiplier after a poll without changes
+    active_window = 120  # In seconds since the last command
+    budget = 60  # Requests per minute, for all devices
+    max_concurrency = 4
+
+    def __init__(
+        self,
+        hub,
+        stale_after: float = None,
+        min_interval: float = None,
+        max_interval: float = None,
+        budget: int = None,
+        clock=time.monotonic,
+    ):
+        if stale_after is not None:
+            self.stale_after = stale_after
+        if min_interval is not None:
+            self.min_interval = min_interval
+        if max_interval is not None:
+            self.max_interval = max_interval
+        if budget is not None:
+            self.budget = budget
+        if self.budget <= 0:
+            raise ValueError("budget must be positive")
+        self.hub = hub
+        self.clock = clock
+        # Devices being polled, by id
+        self.polling: dict[str, PolledDevice] = {}
+        self.polls = 0
+        self.poll_errors = 0
+        self._tokens = float(self.budget)
+        self._refilled_at = clock()
+        self._started_at = clock()
+        self._task: asyncio.Task = None
+
+    @property
+    def is_polling(self) -> bool:
+        return bool(self.polling)
+
+    def start(self):
+        """Check devices every `check_interval` seconds, in a background task of the hub."""
+        if self._task is not None and not self._task.done():
+            return
+        self._started_at = self.clock()
+        self._task = self.hub._create_background_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.polling.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.poll_due()
+            except Exception:
+                LOGGER.exception("Status polling failed")
+
+    def _needs_polling(self, device: Device, now: float) -> bool:
+        broker = self.hub.broker
+        if not broker.is_streaming(device.status_topic):
+            return True
+        if self.stale_after is None:
+            return False
+        last_message = broker.last_message_at(device.status_topic)
+        return now - (last_message if last_message is not None else self._started_at) > self.stale_after
+
+    def _update_polling(self, now: float):
+        was_polling = self.is_polling
+        for device in self.hub.home.devices:
+            if self._needs_polling(device, now):
+                if device.id not in self.polling:
+                    self.polling[device.id] = PolledDevice(self.min_interval, now)
+            elif self.polling.pop(device.id, None) is not None:
+                LOGGER.debug(f"Stream of {device.id} recovered, polling stopped")
+
+        for device_id in list(self.polling):
+            if device_id not in self.hub.registry:
+                del self.polling[device_id]
+
+        if self.is_polling and not was_polling:
+            LOGGER.warning(f"MQTT stream unavailable, polling the status of {len(self.polling)} device(s)")
+        elif was_polling and not self.is_polling:
+            LOGGER.info("MQTT stream recovered, status polling stopped")
+
+    def _refill(self, now: float):
+        self._tokens = min(self.budget, self._tokens + (now - self._refilled_at) * self.budget / 60)
+        self._refilled_at = now
+
+    async def poll_due(self):
+        """Poll the devices that are due, within the request budget."""
+        now = self.clock()
+        self._update_polling(now)
+        self._refill(now)
+
+        due = sorted(
+            (polled.next_poll, device_id)
+            for device_id, polled in self.polling.items()
+            if polled.next_poll <= now
+        )
+        count = min(len(due), int(self._tokens))
+        if count < len(due):
+            LOGGER.debug(f"Polling budget exhausted, {len(due) - count} device(s) delayed")
+        self._tokens -= count
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def poll(device_id: str):
+            async with semaphore:
+                device = self.hub.registry.get(device_id)
+                if device is not None:
+                    await self._poll(device)
+
+        await asyncio.gather(*[poll(device_id) for _, device_id in due[:count]])
+
+    async def _poll(self, device: Device):
+        self.polls += 1
+        try:
+            payload = await self.hub._get_device_status(device.id)
+        except Exception as error:
+            self.poll_errors += 1
+            LOGGER.warning(f"Unable to poll status of {device.id}: {error}")
+            self._schedule(device, changed=False)
+            return
+
+        changed = True
+        if device.has_status and payload.get("ty") == "AC":
+            status = DeviceStatus.from_payload(payload, is_online=payload.get("onlineStatus") == "true")
+            changed = bool(status.diff(device.status))
+
+        broker = self.hub.broker
+        if payload.get("ty") == "AC":
+            broker.deliver(device.status_topic, payload)
+        if "onlineStatus" in payload:
+            broker.deliver(device.connection_status_topic, {"onlineStatus": payload["onlineStatus"]})
+        self._schedule(device, changed)
+
+    def _schedule(self, device: Device, changed: bool):
+        polled = self.polling.get(device.id)
+        if polled is None:
+            # Recovered while the request was in flight
+            return
+
+        now = self.clock()
+        last_command = self.hub.broker.last_command_at(device.control_topic)
+        if changed or (last_command is not None and now - last_command < self.active_window):
+            polled.interval = self.min_interval
+        else:
+            polled.interval = min(polled.interval * self.backoff, self.max_interval)
+        polled.next_poll = now + polled.interval
@@ -0,0 +1,171 @@
+"""Recording and replay of MQTT traffic.
+
+A recording is a binary log: an 8 byte header (`MIRAIE` and a version)
+followed by one record per message, each a fixed `<dBHI` header
+(timestamp, kind, topic length, payload length), the UTF-8 topic and the
+raw payload bytes. Records are only appended, so a recording survives a
+crash up to its last complete record.
+
+`read_recording` streams records from a memory map, so captures larger
+than memory can be read. `replay` feeds the received messages of a
+recording back through `MirAIeBroker.on_message`.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+from typing import Iterator
+
+from aiomqtt import Message
+
+from .logger import LOGGER
+
+
+MAGIC = b"MIRAIE"
+VERSION = 1
+HEADER = MAGIC + struct.pack("<H", VERSION)
+RECORD = struct.Struct("<dBHI")
+
+RECEIVED = 0
+PUBLISHED = 1
+
+
+class RecordedMessage:
+    __slots__ = ("timestamp", "kind", "topic", "payload")
+
+    def __init__(self, timestamp: float, kind: int, topic: str, payload: bytes):
+        self.timestamp = timestamp
+        self.kind = kind
+        self.topic = topic
+        self.payload = payload
+
+    def __repr__(self):
+        kind = "received" if self.kind == RECEIVED else "published"
+        return f"RecordedMessage({self.timestamp}, {kind}, {self.topic}, {len(self.payload)} bytes)"
+
+
+class TrafficRecorder:
+    """Appends received and published messages to `path`.
+
+    Set it as `broker.recorder` to record everything the broker receives and
+    publishes. Once closed, further messages are ignored.
+    """
+
+    buffer_size = 1 << 16  # In bytes
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.records = 0
+        self._file = open(path, "ab", buffering=self.buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excinfo):
+        self.close()
+
+    def record(self, kind: int, topic: str, payload: bytes, timestamp: float = None):
+        if self._file.closed:
+            return
+        topic_bytes = topic.encode("utf-8")
+        header = RECORD.pack(
+            self.clock() if timestamp is None else timestamp, kind, len(topic_bytes), len(payload)
+        )
+        self._file.write(header + topic_bytes + payload)
+        self.records += 1
+
+    def received(self, topic: str, payload: bytes):
+        self.record(RECEIVED, topic, payload)
+
+    def published(self, topic: str, payload: bytes):
+        self.record(PUBLISHED, topic, payload)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_recording(path: str, kind: int = None) -> Iterator[RecordedMessage]:
+    """Stream the records of a recording, optionally only those of `kind`."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < len(HEADER):
+            raise ValueError(f"{path} is not a MirAIe recording")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(HEADER)] != HEADER:
+                raise ValueError(f"{path} is not a MirAIe recording of version {VERSION}")
+
+            offset = len(HEADER)
+            end = len(data)
+            while offset < end:
+                if offset + RECORD.size > end:
+                    LOGGER.warning(f"Ignoring truncated record at the end of {path}")
+                    return
+                timestamp, record_kind, topic_length, payload_length = RECORD.unpack_from(data, offset)
+                start = offset + RECORD.size
+                offset = start + topic_length + payload_length
+                if offset > end:
+                    LOGGER.warning(f"Ignoring truncated record at the end of {path}")
+                    return
+                if kind is not None and record_kind != kind:
+                    continue
+                topic = data[start:start + topic_length].decode("utf-8")
+                yield RecordedMessage(timestamp, record_kind, topic, data[start + topic_length:offset])
+
+
+class ReplayResult:
+    __slots__ = ("messages", "elapsed")
+
+    def __init__(self, messages: int, elapsed: float):
+        self.messages = messages
+        self.elapsed = elapsed  # In seconds
+
+    @property
+    def rate(self) -> float:
+        """Messages per second."""
+        return self.messages / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return f"ReplayResult({self.messages} messages in {self.elapsed:.3f} s, {self.rate:.0f} msg/s)"
+
+
+async def replay(broker, path: str, speed: float = None, yield_every: int = 100) -> ReplayResult:
+    """Feed the received messages of a recording to `broker.on_message`.
+
+    With `speed`, messages keep their original spacing divided by `speed`
+    (1 is real time); otherwise they are replayed as fast as possible,
+    yielding to the loop every `yield_every` messages so the dispatcher can
+    keep up.
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError("speed must be positive")
+
+    loop = asyncio.get_running_loop()
+    messages = 0
+    first = None
+    start = loop.time()
+    for record in read_recording(path, RECEIVED):
+        if speed is not None:
+            if first is None:
+                first = record.timestamp
+            delay = start + (record.timestamp - first) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif messages % yield_every == yield_every - 1:
+            await asyncio.sleep(0)
+
+        broker.on_message(Message(record.topic, record.payload, 0, False, 0, None))
+        messages += 1
+
+    # A sharded broker routes each message to the shard of its device
+    for shard in getattr(broker, "shards", (broker,)):
+        if shard.dispatcher is not None:
+            await shard.dispatcher.join()
+    return ReplayResult(messages, loop.time() - start)
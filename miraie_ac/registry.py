@@ -0,0 +1,125 @@
+from collections.abc import Mapping, Sequence
+
+from .topic import MirAIeTopic
+
+
+def topic_prefix(topic: str) -> str:
+    return topic.rsplit("/", 1)[0]
+
+
+class DeviceListView(Sequence):
+    """Read-only list of the devices in a registry, in insertion order."""
+
+    def __init__(self, registry: "DeviceRegistry"):
+        self._registry = registry
+
+    def __getitem__(self, index):
+        return self._registry._ordered()[index]
+
+    def __len__(self):
+        return len(self._registry)
+
+    def __iter__(self):
+        return iter(self._registry._ordered())
+
+    def __repr__(self):
+        return repr(list(self._registry._ordered()))
+
+
+class TopicMapView(Mapping):
+    """Read-only mapping of device id to its MirAIeTopic."""
+
+    def __init__(self, registry: "DeviceRegistry"):
+        self._registry = registry
+
+    def __getitem__(self, device_id: str) -> MirAIeTopic:
+        return self._registry._topics[device_id]
+
+    def __len__(self):
+        return len(self._registry._topics)
+
+    def __iter__(self):
+        return iter(self._registry._topics)
+
+    def __repr__(self):
+        return repr(self._registry._topics)
+
+
+class DeviceRegistry:
+    """Indexes devices by id, topic prefix and each of their topics."""
+
+    def __init__(self):
+        self._devices: dict = {}
+        self._topics: dict[str, MirAIeTopic] = {}
+        self._by_prefix: dict = {}
+        self._by_topic: dict = {}
+        self._ordered_cache = None
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __iter__(self):
+        return iter(self._ordered())
+
+    def __contains__(self, device_id: str):
+        return device_id in self._devices
+
+    def _ordered(self) -> tuple:
+        if self._ordered_cache is None:
+            self._ordered_cache = tuple(self._devices.values())
+        return self._ordered_cache
+
+    @property
+    def devices(self) -> DeviceListView:
+        return DeviceListView(self)
+
+    @property
+    def topics(self) -> TopicMapView:
+        return TopicMapView(self)
+
+    def add(self, device):
+        if device.id in self._devices:
+            self.remove(device.id)
+
+        topic = MirAIeTopic(
+            control_topic=device.control_topic,
+            status_topic=device.status_topic,
+            connection_status_topic=device.connection_status_topic,
+        )
+
+        self._devices[device.id] = device
+        self._topics[device.id] = topic
+        self._by_prefix[topic_prefix(device.control_topic)] = device
+        self._by_topic[topic.control_topic] = device
+        self._by_topic[topic.status_topic] = device
+        self._by_topic[topic.connection_status_topic] = device
+        self._ordered_cache = None
+
+    def remove(self, device_id: str):
+        device = self._devices.pop(device_id, None)
+        if device is None:
+            return None
+
+        topic = self._topics.pop(device_id)
+        self._by_prefix.pop(topic_prefix(topic.control_topic), None)
+        self._by_topic.pop(topic.control_topic, None)
+        self._by_topic.pop(topic.status_topic, None)
+        self._by_topic.pop(topic.connection_status_topic, None)
+        self._ordered_cache = None
+        return device
+
+    def clear(self):
+        self._devices.clear()
+        self._topics.clear()
+        self._by_prefix.clear()
+        self._by_topic.clear()
+        self._ordered_cache = None
+
+    def get(self, device_id: str):
+        return self._devices.get(device_id)
+
+    def get_by_prefix(self, prefix: str):
+        return self._by_prefix.get(prefix)
+
+    def get_by_topic(self, topic: str):
+        return self._by_topic.get(topic)
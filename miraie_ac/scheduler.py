@@ -0,0 +1,381 @@
+"""Local schedules for device commands.
+
+Every schedule lives in one heap ordered by its next run, driven by a
+single task that sleeps until the earliest one. A schedule either runs
+once (`at` is a datetime) or every day, optionally only on some weekdays
+(`at` is a time), in its own timezone (the local one by default).
+
+Each device gets a stable offset of up to `jitter` seconds, so schedules
+set for the same instant (e.g. every AC at 18:00) reach the broker spread
+out instead of all at once. Commands of one device due together are sent
+as one batch, the last schedule winning when several set the same
+command; with the broker's `coalesce_window` they become one message.
+
+With `path`, schedules are saved as JSON after each change and loaded
+when the scheduler is created.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import time
+from datetime import datetime, time as dt_time, timedelta, tzinfo
+from itertools import count
+from typing import Iterable, Optional, Union
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from .device import Device
+from .group import COMMANDS
+from .enums import STATUS_ENUMS
+from .logger import LOGGER
+from .utils import write_json_atomic
+
+SCHEDULES_VERSION = 1
+
+
+def _zone(timezone: Optional[str]) -> Optional[tzinfo]:
+    return ZoneInfo(timezone) if timezone else None
+
+
+def _localize(value: datetime, zone: Optional[tzinfo]) -> datetime:
+    if value.tzinfo is not None:
+        return value
+    # Naive datetimes are in the schedule's timezone, or the local one
+    return value.replace(tzinfo=zone) if zone is not None else value.astimezone()
+
+
+class Schedule:
+    __slots__ = ("id", "device_id", "command", "value", "at", "weekdays", "timezone", "next_due")
+
+    def __init__(
+        self,
+        id: str,
+        device_id: str,
+        command: str,
+        value,
+        at: Union[datetime, dt_time],
+        weekdays: Iterable[int] = None,
+        timezone: str = None,
+    ):
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command}, expected one of {', '.join(COMMANDS)}")
+        if not isinstance(at, (datetime, dt_time)):
+            raise ValueError("at must be a datetime (once) or a time (daily)")
+        if weekdays is not None:
+            weekdays = frozenset(weekdays)
+            if isinstance(at, datetime):
+                raise ValueError("weekdays only apply to daily schedules")
+            if not weekdays or not weekdays.issubset(range(7)):
+                raise ValueError("weekdays must be numbers from 0 (Monday) to 6 (Sunday)")
+        self.id = id
+        self.device_id = device_id
+        self.command = command
+        self.value = value
+        self.at = at
+        self.weekdays = weekdays
+        self.timezone = timezone
+        _zone(timezone)  # Raises for unknown timezones
+        # Timestamp of the next run, without jitter
+        self.next_due: float = None
+
+    def __repr__(self):
+        when = self.at.isoformat()
+        if isinstance(self.at, dt_time):
+            days = "daily" if self.weekdays is None else f"on {sorted(self.weekdays)}"
+            when = f"{when} {days}"
+        return f"Schedule({self.id}, {self.device_id}, {self.command}={self.value!r}, {when})"
+
+    @property
+    def is_recurring(self) -> bool:
+        return isinstance(self.at, dt_time)
+
+    def next_run(self, after: float) -> Optional[float]:
+        """Timestamp of the first run after `after`, None if there is none."""
+        zone = _zone(self.timezone)
+        if not self.is_recurring:
+            due = _localize(self.at, zone).timestamp()
+            return due if due > after else None
+
+        day = datetime.fromtimestamp(after, zone).date()
+        for offset in range(8):
+            current = day + timedelta(days=offset)
+            if self.weekdays is not None and current.weekday() not in self.weekdays:
+                continue
+            due = _localize(datetime.combine(current, self.at), zone).timestamp()
+            if due > after:
+                return due
+        return None
+
+    def to_dict(self) -> dict:
+        value = self.value.value if hasattr(self.value, "value") else self.value
+        return {
+            "id": self.id,
+            "device_id": self.device_id,
+            "command": self.command,
+            "value": value,
+            "at": self.at.isoformat(),
+            "recurring": self.is_recurring,
+            "weekdays": sorted(self.weekdays) if self.weekdays is not None else None,
+            "timezone": self.timezone,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Schedule":
+        enum = STATUS_ENUMS.get(COMMANDS[data["command"]][1])
+        value = enum(data["value"]) if enum is not None else data["value"]
+        parse = dt_time.fromisoformat if data["recurring"] else datetime.fromisoformat
+        return cls(
+            data["id"],
+            data["device_id"],
+            data["command"],
+            value,
+            parse(data["at"]),
+            data.get("weekdays"),
+            data.get("timezone"),
+        )
+
+
+class Scheduler:
+    jitter = 30  # In seconds, the largest offset of a device
+    misfire_grace = 60  # In seconds, runs missed by less (e.g. during a restart) still happen
+    max_in_flight = 10  # Devices being commanded at once
+    max_sleep = 60  # In seconds, so wall clock changes are noticed
+
+    def __init__(self, hub, path: str = None, jitter: float = None, clock=time.time):
+        if jitter is not None:
+            self.jitter = jitter
+        self.hub = hub
+        self.path = path
+        self.clock = clock
+        self.schedules: dict[str, Schedule] = {}
+        # (fire time, sequence, schedule id, due time)
+        self._heap: list[tuple[float, int, str, float]] = []
+        # Sequence of the current heap entry of each schedule, older entries are skipped
+        self._entries: dict[str, int] = {}
+        self._sequence = count()
+        self._dirty = False
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task = None
+        self._sends = set()
+        self._semaphore: asyncio.Semaphore = None
+        if path is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self.schedules)
+
+    def __iter__(self):
+        return iter(self.schedules.values())
+
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        return self.schedules.get(schedule_id)
+
+    def offset(self, device_id: str) -> float:
+        """Stable jitter of a device, in seconds."""
+        digest = hashlib.blake2b(device_id.encode("utf-8"), digest_size=4).digest()
+        return int.from_bytes(digest, "big") / 2**32 * self.jitter
+
+    def add(
+        self,
+        device: Union[Device, str],
+        command: str,
+        value,
+        at: Union[datetime, dt_time],
+        weekdays: Iterable[int] = None,
+        timezone: str = None,
+        schedule_id: str = None,
+    ) -> Schedule:
+        """Schedule `command` once (`at` is a datetime) or daily (`at` is a time).
+
+        Weekdays are numbered from 0 (Monday). Adding a schedule with the id
+        of an existing one replaces it.
+        """
+        device_id = device.id if isinstance(device, Device) else device
+        schedule = Schedule(schedule_id or uuid4().hex, device_id, command, value, at, weekdays, timezone)
+        if schedule.next_run(self.clock() - self.misfire_grace) is None:
+            raise ValueError(f"{schedule} is in the past")
+        self.schedules[schedule.id] = schedule
+        self._push(schedule, self.clock() - self.misfire_grace)
+        self._changed()
+        return schedule
+
+    def remove(self, schedule_id: str) -> bool:
+        # Its heap entry is skipped when it comes up
+        if self.schedules.pop(schedule_id, None) is None:
+            return False
+        del self._entries[schedule_id]
+        self._changed()
+        return True
+
+    def remove_device(self, device_id: str) -> int:
+        """Remove every schedule of a device, returns how many were removed."""
+        removed = [schedule.id for schedule in self.schedules.values() if schedule.device_id == device_id]
+        for schedule_id in removed:
+            del self.schedules[schedule_id]
+            del self._entries[schedule_id]
+        if removed:
+            self._changed()
+        return len(removed)
+
+    def next_fire_time(self) -> Optional[float]:
+        """Timestamp of the next run, including jitter."""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _entry(self, schedule: Schedule) -> tuple[float, int, str, float]:
+        sequence = self._entries[schedule.id] = next(self._sequence)
+        return (schedule.next_due + self.offset(schedule.device_id), sequence, schedule.id, schedule.next_due)
+
+    def _push(self, schedule: Schedule, after: float) -> bool:
+        schedule.next_due = schedule.next_run(after)
+        if schedule.next_due is None:
+            self._entries.pop(schedule.id, None)
+            return False
+        entry = self._entry(schedule)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        return True
+
+    def _is_current(self, entry: tuple) -> bool:
+        return self._entries.get(entry[2]) == entry[1]
+
+    def _discard_stale(self):
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _changed(self):
+        if self.path is not None:
+            self._dirty = True
+            self._wakeup.set()
+
+    def start(self):
+        """Run schedules in a background task of the hub."""
+        if self._task is not None and not self._task.done():
+            return
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._task = self.hub._create_background_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+        if self._dirty:
+            self.save()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if self._dirty:
+                self.save()
+
+            fire_time = self.next_fire_time()
+            delay = self.max_sleep if fire_time is None else fire_time - self.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), min(delay, self.max_sleep))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                self.run_due()
+            except Exception:
+                LOGGER.exception("Unable to run schedules")
+
+    def run_due(self) -> dict[str, dict]:
+        """Send the commands that are due, returns them by device id."""
+        now = self.clock()
+        batches: dict[str, dict] = {}
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_current(entry):
+                continue
+            schedule = self.schedules[entry[2]]
+            # Later schedules win for the same device and command
+            batches.setdefault(schedule.device_id, {})[schedule.command] = schedule.value
+
+            if schedule.is_recurring:
+                # Runs missed while the loop was blocked or the machine slept are skipped
+                self._push(schedule, max(entry[3], now - self.misfire_grace))
+            else:
+                del self.schedules[schedule.id]
+                del self._entries[schedule.id]
+                self._changed()
+
+        for device_id, commands in batches.items():
+            task = asyncio.get_running_loop().create_task(self._send(device_id, commands))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+        return batches
+
+    async def _send(self, device_id: str, commands: dict):
+        device = self.hub.registry.get(device_id)
+        if device is None:
+            LOGGER.warning(f"Skipping schedules of unknown device {device_id}")
+            return
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            LOGGER.debug(f"Running schedules of {device_id}: {commands}")
+            # Sent together so the broker can coalesce them
+            results = await asyncio.gather(
+                *[getattr(device, COMMANDS[command][0])(value) for command, value in commands.items()],
+                return_exceptions=True,
+            )
+        for command, result in zip(commands, results):
+            if isinstance(result, Exception):
+                LOGGER.error(f"Scheduled {command} command failed for {device_id}: {result}")
+
+    def save(self, path: str = None):
+        path = path or self.path
+        data = {
+            "version": SCHEDULES_VERSION,
+            "schedules": [schedule.to_dict() for schedule in self.schedules.values()],
+        }
+        write_json_atomic(path, data)
+        self._dirty = False
+
+    def load(self, path: str = None):
+        """Replace the schedules with those saved in `path`, if it exists."""
+        path = path or self.path
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as error:
+            LOGGER.warning(f"Ignoring unreadable schedules {path}: {error}")
+            return
+        if data.get("version") != SCHEDULES_VERSION:
+            LOGGER.info(f"Ignoring schedules {path} with version {data.get('version')}")
+            return
+
+        self.schedules.clear()
+        self._entries.clear()
+        self._heap = []
+        after = self.clock() - self.misfire_grace
+        for entry in data["schedules"]:
+            try:
+                schedule = Schedule.from_dict(entry)
+            except (KeyError, TypeError, ValueError) as error:
+                LOGGER.warning(f"Ignoring invalid schedule {entry.get('id')}: {error}")
+                continue
+            schedule.next_due = schedule.next_run(after)
+            if schedule.next_due is None:
+                # A one-shot schedule that was missed
+                LOGGER.info(f"Dropping expired {schedule}")
+                self._dirty = True
+                continue
+            self.schedules[schedule.id] = schedule
+            self._heap.append(self._entry(schedule))
+        # Faster than pushing one at a time
+        heapq.heapify(self._heap)
+        LOGGER.info(f"Loaded {len(self.schedules)} schedule(s) from {path}")
@@ -0,0 +1,340 @@
+"""Broker that shards devices across several MQTT connections.
+
+Every shard is a `MirAIeBroker` with its own connection, reconnect backoff
+and offline queue, so a reconnect only interrupts the devices of one shard.
+Devices are assigned by rendezvous hashing of their topic prefix: a device
+always uses the same shard, and changing the number of shards only moves
+the devices of the shards that were added or removed.
+"""
+
+import asyncio
+import hashlib
+import math
+from itertools import count
+from typing import Callable
+
+from aiomqtt import Message
+
+from .broker import MirAIeBroker
+from .enums import PowerMode, HVACMode, FanMode, PresetMode, SwingMode, DisplayMode, ConvertiMode
+from .latency import LatencyTracker
+from .metrics import AggregateBrokerMetrics
+from .registry import DeviceRegistry, topic_prefix
+from .logger import LOGGER
+
+
+def shard_index(key: str, shard_count: int) -> int:
+    """Rendezvous hash of `key` over `shard_count` shards, stable across processes."""
+
+    def weight(shard: int) -> int:
+        digest = hashlib.blake2b(f"{shard}/{key}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    return max(range(shard_count), key=weight)
+
+
+class ShardedMirAIeBroker:
+    """Drop-in replacement for `MirAIeBroker` that spreads devices over `shard_count` connections.
+
+    With `max_devices_per_shard`, shards are added as the fleet grows.
+    """
+
+    shard_count = 4
+    max_devices_per_shard = None
+
+    # Copied to every shard when it connects
+    host = MirAIeBroker.host
+    port = MirAIeBroker.port
+    use_ssl = MirAIeBroker.use_ssl
+    reconnect_interval = MirAIeBroker.reconnect_interval
+    reconnect_interval_max = MirAIeBroker.reconnect_interval_max
+    coalesce_window = MirAIeBroker.coalesce_window
+    subscribe_batch_size = MirAIeBroker.subscribe_batch_size
+    subscribe_timeout = MirAIeBroker.subscribe_timeout
+    executor = MirAIeBroker.executor
+    _recorder = MirAIeBroker.recorder
+    optimistic = MirAIeBroker.optimistic
+    optimistic_timeout = MirAIeBroker.optimistic_timeout
+    SHARD_OPTIONS = (
+        "host",
+        "port",
+        "use_ssl",
+        "reconnect_interval",
+        "reconnect_interval_max",
+        "coalesce_window",
+        "subscribe_batch_size",
+        "subscribe_timeout",
+        "executor",
+        "recorder",
+    )
+
+    def __init__(
+        self,
+        shard_count: int = None,
+        max_devices_per_shard: int = None,
+        coalesce_window: float = None,
+        optimistic: bool = None,
+    ) -> None:
+        if shard_count is not None:
+            self.shard_count = shard_count
+        if max_devices_per_shard is not None:
+            self.max_devices_per_shard = max_devices_per_shard
+        if coalesce_window is not None:
+            self.coalesce_window = coalesce_window
+        if optimistic is not None:
+            self.optimistic = optimistic
+        if self.shard_count < 1:
+            raise ValueError("At least one shard is required")
+
+        self.registry = DeviceRegistry()
+        # Shared by all shards so percentiles cover the whole fleet
+        self.latency = LatencyTracker()
+        # Shared too, the tracker keys commands by sid and devices move between shards on resize
+        self._sids = count(1)
+        self.metrics = AggregateBrokerMetrics(lambda: [shard.metrics for shard in self.shards])
+        self.commandTopics: list[str] = []
+        self.shards: list[MirAIeBroker] = []
+        self._callbacks: dict[str, Callable] = {}
+        # Topic prefix -> shard index
+        self._assignment: dict[str, int] = {}
+        self._tasks: dict[MirAIeBroker, asyncio.Task] = {}
+        self._connection: tuple = None
+        self._password: str = None
+
+        for _ in range(self.shard_count):
+            self.shards.append(self._create_shard())
+
+    def _create_shard(self) -> MirAIeBroker:
+        shard = MirAIeBroker()
+        self._configure(shard)
+        # A wildcard would deliver every message of the home to every shard
+        shard.use_wildcards = False
+        shard.latency = self.latency
+        shard._sids = self._sids
+        shard.set_registry(self.registry)
+        if self._password is not None:
+            shard.set_password(self._password)
+        return shard
+
+    def _configure(self, shard: MirAIeBroker):
+        for option in self.SHARD_OPTIONS:
+            setattr(shard, option, getattr(self, option))
+
+    def shard_of(self, topic: str) -> MirAIeBroker:
+        prefix = topic_prefix(topic)
+        index = self._assignment.get(prefix)
+        if index is None:
+            index = self._assignment[prefix] = shard_index(prefix, len(self.shards))
+        return self.shards[index]
+
+    @property
+    def recorder(self):
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        # Shards are already running when a recorder is set after init
+        self._recorder = recorder
+        for shard in getattr(self, "shards", ()):
+            shard.recorder = recorder
+
+    @property
+    def is_ready(self) -> bool:
+        return all(shard.is_ready for shard in self.shards)
+
+    async def wait_until_ready(self, timeout: float = None):
+        await asyncio.wait_for(
+            asyncio.gather(*[shard.wait_until_ready() for shard in self.shards]), timeout
+        )
+
+    def is_streaming(self, topic: str) -> bool:
+        return self.shard_of(topic).is_ready
+
+    def last_message_at(self, topic: str) -> float:
+        return self.shard_of(topic).last_message_at(topic)
+
+    def last_command_at(self, topic: str) -> float:
+        return self.shard_of(topic).last_command_at(topic)
+
+    def deliver(self, topic: str, payload: dict):
+        self.shard_of(topic).deliver(topic, payload)
+
+    def on_message(self, message: Message):
+        self.shard_of(message.topic.value).on_message(message)
+
+    def register_device_callback(self, topic: str, callback):
+        self._callbacks[topic] = callback
+        self.shard_of(topic).register_device_callback(topic, callback)
+
+    def remove_device_callback(self, topic: str):
+        self._callbacks.pop(topic, None)
+        self.shard_of(topic).remove_device_callback(topic)
+
+    def set_registry(self, registry: DeviceRegistry):
+        self.registry = registry
+        for shard in self.shards:
+            shard.set_registry(registry)
+
+    def set_password(self, password: str):
+        self._password = password
+        for shard in self.shards:
+            shard.set_password(password)
+
+    def _topics_by_shard(self) -> dict[MirAIeBroker, list[str]]:
+        topics = {shard: [] for shard in self.shards}
+        for topic in self.commandTopics:
+            topics[self.shard_of(topic)].append(topic)
+        return topics
+
+    def _required_shards(self) -> int:
+        if not self.max_devices_per_shard:
+            return len(self.shards)
+        devices = len({topic_prefix(topic) for topic in self.commandTopics})
+        return max(len(self.shards), math.ceil(devices / self.max_devices_per_shard))
+
+    def set_topics(self, topics: list[str]):
+        self.commandTopics = list(topics)
+        required = self._required_shards()
+        if required > len(self.shards) and self._connection is None:
+            self._resize_shards(required)
+        for shard, shard_topics in self._topics_by_shard().items():
+            shard.set_topics(shard_topics)
+
+    async def update_topics(self, topics: list[str]):
+        """Replace the topics, adding shards if the fleet outgrew them."""
+        self.commandTopics = list(topics)
+        required = self._required_shards()
+        if required > len(self.shards):
+            await self.resize(required)
+            return
+        for shard, shard_topics in self._topics_by_shard().items():
+            await shard.update_topics(shard_topics)
+
+    def _resize_shards(self, shard_count: int) -> list[MirAIeBroker]:
+        """Add or remove shards and move callbacks, returns the removed shards."""
+        removed = self.shards[shard_count:]
+        self.shards = self.shards[:shard_count]
+        while len(self.shards) < shard_count:
+            self.shards.append(self._create_shard())
+
+        self._assignment.clear()
+        for topic, callback in self._callbacks.items():
+            for shard in self.shards + removed:
+                shard.remove_device_callback(topic)
+            self.shard_of(topic).register_device_callback(topic, callback)
+        return removed
+
+    async def resize(self, shard_count: int):
+        """Change the number of shards, moving only the devices that change shard."""
+        if shard_count < 1:
+            raise ValueError("At least one shard is required")
+        LOGGER.info(f"Resizing broker from {len(self.shards)} to {shard_count} shard(s)")
+        removed = self._resize_shards(shard_count)
+        self.shard_count = shard_count
+
+        for shard, shard_topics in self._topics_by_shard().items():
+            if shard in self._tasks or self._connection is None:
+                await shard.update_topics(shard_topics)
+            else:
+                shard.set_topics(shard_topics)
+                self._start(shard)
+
+        for shard in removed:
+            await self._stop(shard)
+
+    def _start(self, shard: MirAIeBroker):
+        username, get_token = self._connection
+        self._configure(shard)
+        task = asyncio.get_running_loop().create_task(shard.connect(username, self._password, get_token))
+        self._tasks[shard] = task
+        task.add_done_callback(self._shard_done)
+
+    def _shard_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER.error(f"Broker shard stopped: {task.exception()!r}")
+
+    async def _stop(self, shard: MirAIeBroker):
+        # Let coalesced commands reach the outbox, then hand them to their new shard
+        if shard._flush_tasks:
+            await asyncio.gather(*shard._flush_tasks, return_exceptions=True)
+        task = self._tasks.pop(shard, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        while True:
+            command = shard.outbox.pop()
+            if command is None:
+                break
+            self.shard_of(command.topic).outbox.put(
+                command.topic, command.payload, command.commands, command.waiters, command.queued_at
+            )
+
+    async def connect(self, username: str, access_token: str, get_token):
+        """Connect every shard and keep them connected until cancelled."""
+        self._password = access_token
+        self._connection = (username, get_token)
+        for shard in self.shards:
+            self._start(shard)
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            self._connection = None
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def health(self) -> dict:
+        """Connection state of every shard."""
+        topics = self._topics_by_shard()
+        shards = []
+        for index, shard in enumerate(self.shards):
+            shards.append(
+                {
+                    "shard": index,
+                    "ready": shard.is_ready,
+                    "connected": shard.metrics.is_connected,
+                    "devices": len({topic_prefix(topic) for topic in topics[shard]}),
+                    "reconnects": shard.metrics.reconnects,
+                    "queued_commands": len(shard.outbox),
+                }
+            )
+        ready = sum(shard["ready"] for shard in shards)
+        return {
+            "shards": len(shards),
+            "ready": ready,
+            "healthy": ready == len(shards),
+            "per_shard": shards,
+        }
+
+    def build_payload(self, command: str, value) -> dict:
+        return self.shards[0].build_payload(command, value)
+
+    async def set_power(self, topic: str, power: PowerMode):
+        await self.shard_of(topic).set_power(topic, power)
+
+    async def set_temperature(self, topic: str, temperature: float):
+        await self.shard_of(topic).set_temperature(topic, temperature)
+
+    async def set_hvac_mode(self, topic: str, mode: HVACMode):
+        await self.shard_of(topic).set_hvac_mode(topic, mode)
+
+    async def set_fan_mode(self, topic: str, mode: FanMode):
+        await self.shard_of(topic).set_fan_mode(topic, mode)
+
+    async def set_preset_mode(self, topic: str, mode: PresetMode):
+        await self.shard_of(topic).set_preset_mode(topic, mode)
+
+    async def set_v_swing_mode(self, topic: str, mode: SwingMode):
+        await self.shard_of(topic).set_v_swing_mode(topic, mode)
+
+    async def set_h_swing_mode(self, topic: str, mode: SwingMode):
+        await self.shard_of(topic).set_h_swing_mode(topic, mode)
+
+    async def set_display_mode(self, topic: str, mode: DisplayMode):
+        await self.shard_of(topic).set_display_mode(topic, mode)
+
+    async def set_converti_mode(self, topic: str, mode: ConvertiMode):
+        await self.shard_of(topic).set_converti_mode(topic, mode)
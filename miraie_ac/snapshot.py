@@ -0,0 +1,110 @@
+"""On-disk snapshot of the home topology, device details and last status.
+
+Lets `MirAIeHub.init` build devices and connect the broker straight away on
+restart, then revalidate against the REST API in the background.
+"""
+
+import json
+import os
+import time
+from typing import Optional
+
+from .device import Device, DeviceDetails, DeviceStatus
+from .enums import STATUS_ENUMS
+from .logger import LOGGER
+from .utils import write_json_atomic
+
+SNAPSHOT_VERSION = 1
+
+def status_to_dict(status: DeviceStatus) -> dict:
+    data = {}
+    for field in DeviceStatus.FIELDS:
+        value = getattr(status, field)
+        data[field] = value.value if field in STATUS_ENUMS else value
+    return data
+
+
+def status_from_dict(data: dict) -> DeviceStatus:
+    values = {}
+    for field in DeviceStatus.FIELDS:
+        value = data[field]
+        enum = STATUS_ENUMS.get(field)
+        values[field] = enum(value) if enum is not None else value
+    return DeviceStatus(**values)
+
+
+def details_to_dict(details: DeviceDetails) -> dict:
+    return {field: getattr(details, field) for field in DeviceDetails.__slots__}
+
+
+def details_from_dict(data: dict) -> DeviceDetails:
+    return DeviceDetails(**{field: data.get(field) for field in DeviceDetails.__slots__})
+
+
+def build_snapshot(home_id: str, devices) -> dict:
+    entries = []
+    for device in devices:
+        entry = {
+            "id": device.id,
+            "name": device.name,
+            "friendly_name": device.friendly_name,
+            "control_topic": device.control_topic,
+            "status_topic": device.status_topic,
+            "connection_status_topic": device.connection_status_topic,
+        }
+        if hasattr(device, "details"):
+            entry["details"] = details_to_dict(device.details)
+        if hasattr(device, "status"):
+            entry["status"] = status_to_dict(device.status)
+        entries.append(entry)
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "home_id": home_id,
+        "devices": entries,
+    }
+
+
+def save_snapshot(path: str, home_id: str, devices):
+    write_json_atomic(path, build_snapshot(home_id, devices))
+
+
+def load_snapshot(path: str) -> Optional[dict]:
+    """Read a snapshot, returns None if it is missing, unreadable or outdated."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            snapshot = json.load(file)
+    except (OSError, ValueError) as error:
+        LOGGER.warning(f"Ignoring unreadable snapshot {path}: {error}")
+        return None
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        LOGGER.info(f"Ignoring snapshot {path} with version {snapshot.get('version')}")
+        return None
+    return snapshot
+
+
+def restore_devices(snapshot: dict, broker) -> list[Device]:
+    devices = []
+    for entry in snapshot["devices"]:
+        device = Device(
+            id=entry["id"],
+            name=entry["name"],
+            friendly_name=entry["friendly_name"],
+            control_topic=entry["control_topic"],
+            status_topic=entry["status_topic"],
+            connection_status_topic=entry["connection_status_topic"],
+            broker=broker,
+        )
+        try:
+            if "details" in entry:
+                device.set_details(details_from_dict(entry["details"]))
+            if "status" in entry:
+                device.set_status(status_from_dict(entry["status"]))
+        except (KeyError, TypeError, ValueError) as error:
+            LOGGER.warning(f"Ignoring snapshot state of {device.id}: {error}")
+        devices.append(device)
+    return devices
@@ -1,11 +1,65 @@
+from typing import Callable, Optional
+
+
 class MirAIeTopic:
     control_topic: str
     status_topic: str
     connection_status_topic: str
 
+    __slots__ = ("control_topic", "status_topic", "connection_status_topic")
+
     def __init__(
         self, control_topic: str, status_topic: str, connection_status_topic: str
     ):
         self.control_topic = control_topic
         self.status_topic = status_topic
         self.connection_status_topic = connection_status_topic
+
+
+def wildcard_filter(topic: str) -> str:
+    """Replace the device level of `user/home/device/suffix` with a `+` wildcard."""
+    levels = topic.split("/")
+    if len(levels) < 3:
+        return topic
+    levels[-2] = "+"
+    return "/".join(levels)
+
+
+class TopicRouter:
+    """Routes device topics to their handler, indexed by suffix then prefix.
+
+    Topics look like `<prefix>/<suffix>` where the suffix is the message type
+    (`status`, `connectionStatus`), so a lookup is one split and two dict hits.
+    """
+
+    __slots__ = ("_routes",)
+
+    def __init__(self):
+        self._routes: dict[str, dict[str, Callable]] = {}
+
+    def __len__(self):
+        return sum(len(handlers) for handlers in self._routes.values())
+
+    def __contains__(self, topic: str):
+        return self.get(topic) is not None
+
+    def add(self, topic: str, handler: Callable):
+        prefix, _, suffix = topic.rpartition("/")
+        self._routes.setdefault(suffix, {})[prefix] = handler
+
+    def remove(self, topic: str):
+        prefix, _, suffix = topic.rpartition("/")
+        handlers = self._routes.get(suffix)
+        if handlers is None:
+            return
+        handlers.pop(prefix, None)
+        if not handlers:
+            del self._routes[suffix]
+
+    def resolve(self, prefix: str, suffix: str) -> Optional[Callable]:
+        handlers = self._routes.get(suffix)
+        return handlers.get(prefix) if handlers is not None else None
+
+    def get(self, topic: str) -> Optional[Callable]:
+        prefix, _, suffix = topic.rpartition("/")
+        return self.resolve(prefix, suffix)
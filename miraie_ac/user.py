@@ -1,8 +1,14 @@
+import time
+
+
 class User:
     access_token: str
     expires_in: int
     refresh_token: str
     user_id: str
+    issued_at: float
+
+    __slots__ = ("access_token", "expires_in", "refresh_token", "user_id", "issued_at")
 
     def __init__(
         self,
@@ -10,8 +16,18 @@ class User:
         expires_in: int,
         refresh_token: str,
         user_id: str,
+        issued_at: float = None,
     ):
         self.access_token = access_token
         self.expires_in = expires_in
         self.refresh_token = refresh_token
         self.user_id = user_id
+        self.issued_at = time.time() if issued_at is None else issued_at
+
+    @property
+    def expires_at(self) -> float:
+        """Unix timestamp at which the access token expires."""
+        return self.issued_at + float(self.expires_in or 0)
+
+    def expires_within(self, seconds: float) -> bool:
+        return time.time() + seconds >= self.expires_at
@@ -1,5 +1,7 @@
 # Write a function check if the given string is a valid email address.
 
+import json
+import os
 import re
 
 
@@ -17,3 +19,11 @@ def toFloat(value: str) -> float:
         return float(value)
     except ValueError:
         return -1.0
+
+
+def write_json_atomic(path: str, data):
+    """Write `data` as JSON to `path`, readers see either the old or the new file."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, separators=(",", ":"))
+    os.replace(temp_path, path)
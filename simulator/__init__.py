@@ -0,0 +1,11 @@
+"""Local simulator of the MirAIe cloud for offline testing and benchmarks.
+
+Serves the REST endpoints from `miraie_ac.constants`, runs a minimal MQTT
+broker and simulates a fleet of virtual ACs that publish status and
+connectionStatus messages and respond to control payloads.
+"""
+
+from simulator.devices import VirtualAC, VirtualFleet
+from simulator.mqtt import MqttBroker
+from simulator.rest import build_app, patch_constants, restore_constants
+from simulator.server import MirAIeSimulator
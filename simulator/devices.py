@@ -0,0 +1,202 @@
+"""Virtual air conditioners.
+
+Each `VirtualAC` keeps a status payload shaped like `fixtures/status.jsonc`,
+applies control payloads like those in `fixtures/control/` and answers
+with a status message echoing the command `sid` and `lcmd`.
+"""
+
+import asyncio
+import json
+import time
+from typing import Callable
+
+from miraie_ac.logger import LOGGER
+
+
+# Control keys in the order they are reported as `lcmd`
+CONTROL_KEYS = ("ps", "actmp", "acmd", "acfs", "acvs", "achs", "acdc", "acpm", "acem", "acec", "cnv")
+
+PRESET_KEYS = ("acpm", "acem", "acec")
+ECO_TEMPERATURE = "26.0"
+
+MODEL_NUMBER = "102184"
+FIRMWARE_VERSION = "1.75"
+
+
+def initial_status(index: int) -> dict:
+    return {
+        "ty": "AC",
+        "achs": 0,
+        "acngs": "off",
+        "acec": "off",
+        "acfc": "off",
+        "acdl": 0,
+        "acms": "off",
+        "acgm": 0,
+        "acmss": 0,
+        "acpms": 0,
+        "acng": "off",
+        "mo": MODEL_NUMBER,
+        "V": FIRMWARE_VERSION,
+        "actm": [-1, -1],
+        "acpm": "off",
+        "acem": "off",
+        "acmd": "cool",
+        "acdc": "on",
+        "acvs": 1,
+        "acsp": "none",
+        "actmp": "24.0",
+        "acfs": "auto",
+        "rmtmp": f"{26 + index % 5}.5",
+        "ts": str(int(time.time())),
+        "ps": "off",
+        "cnv": 0,
+        "sid": "0",
+        "cnt": "an",
+        "lcmd": "ps",
+        "rssi": -54,
+    }
+
+
+class VirtualAC:
+    def __init__(self, device_id: str, topic: str, index: int = 0):
+        self.id = device_id
+        self.name = f"AC {index}"
+        self.topic = topic
+        self.control_topic = topic + "/control"
+        self.status_topic = topic + "/status"
+        self.connection_status_topic = topic + "/connectionStatus"
+        self.status = initial_status(index)
+        self.online = True
+        self.connected_at = int(time.time() * 1000)
+        self.commands = 0
+
+    def apply(self, command: dict) -> bool:
+        """Apply a control payload, returns False if it contains no known key."""
+        keys = [key for key in CONTROL_KEYS if key in command]
+        if not keys:
+            return False
+
+        for key in keys:
+            value = command[key]
+            if key == "actmp":
+                value = f"{float(value):.1f}"
+            elif key in ("acvs", "achs", "cnv"):
+                value = int(value)
+            self.status[key] = value
+
+        if command.get("acem") == "on" and "actmp" not in command:
+            # The app also sets 26 degrees when turning on eco mode
+            self.status["actmp"] = ECO_TEMPERATURE
+
+        self.status["lcmd"] = keys[0]
+        self.status["sid"] = str(command.get("sid", "0"))
+        self.status["cnt"] = command.get("cnt", "an")
+        self.status["ts"] = str(int(time.time()))
+        self.commands += 1
+        return True
+
+    def rest_status(self) -> dict:
+        status = dict(self.status)
+        status["onlineStatus"] = "true" if self.online else "false"
+        return status
+
+    def connection_status(self) -> dict:
+        now = int(time.time() * 1000)
+        return {
+            "deviceId": self.id,
+            "connectedTime": self.connected_at,
+            "updatedTime": now,
+            "nextUpdate": now,
+            "onlineStatus": "true" if self.online else "false",
+        }
+
+    def details(self) -> dict:
+        return {
+            "deviceId": self.id,
+            "modelName": "CS-XU18XKYF",
+            "macAddress": "00:00:00:00:00:00",
+            "category": "AC",
+            "brand": "Panasonic",
+            "firmwareVersion": FIRMWARE_VERSION,
+            "serialNumber": self.id,
+            "modelNumber": MODEL_NUMBER,
+            "productSerialNumber": self.id,
+        }
+
+
+class VirtualFleet:
+    """`count` virtual ACs in one home, answering control messages over MQTT."""
+
+    response_delay = 0  # In seconds between a command and its status message
+
+    def __init__(
+        self,
+        count: int,
+        user_id: str = "user",
+        home_id: str = "home",
+        response_delay: float = None,
+    ):
+        self.user_id = user_id
+        self.home_id = home_id
+        if response_delay is not None:
+            self.response_delay = response_delay
+        self.devices = [
+            VirtualAC(f"device-{i:05d}", f"{user_id}/{home_id}/device-{i:05d}", i) for i in range(count)
+        ]
+        self.by_id = {device.id: device for device in self.devices}
+        self._by_control_topic = {device.control_topic: device for device in self.devices}
+        # Called with (topic, payload bytes) to publish a message
+        self.publish: Callable[[str, bytes], None] = None
+
+    def __len__(self):
+        return len(self.devices)
+
+    def home(self) -> dict:
+        """Response of the homes endpoint for this fleet."""
+        return {
+            "homeId": self.home_id,
+            "spaces": [
+                {
+                    "spaceId": "space",
+                    "spaceName": "Home",
+                    "devices": [
+                        {"deviceId": device.id, "deviceName": device.name, "topic": [device.topic]}
+                        for device in self.devices
+                    ],
+                }
+            ],
+        }
+
+    def handle_message(self, topic: str, payload: bytes):
+        device = self._by_control_topic.get(topic)
+        if device is None:
+            return
+        try:
+            command = json.loads(payload)
+        except ValueError:
+            LOGGER.warning(f"Ignoring invalid control payload on {topic}")
+            return
+        if not device.apply(command) or not device.online:
+            return
+
+        if self.response_delay > 0:
+            asyncio.get_running_loop().call_later(self.response_delay, self.send_status, device)
+        else:
+            self.send_status(device)
+
+    def send_status(self, device: VirtualAC):
+        self.publish(device.status_topic, json.dumps(device.status).encode("utf-8"))
+
+    def send_connection_status(self, device: VirtualAC):
+        self.publish(device.connection_status_topic, json.dumps(device.connection_status()).encode("utf-8"))
+
+    def set_online(self, device: VirtualAC, online: bool):
+        device.online = online
+        self.send_connection_status(device)
+
+    def tick(self, device: VirtualAC, step: int = 0):
+        """Drift the room temperature and publish a status update."""
+        device.status["rmtmp"] = f"{24 + step % 8}.5"
+        device.status["ts"] = str(int(time.time()))
+        self.send_status(device)
@@ -0,0 +1,301 @@
+"""Minimal in-process MQTT 3.1.1 broker.
+
+Supports what `MirAIeBroker` (through aiomqtt) uses: CONNECT, SUBSCRIBE and
+UNSUBSCRIBE with `+`/`#` wildcards, PUBLISH at QoS 0, 1 and 2 (delivered
+to subscribers at QoS 0), PINGREQ and DISCONNECT. No retained messages,
+persistent sessions or wills.
+"""
+
+import asyncio
+import struct
+from typing import Callable, Optional
+
+from miraie_ac.logger import LOGGER
+
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+# CONNACK return codes
+ACCEPTED = 0
+NOT_AUTHORIZED = 5
+# SUBACK return code
+SUBSCRIBE_FAILURE = 0x80
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type: int, body: bytes = b"", flags: int = 0) -> bytes:
+    return bytes((packet_type << 4 | flags,)) + encode_length(len(body)) + body
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    return packet(PUBLISH, encode_string(topic) + payload)
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(levels):
+            return False
+        if level != "+" and level != levels[index]:
+            return False
+    return len(filter_levels) == len(levels)
+
+
+class MqttSession:
+    """A connected client."""
+
+    def __init__(self, broker: "MqttBroker", reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id: str = None
+        self.username: str = None
+        self.subscriptions: set[str] = set()
+
+    def send(self, data: bytes):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def _read_packet(self) -> tuple[int, int, bytes]:
+        header = (await self.reader.readexactly(1))[0]
+        length = 0
+        multiplier = 1
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b""
+        return header >> 4, header & 0x0F, body
+
+    async def run(self):
+        try:
+            packet_type, _, body = await self._read_packet()
+            if packet_type != CONNECT or not self._handle_connect(body):
+                return
+
+            while True:
+                packet_type, flags, body = await self._read_packet()
+                if packet_type == DISCONNECT:
+                    return
+                self._handle(packet_type, flags, body)
+                if self.writer.transport.get_write_buffer_size() > self.broker.high_water_mark:
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker._remove_session(self)
+            self.writer.close()
+
+    def _handle_connect(self, body: bytes) -> bool:
+        offset = 2 + struct.unpack_from("!H", body)[0]  # Protocol name
+        offset += 1  # Protocol level
+        connect_flags = body[offset]
+        offset += 3  # Flags and keep alive
+
+        def read_field():
+            nonlocal offset
+            size = struct.unpack_from("!H", body, offset)[0]
+            value = body[offset + 2:offset + 2 + size]
+            offset += 2 + size
+            return value
+
+        self.client_id = read_field().decode("utf-8")
+        if connect_flags & 0x04:  # Will topic and message
+            read_field()
+            read_field()
+        username = read_field().decode("utf-8") if connect_flags & 0x80 else None
+        password = read_field().decode("utf-8") if connect_flags & 0x40 else None
+
+        authenticate = self.broker.authenticate
+        if authenticate is not None and not authenticate(username, password):
+            self.send(packet(CONNACK, bytes((0, NOT_AUTHORIZED))))
+            return False
+
+        self.username = username
+        self.broker.connects += 1
+        self.send(packet(CONNACK, bytes((0, ACCEPTED))))
+        return True
+
+    def _handle(self, packet_type: int, flags: int, body: bytes):
+        if packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            size = struct.unpack_from("!H", body)[0]
+            topic = body[2:2 + size].decode("utf-8")
+            offset = 2 + size
+            if qos:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                self.send(packet(PUBACK if qos == 1 else PUBREC, packet_id))
+            self.broker.publish(topic, body[offset:], source=self)
+        elif packet_type == PUBREL:
+            self.send(packet(PUBCOMP, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            granted = bytearray()
+            offset = 2
+            while offset < len(body):
+                size = struct.unpack_from("!H", body, offset)[0]
+                topic_filter = body[offset + 2:offset + 2 + size].decode("utf-8")
+                qos = body[offset + 2 + size]
+                offset += 3 + size
+                if "+" in topic_filter or "#" in topic_filter:
+                    if self.broker.wildcards == "disconnect":
+                        self.writer.close()
+                        return
+                    if self.broker.wildcards == "refuse":
+                        granted.append(SUBSCRIBE_FAILURE)
+                        continue
+                self.broker._subscribe(self, topic_filter)
+                granted.append(min(qos, 1))
+            self.send(packet(SUBACK, body[:2] + bytes(granted)))
+        elif packet_type == UNSUBSCRIBE:
+            offset = 2
+            while offset < len(body):
+                size = struct.unpack_from("!H", body, offset)[0]
+                self.broker._unsubscribe(self, body[offset + 2:offset + 2 + size].decode("utf-8"))
+                offset += 2 + size
+            self.send(packet(UNSUBACK, body[:2]))
+        elif packet_type == PINGREQ:
+            self.send(packet(PINGRESP))
+        elif packet_type != PUBACK:
+            LOGGER.debug(f"Ignoring MQTT packet type {packet_type}")
+
+
+class MqttBroker:
+    host = "127.0.0.1"
+    high_water_mark = 1 << 20  # In bytes of unsent data per client before waiting
+    # Wildcard subscriptions: "allow", "refuse" (failure in SUBACK) or "disconnect"
+    wildcards = "allow"
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = 0,
+        authenticate: Callable[[Optional[str], Optional[str]], bool] = None,
+    ):
+        if host is not None:
+            self.host = host
+        self.port = port
+        self.authenticate = authenticate
+        # Messages published by clients, called with (topic, payload)
+        self.listeners: list[Callable[[str, bytes], None]] = []
+        self.sessions: set[MqttSession] = set()
+        self.connects = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self._exact: dict[str, set[MqttSession]] = {}
+        self._wildcards: dict[str, set[MqttSession]] = {}
+        self._server: asyncio.AbstractServer = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._accept, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    def disconnect_all(self):
+        """Drop every client connection, e.g. to exercise reconnects."""
+        for session in list(self.sessions):
+            session.writer.close()
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = MqttSession(self, reader, writer)
+        self.sessions.add(session)
+        await session.run()
+
+    def _remove_session(self, session: MqttSession):
+        self.sessions.discard(session)
+        for topic_filter in session.subscriptions:
+            self._discard(topic_filter, session)
+
+    def _subscribe(self, session: MqttSession, topic_filter: str):
+        index = self._wildcards if "+" in topic_filter or "#" in topic_filter else self._exact
+        index.setdefault(topic_filter, set()).add(session)
+        session.subscriptions.add(topic_filter)
+
+    def _unsubscribe(self, session: MqttSession, topic_filter: str):
+        session.subscriptions.discard(topic_filter)
+        self._discard(topic_filter, session)
+
+    def _discard(self, topic_filter: str, session: MqttSession):
+        for index in (self._exact, self._wildcards):
+            sessions = index.get(topic_filter)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del index[topic_filter]
+
+    @property
+    def subscription_count(self) -> int:
+        return sum(len(session.subscriptions) for session in self.sessions)
+
+    def subscribers(self, topic: str) -> set[MqttSession]:
+        sessions = set(self._exact.get(topic, ()))
+        for topic_filter, subscribed in self._wildcards.items():
+            if topic_matches(topic_filter, topic):
+                sessions.update(subscribed)
+        return sessions
+
+    def publish(self, topic: str, payload: bytes, source: MqttSession = None):
+        """Deliver a message to every subscribed client and, for client messages, to the listeners."""
+        if source is not None:
+            self.messages_in += 1
+            for listener in self.listeners:
+                listener(topic, payload)
+
+        sessions = self.subscribers(topic)
+        if not sessions:
+            return
+        data = publish_packet(topic, payload)
+        for session in sessions:
+            session.send(data)
+        self.messages_out += len(sessions)
+
+    async def drain(self):
+        """Wait until the data queued for every client has been flushed."""
+        for session in list(self.sessions):
+            if not session.writer.is_closing():
+                try:
+                    await session.writer.drain()
+                except ConnectionError:
+                    pass
@@ -0,0 +1,130 @@
+"""aiohttp fake of the MirAIe REST endpoints in `miraie_ac.constants`.
+
+All endpoints are served from one app under their real paths, so
+`patch_constants` only has to swap the scheme and host.
+"""
+
+import asyncio
+import itertools
+import time
+import zlib
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from miraie_ac import constants
+from miraie_ac.energy import period_keys
+from miraie_ac.enums import ConsumptionPeriodType
+
+from .devices import VirtualFleet
+
+
+URL_CONSTANTS = ("loginUrl", "homesUrl", "statusUrl", "deviceDetailsUrl", "energyConsumptionUrl")
+
+FLEET_KEY = web.AppKey("fleet", VirtualFleet)
+STATE_KEY = web.AppKey("state", dict)
+
+
+def patch_constants(base_url: str) -> dict[str, str]:
+    """Point the REST URLs in `miraie_ac.constants` at `base_url`, returns the previous values."""
+    previous = {}
+    for name in URL_CONSTANTS:
+        url = getattr(constants, name)
+        previous[name] = url
+        parts = urlsplit(url)
+        setattr(constants, name, base_url + url[len(f"{parts.scheme}://{parts.netloc}"):])
+    return previous
+
+
+def restore_constants(previous: dict[str, str]):
+    for name, url in previous.items():
+        setattr(constants, name, url)
+
+
+@web.middleware
+async def _simulate(request: web.Request, handler):
+    state = request.app[STATE_KEY]
+    state["requests"] += 1
+    if state["latency"] > 0:
+        await asyncio.sleep(state["latency"])
+
+    if request.match_info.route.name != "login":
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        expires_at = state["tokens"].get(token)
+        if expires_at is None or expires_at < time.time():
+            return web.json_response({"message": "Unauthorized"}, status=401)
+    return await handler(request)
+
+
+async def _login(request: web.Request) -> web.Response:
+    state = request.app[STATE_KEY]
+    token = f"token-{next(state['token_ids'])}"
+    state["tokens"][token] = time.time() + state["token_lifetime"]
+    return web.json_response(
+        {
+            "accessToken": token,
+            "refreshToken": f"refresh-{token}",
+            "userId": request.app[FLEET_KEY].user_id,
+            "expiresIn": state["token_lifetime"],
+        }
+    )
+
+
+async def _homes(request: web.Request) -> web.Response:
+    return web.json_response([request.app[FLEET_KEY].home()])
+
+
+async def _details(request: web.Request) -> web.Response:
+    fleet = request.app[FLEET_KEY]
+    ids = request.match_info["ids"].split(",")
+    return web.json_response([fleet.by_id[device_id].details() for device_id in ids if device_id in fleet.by_id])
+
+
+async def _status(request: web.Request) -> web.Response:
+    device = request.app[FLEET_KEY].by_id.get(request.match_info["deviceId"])
+    if device is None:
+        return web.json_response({"message": "Device not found"}, status=404)
+    return web.json_response(device.rest_status())
+
+
+async def _energy(request: web.Request) -> web.Response:
+    device_id = request.match_info["deviceId"]
+    try:
+        period_type = ConsumptionPeriodType(request.query["grain"])
+        keys = period_keys(period_type, request.query["startDate"], request.query["endDate"])
+    except (KeyError, ValueError):
+        return web.json_response({"message": "Invalid period"}, status=400)
+
+    response_key = period_type.response_key()
+    return web.json_response(
+        [
+            # Stable pseudo-random consumption per device and period
+            {response_key: key, "power": zlib.crc32(f"{device_id}{key}".encode()) % 500 / 100}
+            for key in keys
+        ]
+    )
+
+
+def build_app(fleet: VirtualFleet, latency: float = 0, token_lifetime: int = 3600) -> web.Application:
+    """`latency` is added to every request, in seconds. Tokens expire after `token_lifetime` seconds."""
+    app = web.Application(middlewares=[_simulate])
+    app[FLEET_KEY] = fleet
+    app[STATE_KEY] = {
+        "latency": latency,
+        "token_lifetime": token_lifetime,
+        "tokens": {},
+        "token_ids": itertools.count(1),
+        "requests": 0,
+    }
+
+    app.router.add_post("/simplifi/v1/userManagement/login", _login, name="login")
+    app.router.add_get("/simplifi/v1/homeManagement/homes", _homes)
+    app.router.add_get("/simplifi/v1/deviceManagement/devices/deviceId/{ids}", _details)
+    app.router.add_get("/simplifi/v1/deviceManagement/devices/{deviceId}/mobile/status", _status)
+    app.router.add_get("/simplifi/v1/powerConsumption/devices/{deviceId}", _energy)
+    return app
+
+
+def is_valid_token(app: web.Application, token: str) -> bool:
+    expires_at = app[STATE_KEY]["tokens"].get(token)
+    return expires_at is not None and expires_at >= time.time()
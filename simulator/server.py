@@ -0,0 +1,91 @@
+"""Runs the fake REST API, the MQTT broker and a virtual fleet together."""
+
+from aiohttp import web
+
+from miraie_ac import MirAIeBroker
+
+from . import rest
+from .devices import VirtualFleet
+from .mqtt import MqttBroker
+
+
+class MirAIeSimulator:
+    """Local stand-in for `app.miraie.in`, `auth.miraie.in` and `mqtt.miraie.in`.
+
+    ```python
+    async with MirAIeSimulator(device_count=100) as simulator:
+        broker = simulator.configure_broker(MirAIeBroker())
+        async with MirAIeHub() as hub:
+            await hub.init("9999999999", "password", broker)
+    ```
+
+    While running, the REST URLs in `miraie_ac.constants` point at the
+    simulator. The MQTT broker only accepts the home id as username and a
+    token issued by the fake login endpoint as password.
+    """
+
+    host = "127.0.0.1"
+    # Device details are requested for all devices in one URL
+    max_line_size = 1 << 20
+
+    def __init__(
+        self,
+        device_count: int = 10,
+        rest_latency: float = 0,
+        response_delay: float = 0,
+        token_lifetime: int = 3600,
+        http_port: int = 0,
+        mqtt_port: int = 0,
+    ):
+        self.fleet = VirtualFleet(device_count, response_delay=response_delay)
+        self.app = rest.build_app(self.fleet, latency=rest_latency, token_lifetime=token_lifetime)
+        self.mqtt = MqttBroker(self.host, mqtt_port, authenticate=self._authenticate)
+        self.mqtt.listeners.append(self.fleet.handle_message)
+        self.fleet.publish = self.mqtt.publish
+        self.http_port = http_port
+        self._runner: web.AppRunner = None
+        self._previous_constants: dict[str, str] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *excinfo):
+        await self.stop()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.http_port}"
+
+    @property
+    def rest_requests(self) -> int:
+        return self.app[rest.STATE_KEY]["requests"]
+
+    def _authenticate(self, username: str, password: str) -> bool:
+        return username == self.fleet.home_id and rest.is_valid_token(self.app, password)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, max_line_size=self.max_line_size, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.http_port)
+        await site.start()
+        self.http_port = self._runner.addresses[0][1]
+
+        await self.mqtt.start()
+        self._previous_constants = rest.patch_constants(self.base_url)
+
+    async def stop(self):
+        if self._previous_constants is not None:
+            rest.restore_constants(self._previous_constants)
+            self._previous_constants = None
+        await self.mqtt.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def configure_broker(self, broker: MirAIeBroker) -> MirAIeBroker:
+        """Point `broker` at the local MQTT broker."""
+        broker.host = self.host
+        broker.port = self.mqtt.port
+        broker.use_ssl = False
+        return broker
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from miraie_ac.analytics import FleetEnergyMatrix, np
+from miraie_ac.enums import ConsumptionPeriodType
+
+
+USE_NUMPY = [False] + ([True] if np is not None else [])
+
+# 2026-10-01 is a Thursday, weeks start on Sunday 2026-09-27 and 2026-10-04
+CONSUMPTION = {
+    "a": {"01102026": 1.0, "02102026": 2.0},
+    "b": {"05102026": 4.0},
+}
+
+
+def value(matrix: FleetEnergyMatrix, row: int, column: int) -> float:
+    if matrix.use_numpy:
+        return float(matrix.values[row, column])
+    return matrix._row(row)[column]
+
+
+@pytest.mark.parametrize("use_numpy", USE_NUMPY)
+def test_resample_keeps_periods_without_data_missing(use_numpy):
+    matrix = FleetEnergyMatrix.from_consumption(CONSUMPTION, ConsumptionPeriodType.DAILY, use_numpy=use_numpy)
+
+    weekly = matrix.resample(ConsumptionPeriodType.WEEKLY)
+
+    assert len(weekly.periods) == 2
+    assert value(weekly, 0, 0) == 3.0
+    assert math.isnan(value(weekly, 0, 1))
+    assert math.isnan(value(weekly, 1, 0))
+    assert value(weekly, 1, 1) == 4.0
+    assert weekly.device_totals() == {"a": 3.0, "b": 4.0}
+
+
+@pytest.mark.parametrize("use_numpy", USE_NUMPY)
+def test_weekly_to_monthly_counts_a_week_in_the_month_it_starts(use_numpy):
+    daily = FleetEnergyMatrix.from_consumption(CONSUMPTION, ConsumptionPeriodType.DAILY, use_numpy=use_numpy)
+    weekly = daily.resample(ConsumptionPeriodType.WEEKLY)
+
+    monthly = weekly.resample(ConsumptionPeriodType.MONTHLY)
+
+    # The week of 2026-09-27 holds the October days of "a"
+    assert len(monthly.periods) == 2
+    assert monthly.to_dict() == {"a": {monthly.periods[0]: 3.0}, "b": {monthly.periods[1]: 4.0}}
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+from miraie_ac import InitStage, MirAIeBroker, MirAIeHub
+from miraie_ac.enums import FanMode, PowerMode
+from simulator import MirAIeSimulator
+
+
+async def start_hub(simulator: MirAIeSimulator, broker: MirAIeBroker) -> MirAIeHub:
+    simulator.configure_broker(broker)
+    hub = MirAIeHub()
+    await hub.init("9999999999", "password", broker)
+    await hub.wait_for(InitStage.BROKER_SUBSCRIBED, 5)
+    return hub
+
+
+@pytest.mark.parametrize("policy", ["refuse", "disconnect"])
+def test_falls_back_to_per_topic_subscriptions_when_wildcards_fail(policy):
+    async def run():
+        async with MirAIeSimulator(device_count=3) as simulator:
+            simulator.mqtt.wildcards = policy
+            broker = MirAIeBroker()
+            broker.reconnect_interval = 0.01
+            broker.subscribe_timeout = 0.5
+            async with await start_hub(simulator, broker):
+                assert not broker.use_wildcards
+                assert broker.metrics.subscriptions == 6
+                assert simulator.mqtt.subscription_count == 6
+
+    asyncio.run(run())
+
+
+def test_encoded_payload_appends_the_sid_to_the_cached_head():
+    broker = MirAIeBroker()
+
+    first = json.loads(broker.encode_payload(broker.build_fan_mode_payload, FanMode.HIGH, "1"))
+    second = json.loads(broker.encode_payload(broker.build_fan_mode_payload, FanMode.HIGH, "2"))
+
+    assert first == dict(broker.build_fan_mode_payload(FanMode.HIGH), sid="1")
+    assert second == dict(first, sid="2")
+    assert len(broker._payload_cache) == 1
+
+
+def test_non_enum_values_are_not_cached():
+    broker = MirAIeBroker()
+
+    payload = json.loads(broker.encode_payload(broker.build_temperature_payload, 23.5, "9"))
+
+    assert payload == dict(broker.build_temperature_payload(23.5), sid="9")
+    assert not broker._payload_cache
+
+
+async def published_commands(simulator: MirAIeSimulator, send) -> list[dict]:
+    published = []
+    simulator.mqtt.listeners.append(lambda topic, payload: published.append(json.loads(payload)))
+    await send()
+    await simulator.mqtt.drain()
+    return published
+
+
+def test_commands_within_the_window_are_published_once():
+    async def run():
+        async with MirAIeSimulator(device_count=1) as simulator:
+            broker = MirAIeBroker(coalesce_window=0.05)
+            async with await start_hub(simulator, broker) as hub:
+                device = hub.home.devices[0]
+                published = await published_commands(
+                    simulator,
+                    lambda: asyncio.gather(
+                        device.set_power(PowerMode.ON),
+                        device.set_temperature(22),
+                        device.set_fan_mode(FanMode.HIGH),
+                        device.set_fan_mode(FanMode.LOW),
+                    ),
+                )
+
+        assert len(published) == 1
+        payload = published[0]
+        assert (payload["ps"], payload["actmp"], payload["acfs"]) == ("on", "22", "low")
+        assert broker.metrics.publishes == 1
+
+    asyncio.run(run())
+
+
+def test_commands_without_a_window_are_published_with_unique_sids():
+    async def run():
+        async with MirAIeSimulator(device_count=1) as simulator:
+            broker = MirAIeBroker()
+            async with await start_hub(simulator, broker) as hub:
+                device = hub.home.devices[0]
+
+                async def send():
+                    await device.set_fan_mode(FanMode.HIGH)
+                    await device.set_fan_mode(FanMode.HIGH)
+
+                published = await published_commands(simulator, send)
+
+        assert len(published) == 2
+        assert published[0]["sid"] != published[1]["sid"]
+        assert dict(published[0], sid=None) == dict(published[1], sid=None)
+
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+from miraie_ac.broker import MirAIeBroker
+from miraie_ac.decoder import decode_fields
+from miraie_ac.enums import ConvertiMode, PresetMode
+
+
+def test_converti_payload_does_not_decode_a_preset():
+    payload = MirAIeBroker().build_payload("converti_mode", ConvertiMode.C90)
+
+    fields = decode_fields(payload)
+
+    assert fields == {"converti_mode": ConvertiMode.C90}
+
+
+def test_preset_payload_decodes_the_preset():
+    payload = MirAIeBroker().build_payload("preset_mode", PresetMode.CLEAN)
+
+    assert decode_fields(payload)["preset_mode"] == PresetMode.CLEAN
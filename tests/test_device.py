@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from miraie_ac import MirAIeBroker
+from miraie_ac.device import Device, DeviceStatus
+from miraie_ac.enums import FanMode
+from simulator.devices import initial_status
+
+
+def make_device(timeout: float = 0.05) -> tuple[Device, list]:
+    broker = MirAIeBroker(optimistic=True)
+    broker.optimistic_timeout = timeout
+    sent = []
+
+    async def set_fan_mode(topic, mode):
+        sent.append((topic, mode))
+
+    broker.set_fan_mode = set_fan_mode
+    device = Device(
+        id="device",
+        name="device",
+        friendly_name="Device",
+        control_topic="home/device/control",
+        status_topic="home/device/status",
+        connection_status_topic="home/device/connectionStatus",
+        broker=broker,
+    )
+    device.status_handler(initial_status(0))
+    return device, sent
+
+
+def fan_status(fan_mode: str) -> dict:
+    return dict(initial_status(0), acfs=fan_mode)
+
+
+def record_changes(device: Device) -> list:
+    changes = []
+    device.register_field_callback(changes.append)
+    return changes
+
+
+def test_command_applies_locally_before_the_device_confirms():
+    async def run():
+        device, sent = make_device()
+        changes = record_changes(device)
+
+        await device.set_fan_mode(FanMode.HIGH)
+
+        assert sent == [("home/device/control", FanMode.HIGH)]
+        assert device.status.fan_mode == FanMode.HIGH
+        assert device.pending_fields == {"fan_mode"}
+        assert changes == [{"fan_mode"}]
+
+    asyncio.run(run())
+
+
+def test_confirming_status_clears_the_pending_field():
+    async def run():
+        device, _ = make_device()
+        rollbacks = []
+        device.register_rollback_callback(rollbacks.append)
+        await device.set_fan_mode(FanMode.HIGH)
+        changes = record_changes(device)
+
+        device.status_handler(fan_status("high"))
+        await asyncio.sleep(0.1)
+
+        assert device.pending_fields == frozenset()
+        assert device.status.fan_mode == FanMode.HIGH
+        assert changes == [{"fan_mode"}]
+        assert rollbacks == []
+
+    asyncio.run(run())
+
+
+def test_unconfirmed_field_rolls_back_after_the_timeout():
+    async def run():
+        device, _ = make_device()
+        rollbacks = []
+        device.register_rollback_callback(rollbacks.append)
+        await device.set_fan_mode(FanMode.HIGH)
+
+        await asyncio.sleep(0.1)
+
+        assert device.pending_fields == frozenset()
+        assert device.status.fan_mode == FanMode.AUTO
+        assert rollbacks == [{"fan_mode"}]
+
+    asyncio.run(run())
+
+
+def test_status_sent_before_the_command_keeps_it_pending_then_reverts():
+    async def run():
+        device, _ = make_device()
+        rollbacks = []
+        device.register_rollback_callback(rollbacks.append)
+        await device.set_fan_mode(FanMode.HIGH)
+
+        # Reports another value, e.g. a status published before the command arrived
+        device.status_handler(fan_status("low"))
+        assert device.status.fan_mode == FanMode.HIGH
+        assert device.pending_fields == {"fan_mode"}
+
+        await asyncio.sleep(0.1)
+        # Rolled back to the value the device reported last
+        assert device.status.fan_mode == FanMode.LOW
+        assert rollbacks == [{"fan_mode"}]
+
+    asyncio.run(run())
+
+
+def test_failed_send_rolls_back_right_away():
+    async def run():
+        device, _ = make_device(timeout=10)
+
+        async def fail(topic, mode):
+            raise ConnectionError("offline")
+
+        device.broker.set_fan_mode = fail
+        with pytest.raises(ConnectionError):
+            await device.set_fan_mode(FanMode.HIGH)
+
+        assert device.status.fan_mode == FanMode.AUTO
+        assert device.pending_fields == frozenset()
+
+    asyncio.run(run())
+
+
+def test_rest_status_reconciles_pending_fields():
+    async def run():
+        device, _ = make_device(timeout=10)
+        await device.set_fan_mode(FanMode.HIGH)
+        changes = record_changes(device)
+
+        device.apply_status(DeviceStatus.from_payload(fan_status("high"), is_online=True))
+
+        assert device.pending_fields == frozenset()
+        assert changes == [{"fan_mode"}]
+
+    asyncio.run(run())
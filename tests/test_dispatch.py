@@ -0,0 +1,87 @@
+import asyncio
+
+from miraie_ac.dispatch import Dispatcher
+
+
+def test_mailbox_keeps_only_the_latest_payload_under_load():
+    async def run():
+        dispatcher = Dispatcher(workers=1)
+        handled = []
+        for i in range(100):
+            dispatcher.put("home/device/status", handled.append, {"i": i})
+        await dispatcher.join()
+        return dispatcher, handled
+
+    dispatcher, handled = asyncio.run(run())
+    assert handled == [{"i": 99}]
+    assert dispatcher.metrics.dispatch_dropped == 99
+
+
+def test_messages_of_a_topic_are_handled_one_at_a_time_in_order():
+    async def run():
+        dispatcher = Dispatcher(workers=4)
+        handled = []
+        running = 0
+        overlapped = False
+
+        async def handle(payload):
+            nonlocal running, overlapped
+            running += 1
+            overlapped |= running > 1
+            await asyncio.sleep(0.01)
+            handled.append(payload["i"])
+            running -= 1
+
+        dispatcher.put("home/device/status", handle, {"i": 0})
+        await asyncio.sleep(0)
+        # Arrive while the first is being handled, only the latest is kept
+        dispatcher.put("home/device/status", handle, {"i": 1})
+        dispatcher.put("home/device/status", handle, {"i": 2})
+        await dispatcher.join()
+        return handled, overlapped
+
+    handled, overlapped = asyncio.run(run())
+    assert handled == [0, 2]
+    assert not overlapped
+
+
+def test_worker_pool_bounds_concurrent_handlers():
+    async def run():
+        dispatcher = Dispatcher(workers=3)
+        running = 0
+        peak = 0
+
+        async def handle(payload):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.005)
+            running -= 1
+
+        for i in range(20):
+            dispatcher.put(f"home/device-{i}/status", handle, {})
+        await dispatcher.join()
+        return dispatcher, peak
+
+    dispatcher, peak = asyncio.run(run())
+    assert peak == 3
+    assert dispatcher.metrics.dispatch.count == 20
+    assert dispatcher.queue_depth == 0
+
+
+def test_failing_handler_does_not_stop_the_workers():
+    async def run():
+        dispatcher = Dispatcher(workers=1)
+        handled = []
+
+        def fail(payload):
+            raise ValueError("broken callback")
+
+        dispatcher.put("home/a/status", fail, {})
+        dispatcher.put("home/b/status", handled.append, {"ok": True})
+        await dispatcher.join()
+        return dispatcher, handled
+
+    dispatcher, handled = asyncio.run(run())
+    assert handled == [{"ok": True}]
+    assert dispatcher.metrics.dispatch_errors == 1
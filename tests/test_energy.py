@@ -0,0 +1,70 @@
+import asyncio
+import json
+from datetime import date
+from types import SimpleNamespace
+
+from miraie_ac.energy import EnergyClient, period_keys
+from miraie_ac.enums import ConsumptionPeriodType
+
+DAILY = ConsumptionPeriodType.DAILY
+DEVICE = SimpleNamespace(id="device-0")
+
+
+class FakeHub:
+    def __init__(self, data: dict[str, float]):
+        self.data = data
+        self.requests = []
+
+    async def get_energy_consumption(self, device, period_type, from_date, to_date):
+        self.requests.append((from_date, to_date))
+        # Like the API, periods without data are left out of the response
+        keys = period_keys(period_type, from_date, to_date)
+        return {key: self.data[key] for key in keys if key in self.data}
+
+
+def test_finalized_periods_are_served_from_the_cache():
+    hub = FakeHub({"01012020": 1.5, "02012020": 2.5})
+    client = EnergyClient(hub)
+
+    async def run():
+        first = await client.get_consumption(DEVICE, DAILY, "01012020", "02012020")
+        second = await client.get_consumption(DEVICE, DAILY, "01012020", "02012020")
+        assert first == second == {"01012020": 1.5, "02012020": 2.5}
+
+    asyncio.run(run())
+    assert hub.requests == [("01012020", "02012020")]
+
+
+def test_finalized_periods_missing_from_the_response_are_not_refetched(tmp_path):
+    path = str(tmp_path / "energy.json")
+    hub = FakeHub({"01012020": 1.5, "03012020": 3.5})
+    client = EnergyClient(hub, cache_path=path)
+
+    async def run():
+        for _ in range(3):
+            result = await client.get_consumption(DEVICE, DAILY, "01012020", "03012020")
+            assert result == {"01012020": 1.5, "03012020": 3.5}
+
+    asyncio.run(run())
+    assert hub.requests == [("01012020", "03012020")]
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file)["device-0"][DAILY.value]["02012020"] is None
+
+    # A client loading the cache from disk does not ask for the empty day either
+    reloaded = EnergyClient(hub, cache_path=path)
+    result = asyncio.run(reloaded.get_consumption(DEVICE, DAILY, "02012020"))
+    assert result == {}
+    assert len(hub.requests) == 1
+
+
+def test_open_periods_are_always_fetched():
+    hub = FakeHub({})
+    client = EnergyClient(hub)
+    key = date.today().strftime("%d%m%Y")
+
+    async def run():
+        await client.get_consumption(DEVICE, DAILY, key)
+        await client.get_consumption(DEVICE, DAILY, key)
+
+    asyncio.run(run())
+    assert hub.requests == [(key, key), (key, key)]
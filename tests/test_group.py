@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from miraie_ac import MirAIeBroker
+from miraie_ac.device import Device
+from miraie_ac.group import GroupCommand, select_devices
+from simulator.devices import initial_status
+
+
+def make_devices(count: int, send) -> list[Device]:
+    broker = MirAIeBroker()
+    broker.set_temperature = send
+    devices = []
+    for i in range(count):
+        device = Device(
+            id=f"device-{i}",
+            name=f"device-{i}",
+            friendly_name=f"Device {i}",
+            control_topic=f"home/device-{i}/control",
+            status_topic=f"home/device-{i}/status",
+            connection_status_topic=f"home/device-{i}/connectionStatus",
+            broker=broker,
+        )
+        device.status_handler(initial_status(i))
+        devices.append(device)
+    return devices
+
+
+def test_max_in_flight_caps_concurrent_publishes():
+    running = 0
+    peak = 0
+
+    async def send(topic, temperature):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.005)
+        running -= 1
+
+    devices = make_devices(20, send)
+    result = asyncio.run(GroupCommand(max_in_flight=3).run(devices, "temperature", 22))
+
+    assert peak == 3
+    assert result.all_ok
+    assert len(result) == 20
+
+
+def test_rate_spaces_out_publishes():
+    sent_at = []
+
+    async def send(topic, temperature):
+        sent_at.append(time.monotonic())
+
+    devices = make_devices(5, send)
+    asyncio.run(GroupCommand(rate=50).run(devices, "temperature", 22))
+
+    gaps = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert min(gaps) >= 0.018
+
+
+def test_each_device_gets_its_own_outcome():
+    async def send(topic, temperature):
+        if topic.startswith("home/device-1/"):
+            raise ConnectionError("offline")
+
+    devices = make_devices(3, send)
+    result = asyncio.run(GroupCommand().run(devices, "temperature", 22))
+
+    assert [outcome.device.id for outcome in result.failed] == ["device-1"]
+    assert isinstance(result["device-1"].error, ConnectionError)
+    assert len(result.succeeded) == 2
+
+
+def test_confirm_waits_for_the_reported_value():
+    devices = []
+
+    async def send(topic, temperature):
+        device = next(device for device in devices if device.control_topic == topic)
+        if device.id == "device-0":
+            # Only the first device applies the command
+            loop = asyncio.get_running_loop()
+            status = dict(initial_status(0), actmp=f"{temperature:.1f}")
+            loop.call_later(0.01, device.status_handler, status)
+
+    devices.extend(make_devices(2, send))
+    result = asyncio.run(GroupCommand(confirm_timeout=0.1).run(devices, "temperature", 22, confirm=True))
+
+    assert result["device-0"].confirmed is True
+    assert result["device-1"].confirmed is False
+    assert result["device-1"].ok
+
+
+def test_select_devices_combines_filters():
+    devices = make_devices(4, None)
+
+    selected = select_devices(
+        devices, names=["device-1", "Device 2", "device-3"], predicate=lambda device: device.id != "device-3"
+    )
+
+    assert [device.id for device in selected] == ["device-1", "device-2"]
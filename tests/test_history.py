@@ -0,0 +1,80 @@
+from miraie_ac.device import DeviceStatus
+from miraie_ac.enums import (
+    ConvertiMode,
+    DisplayMode,
+    FanMode,
+    HVACMode,
+    PowerMode,
+    PresetMode,
+    SwingMode,
+)
+from miraie_ac.history import DeviceHistory, TelemetryHistory
+
+
+def make_status(temperature: float = 24.0) -> DeviceStatus:
+    return DeviceStatus(
+        True,
+        temperature,
+        25.0,
+        PowerMode.ON,
+        FanMode.AUTO,
+        SwingMode.AUTO,
+        SwingMode.AUTO,
+        DisplayMode.ON,
+        HVACMode.COOL,
+        PresetMode.NONE,
+        ConvertiMode.OFF,
+    )
+
+
+def test_samples_faster_than_min_interval_keep_one_per_bucket():
+    history = TelemetryHistory(capacity=1440, min_interval=60)
+    # One hour of messages every 30 seconds
+    for i in range(120):
+        history.record("device", make_status(20 + i % 5), {"rssi": -50}, timestamp=i * 30.0)
+
+    assert len(history["device"]) == 60
+    timestamps = [sample["timestamp"] for sample in history.range("device")]
+    # The latest sample of each minute is kept
+    assert timestamps == [i * 60.0 + 30 for i in range(60)]
+
+
+def test_min_interval_zero_keeps_every_sample():
+    history = DeviceHistory(capacity=10)
+    for i in range(5):
+        history.append(float(i), _values())
+    assert len(history) == 5
+
+
+def test_ring_buffer_keeps_latest_samples():
+    history = TelemetryHistory(capacity=3, min_interval=10)
+    for i in range(5):
+        history.record("device", make_status(20 + i), timestamp=i * 10.0)
+
+    samples = history.range("device", fields=["temperature"])
+    assert [sample["timestamp"] for sample in samples] == [20.0, 30.0, 40.0]
+    assert [sample["temperature"] for sample in samples] == [22.0, 23.0, 24.0]
+
+
+def test_downsample_and_snapshot():
+    history = TelemetryHistory(capacity=100, min_interval=0)
+    for i in range(6):
+        history.record("device", make_status(20 + i), timestamp=i * 10.0)
+
+    buckets = history.downsample("device", "temperature", bucket=30)
+    assert [(bucket["min"], bucket["max"], bucket["mean"]) for bucket in buckets] == [
+        (20.0, 22.0, 21.0),
+        (23.0, 25.0, 24.0),
+    ]
+    assert history.snapshot(at=25)["device"]["temperature"] == 22.0
+
+
+def _values() -> dict:
+    return {
+        "temperature": 24.0,
+        "room_temperature": 25.0,
+        "rssi": -50.0,
+        "power_mode": 0,
+        "hvac_mode": 0,
+        "preset_mode": 0,
+    }
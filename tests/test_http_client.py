@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from miraie_ac import MirAIeBroker, MirAIeHub, InitStage
+from miraie_ac.http_client import MirAIeHttpClient
+from simulator import MirAIeSimulator
+from simulator import rest
+
+
+async def serve(handler) -> TestServer:
+    app = web.Application()
+    app.router.add_get("/status", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_retries_5xx_and_429_with_backoff(monkeypatch):
+    # Longest jittered delay, so the backoff is deterministic
+    monkeypatch.setattr("miraie_ac.http_client.random.uniform", lambda low, high: high)
+    statuses = [503, 429, 200]
+    requests = []
+
+    async def handler(request):
+        requests.append(time.monotonic())
+        status = statuses[len(requests) - 1]
+        return web.json_response({}, status=status, headers={"Retry-After": "1"} if status == 429 else None)
+
+    async def run():
+        server = await serve(handler)
+        client = MirAIeHttpClient(backoff_base=0.05, backoff_max=0.1)
+        try:
+            response = await client.request("status", "GET", str(server.make_url("/status")))
+        finally:
+            await client.close()
+            await server.close()
+
+        assert response.status == 200
+        assert client.metrics.request_retries == {"status": 2}
+        # 503: backoff_base * 2**0, 429: Retry-After capped to backoff_max
+        assert requests[1] - requests[0] >= 0.05
+        assert requests[2] - requests[1] >= 0.1
+
+    asyncio.run(run())
+
+
+def test_gives_up_after_max_retries():
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return web.json_response({}, status=500)
+
+    async def run():
+        server = await serve(handler)
+        client = MirAIeHttpClient(max_retries=2, backoff_base=0.001)
+        try:
+            response = await client.request("status", "GET", str(server.make_url("/status")))
+        finally:
+            await client.close()
+            await server.close()
+
+        assert response.status == 500
+        assert len(requests) == 3
+        assert client.metrics.request_errors == {"status": 1}
+
+    asyncio.run(run())
+
+
+def test_401_reauthenticates_once_and_retries():
+    tokens = ["expired", "fresh"]
+    seen = []
+
+    async def handler(request):
+        seen.append(request.headers["Authorization"])
+        return web.json_response({}, status=200 if request.headers["Authorization"] == "fresh" else 401)
+
+    async def run():
+        reauthentications = 0
+
+        async def on_unauthorized():
+            nonlocal reauthentications
+            reauthentications += 1
+            tokens.pop(0)
+
+        server = await serve(handler)
+        client = MirAIeHttpClient(on_unauthorized=on_unauthorized)
+        try:
+            url = str(server.make_url("/status"))
+            response = await client.request("status", "GET", url, headers=lambda: {"Authorization": tokens[0]})
+            assert response.status == 200
+            assert reauthentications == 1
+            assert seen == ["expired", "fresh"]
+
+            # A second 401 is returned instead of re-authenticating again
+            tokens[:] = ["expired", "expired"]
+            seen.clear()
+            response = await client.request("status", "GET", url, headers=lambda: {"Authorization": tokens[0]})
+            assert response.status == 401
+            assert reauthentications == 2
+            assert seen == ["expired", "expired"]
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_one_device_failure_is_recorded_without_failing_the_others():
+    async def run():
+        async with MirAIeSimulator(device_count=3) as simulator:
+            broker = simulator.configure_broker(MirAIeBroker())
+            hub = MirAIeHub()
+            try:
+                await hub.init("9999999999", "password", broker)
+                await hub.wait_for(InitStage.STATUS_LOADED, 5)
+                failing = simulator.fleet.devices[1]
+                del simulator.fleet.by_id[failing.id]
+                # Expired tokens are renewed on the first 401
+                simulator.app[rest.STATE_KEY]["tokens"].clear()
+
+                results = await hub.get_all_device_status()
+            finally:
+                await hub.__aexit__()
+
+        assert len(results) == 3
+        assert list(hub.status_errors) == [failing.id]
+        assert hub.registry.get(failing.id).has_status
+        assert hub.metrics.request_errors == {"status": 1}
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import asyncio
+
+from miraie_ac import InitStage, MirAIeBroker, MirAIeHub
+from simulator import MirAIeSimulator
+
+
+def home_details(*devices):
+    return {
+        "homeId": "home",
+        "spaces": [
+            {
+                "devices": [
+                    {"deviceId": device_id, "deviceName": device_id, "topic": [topic]}
+                    for device_id, topic in devices
+                ]
+            }
+        ],
+    }
+
+
+def test_removed_and_replaced_devices_leave_the_router():
+    async def run():
+        hub = MirAIeHub()
+        broker = MirAIeBroker()
+        hub._broker = broker
+        await hub._process_home_details(home_details(("a", "home/a"), ("b", "home/b")), load_details=False)
+        assert len(broker.router) == 4
+
+        await hub._process_home_details(home_details(("a", "home/a2")), load_details=False)
+
+        assert len(broker.router) == 2
+        assert "home/a/status" not in broker.router
+        assert "home/b/status" not in broker.router
+        assert broker.router.get("home/a2/status") == hub.registry.get("a").status_handler
+        await hub.__aexit__()
+
+    asyncio.run(run())
+
+
+def test_exiting_the_hub_stops_its_background_tasks():
+    async def run():
+        async with MirAIeSimulator(device_count=2) as simulator:
+            broker = simulator.configure_broker(MirAIeBroker())
+            async with MirAIeHub() as hub:
+                await hub.init("9999999999", "password", broker, wait_for_status=False)
+                await hub.wait_for(InitStage.BROKER_SUBSCRIBED, 5)
+                tasks = list(hub.background_tasks)
+                assert tasks
+
+            assert all(task.done() for task in tasks)
+            assert not hub.background_tasks
+            assert not broker.is_ready
+
+    asyncio.run(run())
+
+
+def test_warm_start_restores_devices_from_the_snapshot_then_revalidates(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+
+    async def run():
+        async with MirAIeSimulator(device_count=3) as simulator:
+            async with MirAIeHub() as hub:
+                broker = simulator.configure_broker(MirAIeBroker())
+                await hub.init("9999999999", "password", broker, snapshot_path=path)
+            cold = {device.id: device.status.temperature for device in hub.home.devices}
+
+            removed = simulator.fleet.devices[2].id
+            simulator.fleet.devices.pop(2)
+            del simulator.fleet.by_id[removed]
+            requests = simulator.rest_requests
+
+            async with MirAIeHub() as hub:
+                broker = simulator.configure_broker(MirAIeBroker())
+                await hub.init("9999999999", "password", broker, snapshot_path=path)
+                # Only the login was needed before init returned
+                assert simulator.rest_requests == requests + 1
+                assert {device.id: device.status.temperature for device in hub.home.devices} == cold
+
+                for _ in range(100):
+                    if removed not in hub.registry:
+                        break
+                    await asyncio.sleep(0.01)
+                assert removed not in hub.registry
+                assert len(hub.home.devices) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+from miraie_ac.latency import LatencyTracker
+
+
+def test_status_echoing_the_sid_confirms_the_command():
+    tracker = LatencyTracker()
+    tracker.command_sent("dev", "7", ("temperature",), sent_at=100.0)
+
+    assert tracker.status_received("dev", {"sid": "7", "lcmd": "actmp"}, received_at=100.25)
+    assert tracker.percentiles(device="dev")["p50"] == 0.25
+    assert tracker.pending_count == 0
+
+
+def test_stale_sid_is_not_matched():
+    tracker = LatencyTracker()
+    tracker.command_sent("dev", "5", ("temperature",), sent_at=90.0)
+    tracker.status_received("dev", {"sid": "5", "lcmd": "actmp"}, received_at=90.5)
+    tracker.command_sent("dev", "7", ("temperature",), sent_at=100.0)
+
+    # A periodic status still carrying the sid of the previous command
+    assert not tracker.status_received("dev", {"sid": "5", "lcmd": "actmp"}, received_at=100.01)
+    assert tracker.pending_count == 1
+    assert tracker.by_command["temperature"].count == 1
+
+
+def test_lcmd_fallback_without_a_known_sid():
+    tracker = LatencyTracker()
+    tracker.command_sent("dev", "7", ("temperature",), sent_at=100.0)
+    tracker.command_sent("dev", "8", ("power",), sent_at=100.0)
+
+    assert tracker.status_received("dev", {"lcmd": "ps"}, received_at=100.5)
+    assert tracker.status_received("dev", {"sid": "foreign", "lcmd": "actmp"}, received_at=101.0)
+    assert tracker.by_command["power"].count == 1
+    assert tracker.by_command["temperature"].count == 1
+
+
+def test_unconfirmed_commands_time_out():
+    tracker = LatencyTracker(timeout=5)
+    tracker.command_sent("dev", "7", ("temperature",), sent_at=100.0)
+
+    tracker.expire(106.0)
+
+    assert tracker.pending_count == 0
+    assert tracker.timeouts_by_command == {"temperature": 1}
+
+
+def test_earlier_sid_from_another_session_is_not_matched():
+    tracker = LatencyTracker()
+    tracker.command_sent("dev", "7", ("temperature",), sent_at=100.0)
+
+    assert not tracker.status_received("dev", {"sid": "5", "lcmd": "actmp"}, received_at=100.01)
+    assert tracker.pending_count == 1
@@ -0,0 +1,25 @@
+from miraie_ac.metrics import BrokerMetrics
+
+
+def test_failing_to_connect_at_startup_is_not_a_reconnect():
+    metrics = BrokerMetrics()
+    metrics.disconnected()
+    metrics.disconnected()
+    assert metrics.reconnects == 0
+    assert not metrics.is_connected
+
+    metrics.connected()
+    assert metrics.snapshot()["connects"] == 1
+    assert metrics.snapshot()["reconnects"] == 0
+
+
+def test_losing_an_established_connection_is_a_reconnect():
+    metrics = BrokerMetrics()
+    metrics.connected()
+    metrics.disconnected()
+    assert metrics.reconnects == 1
+    assert not metrics.is_connected
+
+    metrics.connected()
+    assert metrics.is_connected
+    assert metrics.snapshot()["connects"] == 2
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from miraie_ac.outbox import CommandDroppedError, CommandOutbox
+
+
+TOPIC = "user/1/home/1/device/1/control"
+
+
+def test_queued_command_fails_at_max_age_without_reconnect():
+    async def run():
+        outbox = CommandOutbox(max_age=0.05)
+        waiter = asyncio.get_running_loop().create_future()
+        outbox.put(TOPIC, {"ki": 1, "cnt": "an", "sid": "1", "ps": "on"}, ("power",), [waiter])
+
+        with pytest.raises(CommandDroppedError):
+            await asyncio.wait_for(waiter, 1)
+        assert len(outbox) == 0
+        assert outbox.dropped == 1
+
+    asyncio.run(run())
+
+
+def test_sent_command_does_not_expire():
+    async def run():
+        outbox = CommandOutbox(max_age=0.05)
+        waiter = asyncio.get_running_loop().create_future()
+        outbox.put(TOPIC, {"ki": 1, "cnt": "an", "sid": "1", "ps": "on"}, ("power",), [waiter])
+
+        command = outbox.pop()
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        assert outbox.dropped == 0
+        command.resolve()
+        await waiter
+
+    asyncio.run(run())
+
+
+def test_superseded_command_completes_with_the_newer_one():
+    async def run():
+        loop = asyncio.get_running_loop()
+        outbox = CommandOutbox(max_age=0.05)
+        first, second = loop.create_future(), loop.create_future()
+        outbox.put(TOPIC, {"ki": 1, "cnt": "an", "sid": "1", "ps": "on"}, ("power",), [first])
+        outbox.put(TOPIC, {"ki": 1, "cnt": "an", "sid": "2", "ps": "off"}, ("power",), [second])
+        assert len(outbox) == 1
+
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        assert all(isinstance(result, CommandDroppedError) for result in results)
+        assert outbox.dropped == 1
+
+    asyncio.run(run())
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+from miraie_ac import MirAIeBroker
+from miraie_ac.device import Device
+from miraie_ac.polling import StatusPoller
+from simulator.devices import initial_status
+
+
+class FakeBroker:
+    def __init__(self):
+        self.streaming = True
+        self.last_message: dict[str, float] = {}
+        self.delivered = []
+
+    def is_streaming(self, topic: str) -> bool:
+        return self.streaming
+
+    def last_message_at(self, topic: str) -> float:
+        return self.last_message.get(topic)
+
+    def last_command_at(self, topic: str) -> float:
+        return None
+
+    def deliver(self, topic: str, payload: dict):
+        self.delivered.append(topic)
+
+
+class FakeHub:
+    def __init__(self, count: int):
+        self.broker = FakeBroker()
+        devices = [make_device(i) for i in range(count)]
+        self.home = SimpleNamespace(devices=devices)
+        self.registry = {device.id: device for device in devices}
+        self.requests = []
+
+    async def _get_device_status(self, device_id: str) -> dict:
+        self.requests.append(device_id)
+        return dict(initial_status(0), onlineStatus="true")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_device(index: int) -> Device:
+    return Device(
+        id=f"device-{index}",
+        name=f"device-{index}",
+        friendly_name=f"Device {index}",
+        control_topic=f"home/device-{index}/control",
+        status_topic=f"home/device-{index}/status",
+        connection_status_topic=f"home/device-{index}/connectionStatus",
+        broker=MirAIeBroker(),
+    )
+
+
+def make_poller(count: int = 1, **options) -> tuple[StatusPoller, FakeHub, Clock]:
+    hub = FakeHub(count)
+    clock = Clock()
+    return StatusPoller(hub, clock=clock, **options), hub, clock
+
+
+def test_polls_only_after_the_stream_goes_quiet_and_stops_when_it_resumes():
+    async def run():
+        poller, hub, clock = make_poller(stale_after=60)
+        topic = "home/device-0/status"
+        hub.broker.last_message[topic] = clock.now
+
+        clock.now += 30
+        await poller.poll_due()
+        assert not poller.is_polling
+        assert hub.requests == []
+
+        clock.now += 60
+        await poller.poll_due()
+        assert poller.is_polling
+        assert hub.requests == ["device-0"]
+        assert topic in hub.broker.delivered
+
+        hub.broker.last_message[topic] = clock.now
+        await poller.poll_due()
+        assert not poller.is_polling
+        assert hub.requests == ["device-0"]
+
+    asyncio.run(run())
+
+
+def test_polls_every_device_while_disconnected():
+    async def run():
+        poller, hub, clock = make_poller(3, stale_after=None)
+
+        await poller.poll_due()
+        assert hub.requests == []
+
+        hub.broker.streaming = False
+        await poller.poll_due()
+        assert sorted(hub.requests) == ["device-0", "device-1", "device-2"]
+
+    asyncio.run(run())
+
+
+def test_requests_stay_within_the_budget():
+    async def run():
+        poller, hub, clock = make_poller(10, budget=3, stale_after=None)
+        hub.broker.streaming = False
+
+        await poller.poll_due()
+        assert len(hub.requests) == 3
+
+        # Three requests per minute, one more token after 20 seconds
+        clock.now += 20
+        await poller.poll_due()
+        assert len(hub.requests) == 4
+        assert poller.polls == 4
+
+    asyncio.run(run())
+
+
+def test_idle_devices_back_off_to_max_interval():
+    async def run():
+        poller, hub, clock = make_poller(min_interval=10, max_interval=40, stale_after=None)
+        hub.registry["device-0"].status_handler(initial_status(0))
+        hub.broker.streaming = False
+
+        intervals = []
+        for _ in range(4):
+            await poller.poll_due()
+            polled = poller.polling["device-0"]
+            intervals.append(polled.interval)
+            clock.now = polled.next_poll
+
+        assert intervals == [20, 40, 40, 40]
+
+    asyncio.run(run())
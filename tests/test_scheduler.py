@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, time as dt_time, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from miraie_ac.enums import PowerMode
+from miraie_ac.scheduler import Schedule, Scheduler
+
+
+# Thursday 2026-10-01 12:00 UTC
+NOW = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+class FakeDevice:
+    def __init__(self, device_id: str):
+        self.id = device_id
+        self.sent = []
+
+    async def set_power(self, power):
+        self.sent.append(("power", power))
+
+    async def set_temperature(self, temperature):
+        self.sent.append(("temperature", temperature))
+
+
+class Clock:
+    def __init__(self, now: float = NOW):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_scheduler(path: str = None, clock: Clock = None) -> tuple[Scheduler, dict]:
+    devices = {device_id: FakeDevice(device_id) for device_id in ("a", "b")}
+    hub = SimpleNamespace(registry=devices)
+    return Scheduler(hub, path=path, jitter=0, clock=clock or Clock()), devices
+
+
+def at(hour: int, minute: int = 0, day: int = 1) -> datetime:
+    return datetime(2026, 10, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_daily_schedule_runs_on_its_weekdays_in_its_timezone():
+    # 07:00 in Kolkata is 01:30 UTC, Monday to Friday
+    schedule = Schedule(
+        "s", "a", "power", PowerMode.ON, dt_time(7, 0), weekdays=range(5), timezone="Asia/Kolkata"
+    )
+
+    friday = schedule.next_run(NOW)
+    monday = schedule.next_run(friday)
+
+    assert friday == datetime(2026, 10, 2, 1, 30, tzinfo=timezone.utc).timestamp()
+    assert monday == datetime(2026, 10, 5, 1, 30, tzinfo=timezone.utc).timestamp()
+
+
+def test_heap_fires_schedules_in_order():
+    scheduler, _ = make_scheduler()
+    scheduler.add("a", "temperature", 22, at(15))
+    scheduler.add("b", "temperature", 23, at(13))
+    late = scheduler.add("b", "power", PowerMode.OFF, at(14))
+
+    assert scheduler.next_fire_time() == at(13).timestamp()
+    scheduler.remove(late.id)
+    scheduler.add("a", "power", PowerMode.OFF, at(12, 30))
+    assert scheduler.next_fire_time() == at(12, 30).timestamp()
+
+
+def test_due_commands_are_batched_per_device_and_the_last_one_wins():
+    async def run():
+        clock = Clock()
+        scheduler, devices = make_scheduler(clock=clock)
+        scheduler.add("a", "temperature", 22, at(13))
+        scheduler.add("a", "temperature", 24, at(13))
+        scheduler.add("a", "power", PowerMode.ON, at(13))
+        scheduler.add("b", "power", PowerMode.ON, at(14))
+        daily = scheduler.add("b", "temperature", 20, dt_time(13, 0), timezone="UTC")
+
+        clock.now = at(13).timestamp()
+        batches = scheduler.run_due()
+        await asyncio.gather(*scheduler._sends)
+
+        assert batches == {"a": {"temperature": 24, "power": PowerMode.ON}, "b": {"temperature": 20}}
+        assert devices["a"].sent == [("temperature", 24), ("power", PowerMode.ON)]
+        # One-shot schedules are done, daily ones move to the next day
+        assert len(scheduler) == 2
+        assert daily.next_due == at(13, day=2).timestamp()
+        assert scheduler.next_fire_time() == at(14).timestamp()
+
+    asyncio.run(run())
+
+
+def test_device_offsets_are_stable_and_within_the_jitter():
+    scheduler, _ = make_scheduler()
+    scheduler.jitter = 30
+
+    offsets = [scheduler.offset(f"device-{i}") for i in range(100)]
+
+    assert offsets == [scheduler.offset(f"device-{i}") for i in range(100)]
+    assert all(0 <= offset < 30 for offset in offsets)
+    assert len(set(offsets)) > 90
+
+
+def test_schedules_in_the_past_are_rejected():
+    scheduler, _ = make_scheduler()
+
+    with pytest.raises(ValueError):
+        scheduler.add("a", "power", PowerMode.ON, at(10))
+
+
+def test_schedules_survive_a_restart(tmp_path):
+    path = str(tmp_path / "schedules.json")
+    scheduler, _ = make_scheduler(path)
+    scheduler.add(
+        "a", "power", PowerMode.ON, dt_time(7, 0), weekdays=[0, 4], timezone="Asia/Kolkata", schedule_id="morning"
+    )
+    scheduler.add("b", "temperature", 22, at(18), schedule_id="evening")
+    scheduler.save()
+
+    restored, _ = make_scheduler(path)
+
+    assert {schedule.id: schedule.to_dict() for schedule in restored} == {
+        schedule.id: schedule.to_dict() for schedule in scheduler
+    }
+    assert restored.get("morning").value is PowerMode.ON
+    assert restored.next_fire_time() == scheduler.next_fire_time()
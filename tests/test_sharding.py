@@ -0,0 +1,126 @@
+import asyncio
+
+from miraie_ac import InitStage, MirAIeHub, ShardedMirAIeBroker
+from miraie_ac.sharding import shard_index
+from miraie_ac.recorder import RECEIVED, TrafficRecorder, read_recording
+from simulator import MirAIeSimulator
+
+
+PREFIXES = [f"user/home/device-{i:05d}" for i in range(1000)]
+
+
+def topics(prefixes) -> list[str]:
+    return [f"{prefix}/{kind}" for prefix in prefixes for kind in ("status", "connectionStatus")]
+
+
+def test_shard_index_is_stable_and_balanced():
+    indices = [shard_index(prefix, 4) for prefix in PREFIXES]
+
+    assert indices == [shard_index(prefix, 4) for prefix in PREFIXES]
+    assert all(200 < indices.count(shard) < 300 for shard in range(4))
+
+
+def test_adding_a_shard_only_moves_devices_to_it():
+    moved = [prefix for prefix in PREFIXES if shard_index(prefix, 4) != shard_index(prefix, 5)]
+
+    assert all(shard_index(prefix, 5) == 4 for prefix in moved)
+    assert 150 < len(moved) < 250
+
+
+def test_topics_are_split_over_shards_by_device():
+    broker = ShardedMirAIeBroker(shard_count=3)
+    broker.set_topics(topics(PREFIXES[:30]))
+
+    assigned = [topic for shard in broker.shards for topic in shard.commandTopics]
+    assert sorted(assigned) == sorted(topics(PREFIXES[:30]))
+    for shard in broker.shards:
+        # Both topics of a device use the same connection
+        prefixes = [topic.rpartition("/")[0] for topic in shard.commandTopics]
+        assert all(prefixes.count(prefix) == 2 for prefix in prefixes)
+        assert not shard.use_wildcards
+
+
+def test_shards_are_added_as_the_fleet_grows():
+    broker = ShardedMirAIeBroker(shard_count=1, max_devices_per_shard=10)
+
+    broker.set_topics(topics(PREFIXES[:25]))
+
+    assert len(broker.shards) == 3
+
+
+def test_messages_and_commands_go_through_the_shard_of_the_device():
+    async def run():
+        async with MirAIeSimulator(device_count=6) as simulator:
+            broker = simulator.configure_broker(ShardedMirAIeBroker(shard_count=3))
+            async with MirAIeHub() as hub:
+                await hub.init("9999999999", "password", broker)
+                await hub.wait_for(InitStage.BROKER_SUBSCRIBED, 5)
+                device = hub.home.devices[0]
+                shard = broker.shard_of(device.status_topic)
+
+                await device.set_temperature(21)
+                simulator.fleet.send_status(simulator.fleet.by_id[device.id])
+                await simulator.mqtt.drain()
+                await asyncio.sleep(0.05)
+
+                assert shard.metrics.publishes == 1
+                assert sum(other.metrics.publishes for other in broker.shards) == 1
+                assert device.status.temperature == 21
+                assert simulator.mqtt.connects >= 3
+
+    asyncio.run(run())
+
+
+def test_sids_are_unique_across_shards_and_resizes():
+    async def run():
+        broker = ShardedMirAIeBroker(shard_count=2)
+        sids = [shard._next_sid() for shard in broker.shards]
+
+        await broker.resize(3)
+        sids += [shard._next_sid() for shard in broker.shards]
+
+        assert len(set(sids)) == len(sids)
+
+    asyncio.run(run())
+
+
+def test_recorder_set_after_creation_reaches_every_shard(tmp_path):
+    async def run():
+        broker = ShardedMirAIeBroker(shard_count=2)
+        with TrafficRecorder(str(tmp_path / "traffic.rec")) as recorder:
+            broker.recorder = recorder
+            assert all(shard.recorder is recorder for shard in broker.shards)
+
+            await broker.resize(3)
+            assert all(shard.recorder is recorder for shard in broker.shards)
+
+            broker.recorder = None
+            assert all(shard.recorder is None for shard in broker.shards)
+
+    asyncio.run(run())
+
+
+def test_recorder_captures_traffic_of_a_running_sharded_broker(tmp_path):
+    path = str(tmp_path / "traffic.rec")
+
+    async def run():
+        async with MirAIeSimulator(device_count=4) as simulator:
+            broker = simulator.configure_broker(ShardedMirAIeBroker(shard_count=2))
+            async with MirAIeHub() as hub:
+                await hub.init("9999999999", "password", broker)
+                await hub.wait_for(InitStage.BROKER_SUBSCRIBED, 5)
+
+                broker.recorder = TrafficRecorder(path)
+                for device in simulator.fleet.devices:
+                    simulator.fleet.send_status(device)
+                await simulator.mqtt.drain()
+                for _ in range(100):
+                    if broker.recorder.records >= 4:
+                        break
+                    await asyncio.sleep(0.01)
+                broker.recorder.close()
+
+        return {record.topic for record in read_recording(path, RECEIVED)}
+
+    topics = asyncio.run(run())
+    assert len(topics) == 4